@@ -2,10 +2,22 @@
 
 from app import db
 from datetime import datetime
-from sqlalchemy import Text, ForeignKey, Boolean, Integer, String, DateTime, func
+import time
+from flask import current_app
+from sqlalchemy import Text, ForeignKey, Boolean, Integer, String, DateTime, func, event, case, and_, or_, select, literal, exists, inspect, update, tuple_
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm.attributes import set_committed_value
+
 
 class TenantConversation(db.Model):
     __tablename__ = 'tenant_conversations'
+    __table_args__ = (
+        # Delta sync: conversations changed since a cursor, per participant column
+        db.Index('ix_tenant_conversations_user_updated', 'user_id', 'updated_at'),
+        db.Index('ix_tenant_conversations_agent_updated', 'agent_id', 'updated_at'),
+        db.Index('ix_tenant_conversations_owner_updated', 'owner_id', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -19,6 +31,11 @@ class TenantConversation(db.Model):
     last_message_at = db.Column(db.DateTime, default=datetime.utcnow)
     unread_count_tenant = db.Column(db.Integer, default=0)
     unread_count_agent = db.Column(db.Integer, default=0)
+    # Read watermarks: id of the newest message each side has read; messages up to its
+    # (created_at, id) count as read, since ids need not follow created_at
+    last_read_message_id_tenant = db.Column(db.Integer, nullable=True)
+    last_read_message_id_agent = db.Column(db.Integer, nullable=True)
+    first_response_at = db.Column(db.DateTime, nullable=True)  # First agent/owner reply, for response-time rollups
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -30,29 +47,219 @@ class TenantConversation(db.Model):
     messages = db.relationship('TenantMessage', backref='conversation', lazy='dynamic', 
                               cascade='all, delete-orphan', order_by='TenantMessage.created_at')
 
-    def increment_unread_for_recipients(self, sender_type):
-        """Increment unread count for recipients based on sender type"""
+    def increment_unread_for_recipients(self, sender_type, message_time=None, sender_id=None):
+        """Record a new message: bump recipient unread count and last_message_at in one UPDATE"""
+        message_time = message_time or datetime.utcnow()
+        was_closed = self.status == 'closed'
+        if sender_id is not None:
+            self._record_message_rollups(sender_type, sender_id, message_time, was_closed)
+
+        values = {
+            'last_message_at': message_time,
+            'status': 'open'
+        }
+        # Counters are updated as SQL expressions so concurrent sends never lose increments
         if sender_type == 'tenant':
-            self.unread_count_agent += 1
-            self.unread_count_tenant = 0  # Reset tenant count since they sent the message
+            values['unread_count_agent'] = TenantConversation.unread_count_agent + 1
+            values['unread_count_tenant'] = 0  # Reset tenant count since they sent the message
         else:
-            self.unread_count_tenant += 1
-            self.unread_count_agent = 0  # Reset agent/owner count since they sent the message
+            values['unread_count_tenant'] = TenantConversation.unread_count_tenant + 1
+            values['unread_count_agent'] = 0  # Reset agent/owner count since they sent the message
+
+        TenantConversation.query.filter_by(id=self.id).update(values, synchronize_session=False)
+        # Reload the counters from the database the next time they are read
+        db.session.expire(self, list(values.keys()))
+
+        # Per-participant counters: everyone but the sender gets one more unread message
+        if sender_id is not None:
+            ConversationParticipant.query.filter_by(conversation_id=self.id).update({
+                'unread_count': case(
+                    (ConversationParticipant.user_id == sender_id, 0),
+                    else_=ConversationParticipant.unread_count + 1
+                )
+            }, synchronize_session=False)
+
+    def _record_message_rollups(self, sender_type, sender_id, message_time, was_closed):
+        """Rollup deltas for a new message; runs before the counters are updated"""
+        sender_row = db.session.get(ConversationParticipant, (sender_id, self.id))
+        sender = None
+        deltas = {}
+        for row in self.participant_rows():
+            if str(row['user_id']) == str(sender_id):
+                sender = row['user_id']
+                deltas[sender] = (row['role'], {
+                    'messages_sent': 1,
+                    'unread_delta': -(sender_row.unread_count if sender_row else 0)
+                })
+            else:
+                deltas[row['user_id']] = (row['role'], {'messages_received': 1, 'unread_delta': 1})
+            if was_closed:
+                deltas[row['user_id']][1]['conversations_reopened'] = 1
+
+        # First agent/owner reply: claim it with a conditional UPDATE so concurrent replies count once
+        if sender_type != 'tenant' and self.first_response_at is None and sender is not None:
+            claimed = TenantConversation.query.filter(
+                TenantConversation.id == self.id, TenantConversation.first_response_at.is_(None)
+            ).update({'first_response_at': message_time}, synchronize_session=False)
+            if claimed:
+                set_committed_value(self, 'first_response_at', message_time)
+                deltas[sender][1].update({
+                    'first_responses': 1,
+                    'first_response_seconds': max(0, int((message_time - self.created_at).total_seconds()))
+                })
+
+        MessagingRollup.record(self.shard_connection(), message_time.date(), self.property_id, [
+            (user_id, role, counts) for user_id, (role, counts) in deltas.items()
+        ])
+
+    def shard_connection(self):
+        """Session connection to the database holding this conversation (its shard when messages are sharded)"""
+        return db.session.connection(bind_arguments={'mapper': TenantConversation, 'instance': self})
+
+    def latest_message_position(self):
+        """(created_at, id) of the newest message in the conversation (single index probe)"""
+        row = db.session.query(TenantMessage.created_at, TenantMessage.id).filter(
+            TenantMessage.conversation_id == self.id,
+            TenantMessage.created_at >= self.created_at
+        ).order_by(TenantMessage.created_at.desc(), TenantMessage.id.desc()).limit(1).first()
+        return tuple(row) if row else None
+
+    def last_read_message_id_for(self, user_role):
+        """Read watermark of the tenant side or the agent/owner side"""
+        if user_role == 'tenant':
+            return self.last_read_message_id_tenant
+        return self.last_read_message_id_agent
+
+    def read_position_for(self, user_role):
+        """(created_at, id) of the side's watermark message; messages up to it count as read
+
+        Ids do not follow created_at (imported history, per-process id blocks), so
+        read state is decided on the position messages are shown in, not the id.
+        The position is cached per watermark on the instance.
+        """
+        watermark = self.last_read_message_id_for(user_role)
+        if watermark is None:
+            return None
+        positions = self.__dict__.setdefault('_read_positions', {})
+        if watermark not in positions:
+            row = db.session.query(TenantMessage.created_at, TenantMessage.id).filter(
+                TenantMessage.conversation_id == self.id, TenantMessage.id == watermark
+            ).first()
+            positions[watermark] = tuple(row) if row else None
+        return positions[watermark]
+
+    @staticmethod
+    def read_up_to(watermark, position):
+        """SQL: the watermark column names a message of its conversation at or past position"""
+        message = TenantMessage.__table__.alias('read_up_to')
+        return exists().where(
+            message.c.conversation_id == TenantConversation.id,
+            message.c.id == watermark,
+            tuple_(message.c.created_at, message.c.id) >= tuple_(*position)
+        )
 
     def mark_messages_as_read(self, user_id, user_role):
-        """Mark all messages in conversation as read for the given user"""
+        """Mark all messages in conversation as read for the given user
+
+        Only the reader's side watermark moves, so the cost does not depend on the
+        length of the thread and re-opening a read conversation writes nothing.
+        """
+        reader_row = db.session.get(ConversationParticipant, (user_id, self.id))
+        if reader_row and reader_row.unread_count:
+            MessagingRollup.record(self.shard_connection(), datetime.utcnow().date(), self.property_id, [
+                (reader_row.user_id, reader_row.role, {'unread_delta': -reader_row.unread_count})
+            ])
+
         if user_role == 'tenant':
-            # Mark all messages as read by tenant
-            TenantMessage.query.filter_by(conversation_id=self.id).update({
-                'is_read_by_tenant': True
-            })
-            self.unread_count_tenant = 0
+            watermark, counter = TenantConversation.last_read_message_id_tenant, TenantConversation.unread_count_tenant
         else:
-            # Mark all messages as read by agent/owner
-            TenantMessage.query.filter_by(conversation_id=self.id).update({
-                'is_read_by_agent': True
-            })
-            self.unread_count_agent = 0
+            watermark, counter = TenantConversation.last_read_message_id_agent, TenantConversation.unread_count_agent
+        # One UPDATE that only ever moves the watermark forward, so a concurrent read of
+        # an older snapshot cannot move it back; it matches no row when already read
+        latest = self.latest_message_position()
+        values = {counter: 0}
+        behind = literal(False)
+        if latest is not None:
+            behind = ~self.read_up_to(watermark, latest)
+            values[watermark] = case((behind, latest[1]), else_=watermark)
+        self.shard_connection().execute(update(TenantConversation).where(
+            TenantConversation.id == self.id, or_(counter != 0, behind)
+        ).values(values))
+        current = self.read_position_for(user_role)
+        if latest is not None and (current is None or current < latest):
+            set_committed_value(self, watermark.key, latest[1])
+        set_committed_value(self, counter.key, 0)
+
+        ConversationParticipant.query.filter_by(conversation_id=self.id, user_id=user_id).filter(or_(
+            ConversationParticipant.unread_count != 0, ConversationParticipant.last_read_at.is_(None)
+        )).update({
+            'unread_count': 0,
+            'last_read_at': datetime.utcnow()
+        }, synchronize_session=False)
+
+    @classmethod
+    def backfill_read_watermarks(cls, batch_size=1000):
+        """Derive the read watermarks from the legacy per-message flags
+
+        A side's watermark is set to the newest message (by created_at, id) shown
+        before its first unread message from the other side, or to the newest
+        message when everything was read. Conversations that already have a
+        watermark are left alone, so the migration can be re-run.
+        """
+        conversations = cls.__table__
+        messages = TenantMessage.__table__.alias('message')
+        unread = TenantMessage.__table__.alias('unread')
+        sides = [
+            (conversations.c.last_read_message_id_tenant, unread.c.is_read_by_tenant, unread.c.sender_type != 'tenant'),
+            (conversations.c.last_read_message_id_agent, unread.c.is_read_by_agent, unread.c.sender_type == 'tenant'),
+        ]
+
+        updated = 0
+        max_id = db.session.query(func.max(cls.id)).scalar() or 0
+        for start in range(0, max_id, batch_size):
+            for watermark, read_flag, from_other_side in sides:
+                unread_before = exists().where(
+                    unread.c.conversation_id == conversations.c.id,
+                    from_other_side,
+                    or_(read_flag.is_(False), read_flag.is_(None)),
+                    tuple_(unread.c.created_at, unread.c.id) <= tuple_(messages.c.created_at, messages.c.id)
+                )
+                read_up_to = select(messages.c.id).where(
+                    messages.c.conversation_id == conversations.c.id, ~unread_before
+                ).order_by(messages.c.created_at.desc(), messages.c.id.desc()).limit(1).scalar_subquery()
+                result = db.session.execute(update(conversations).where(
+                    conversations.c.id > start,
+                    conversations.c.id <= start + batch_size,
+                    watermark.is_(None)
+                ).values({watermark: read_up_to}))
+                updated += result.rowcount or 0
+            db.session.commit()
+        return updated
+
+    @classmethod
+    def involving(cls, user_id):
+        """Filter on the legacy tenant, agent and owner columns (used until participants are backfilled)"""
+        return or_(cls.user_id == user_id, cls.agent_id == user_id, cls.owner_id == user_id)
+
+    @classmethod
+    def unread_column_for(cls, user_id):
+        """The legacy unread counter of the user's side of a conversation"""
+        return case((cls.user_id == user_id, cls.unread_count_tenant), else_=cls.unread_count_agent)
+
+    def involves(self, user_id):
+        """Whether the user is the tenant, agent or owner of this conversation"""
+        return str(user_id) in {str(self.user_id), str(self.agent_id), str(self.owner_id)}
+
+    def participant_rows(self):
+        """Participant rows implied by the tenant, agent and owner columns"""
+        rows = [{'user_id': self.user_id, 'role': 'tenant', 'unread_count': self.unread_count_tenant or 0}]
+        if self.agent_id:
+            rows.append({'user_id': self.agent_id, 'role': 'agent', 'unread_count': self.unread_count_agent or 0})
+        if self.owner_id and self.owner_id != self.agent_id:
+            rows.append({'user_id': self.owner_id, 'role': 'owner', 'unread_count': self.unread_count_agent or 0})
+        for row in rows:
+            row['conversation_id'] = self.id
+        return rows
 
     def get_unread_count_for_user(self, user_id, user_role):
         """Get unread count for specific user"""
@@ -119,6 +326,12 @@ class TenantConversation(db.Model):
 
 class TenantMessage(db.Model):
     __tablename__ = 'tenant_messages'
+    __table_args__ = (
+        # Message pages: scoped by conversation, ordered by created_at (the partition key on PostgreSQL)
+        db.Index('ix_tenant_messages_conversation_created', 'conversation_id', 'created_at'),
+        # Delta sync: messages created or updated since a cursor within a conversation
+        db.Index('ix_tenant_messages_conversation_updated', 'conversation_id', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey('tenant_conversations.id'), nullable=False)
@@ -130,6 +343,7 @@ class TenantMessage(db.Model):
     attachment_name = db.Column(db.String(200), nullable=True)
     attachment_size = db.Column(db.Integer, nullable=True)
     attachment_type = db.Column(db.String(50), nullable=True)
+    # Legacy per-message read flags; read state now comes from the conversation watermarks
     is_read_by_tenant = db.Column(db.Boolean, default=False)
     is_read_by_agent = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -139,6 +353,13 @@ class TenantMessage(db.Model):
         """Check if message has an attachment"""
         return bool(self.attachment_url)
 
+    def is_read_for(self, user_role):
+        """Read state for a side: own messages are read, others up to the side's watermark"""
+        if (self.sender_type == 'tenant') == (user_role == 'tenant'):
+            return True
+        position = self.conversation.read_position_for(user_role)
+        return position is not None and (self.created_at, self.id) <= position
+
     def to_dict(self, user_role=None):
         """Convert message to dictionary"""
         data = {
@@ -162,12 +383,410 @@ class TenantMessage(db.Model):
             })
 
         # Add read status based on user role
-        if user_role == 'tenant':
-            data['is_read'] = self.is_read_by_tenant
-        elif user_role in ['agent', 'owner']:
-            data['is_read'] = self.is_read_by_agent
+        if user_role in ['tenant', 'agent', 'owner']:
+            data['is_read'] = self.is_read_for(user_role)
 
         return data
 
     def __repr__(self):
-        return f'<TenantMessage {self.id}: {self.sender_name} in conversation {self.conversation_id}>'
\ No newline at end of file
+        return f'<TenantMessage {self.id}: {self.sender_name} in conversation {self.conversation_id}>'
+
+
+class ConversationParticipant(db.Model):
+    """One row per user taking part in a conversation, kept in sync with TenantConversation"""
+    __tablename__ = 'conversation_participants'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('tenant_conversations.id', ondelete='CASCADE'),
+                                primary_key=True, index=True)
+    role = db.Column(db.String(20), nullable=False)  # tenant, agent, owner
+    unread_count = db.Column(db.Integer, default=0, nullable=False)
+    last_read_at = db.Column(db.DateTime, nullable=True)
+
+    conversation = db.relationship('TenantConversation', backref=db.backref(
+        'participants', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True))
+
+    BACKFILL_MIGRATION = '0002_backfill_conversation_participants'
+
+    @classmethod
+    def ready(cls):
+        """Whether every conversation has its rows; until then reads use the legacy columns"""
+        return MessagingSchemaMigration.is_applied(cls.BACKFILL_MIGRATION)
+
+    @classmethod
+    def conversation_ids_for(cls, user_id):
+        """Subquery of conversation ids the user takes part in (primary key lookup)"""
+        if not cls.ready():
+            return select(TenantConversation.id).where(TenantConversation.involving(user_id))
+        return select(cls.conversation_id).where(cls.user_id == user_id)
+
+    @classmethod
+    def is_participant(cls, conversation_id, user_id):
+        """Check whether the user takes part in the conversation"""
+        if not cls.ready():
+            conversation = db.session.get(TenantConversation, conversation_id)
+            return conversation is not None and conversation.involves(user_id)
+        return db.session.get(cls, (user_id, conversation_id)) is not None
+
+    @classmethod
+    def user_ids_by_conversation(cls, conversation_ids, user_id):
+        """{conversation_id: [participant user ids]} for those of conversation_ids the user takes part in"""
+        participants = {}
+        if not cls.ready():
+            conversations = TenantConversation.query.filter(
+                TenantConversation.id.in_(conversation_ids), TenantConversation.involving(user_id)
+            ).all()
+            for conversation in conversations:
+                participants[conversation.id] = [row['user_id'] for row in conversation.participant_rows()]
+            return participants
+        rows = db.session.query(cls.conversation_id, cls.user_id).filter(
+            cls.conversation_id.in_(conversation_ids),
+            cls.conversation_id.in_(cls.conversation_ids_for(user_id))
+        ).all()
+        for conversation_id, participant_id in rows:
+            participants.setdefault(conversation_id, []).append(participant_id)
+        return participants
+
+    @classmethod
+    def backfill(cls):
+        """Create missing participant rows for existing conversations"""
+        conversations = TenantConversation.__table__
+        participants = cls.__table__
+        sources = [
+            ('tenant', conversations.c.user_id, conversations.c.unread_count_tenant, None),
+            ('agent', conversations.c.agent_id, conversations.c.unread_count_agent, None),
+            ('owner', conversations.c.owner_id, conversations.c.unread_count_agent,
+             or_(conversations.c.agent_id.is_(None), conversations.c.agent_id != conversations.c.owner_id)),
+        ]
+
+        inserted = 0
+        for role, user_column, unread_column, extra_filter in sources:
+            already_present = exists().where(and_(
+                participants.c.conversation_id == conversations.c.id,
+                participants.c.user_id == user_column
+            ))
+            query = select(
+                user_column, conversations.c.id, literal(role), func.coalesce(unread_column, 0)
+            ).where(user_column.isnot(None), ~already_present)
+            if extra_filter is not None:
+                query = query.where(extra_filter)
+
+            result = db.session.execute(participants.insert().from_select(
+                ['user_id', 'conversation_id', 'role', 'unread_count'], query
+            ))
+            inserted += result.rowcount or 0
+
+        db.session.commit()
+        return inserted
+
+    def __repr__(self):
+        return f'<ConversationParticipant user {self.user_id} in conversation {self.conversation_id}>'
+
+
+@event.listens_for(TenantConversation, 'after_insert')
+def _create_participants(mapper, connection, conversation):
+    """Insert participant rows in the same flush as a new conversation"""
+    rows = conversation.participant_rows()
+    connection.execute(ConversationParticipant.__table__.insert(), rows)
+    MessagingRollup.record(connection, (conversation.created_at or datetime.utcnow()).date(), conversation.property_id, [
+        (row['user_id'], row['role'], {'conversations_opened': 1, 'unread_delta': row['unread_count']}) for row in rows
+    ])
+
+
+@event.listens_for(TenantConversation, 'after_update')
+def _sync_participants(mapper, connection, conversation):
+    """Update participant rows in place when the tenant, agent or owner of a conversation changes
+
+    Users who stay keep their unread count and last_read_at; only departed users
+    are removed, new ones added and changed roles rewritten.
+    """
+    state = inspect(conversation)
+    _record_status_change(connection, conversation, state.attrs['status'].history)
+    if not any(state.attrs[name].history.has_changes() for name in ('user_id', 'agent_id', 'owner_id')):
+        return
+
+    participants = ConversationParticipant.__table__
+    wanted = {int(row['user_id']): row for row in conversation.participant_rows()}
+    existing = dict(connection.execute(
+        select(participants.c.user_id, participants.c.role).where(participants.c.conversation_id == conversation.id)
+    ).all())
+
+    departed = [user_id for user_id in existing if user_id not in wanted]
+    if departed:
+        connection.execute(participants.delete().where(
+            participants.c.conversation_id == conversation.id, participants.c.user_id.in_(departed)
+        ))
+    for user_id, row in wanted.items():
+        if user_id not in existing:
+            connection.execute(participants.insert(), row)
+        elif existing[user_id] != row['role']:
+            connection.execute(participants.update().where(
+                participants.c.conversation_id == conversation.id, participants.c.user_id == user_id
+            ).values(role=row['role']))
+
+
+def _record_status_change(connection, conversation, history):
+    """Count closes and reopens in the rollups of every participant"""
+    if not history.has_changes() or not history.deleted:
+        return
+    previous, current = history.deleted[0], conversation.status
+    if current == 'closed' and previous != 'closed':
+        column = 'conversations_closed'
+    elif previous == 'closed' and current != 'closed':
+        column = 'conversations_reopened'
+    else:
+        return
+    MessagingRollup.record(connection, datetime.utcnow().date(), conversation.property_id, [
+        (row['user_id'], row['role'], {column: 1}) for row in conversation.participant_rows()
+    ])
+
+
+class MessagingRollup(db.Model):
+    """Daily per-participant, per-property messaging counters maintained as messages are written
+
+    Flow columns count events on the day; unread_delta and the opened, reopened and
+    closed counts are deltas, so summing every day gives the current backlog and
+    open-thread count. Stats read only this table.
+    """
+    __tablename__ = 'tenant_messaging_rollups'
+    __table_args__ = (
+        db.Index('ix_tenant_messaging_rollups_property_day', 'property_id', 'day'),
+    )
+
+    COUNTERS = (
+        'conversations_opened', 'conversations_closed', 'conversations_reopened',
+        'messages_sent', 'messages_received', 'unread_delta', 'first_responses', 'first_response_seconds'
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    property_id = db.Column(db.Integer, primary_key=True, default=0)  # 0 when the conversation has no property
+    day = db.Column(db.Date, primary_key=True)
+    role = db.Column(db.String(20), nullable=False)  # tenant, agent, owner
+    conversations_opened = db.Column(db.Integer, default=0, nullable=False)
+    conversations_closed = db.Column(db.Integer, default=0, nullable=False)
+    conversations_reopened = db.Column(db.Integer, default=0, nullable=False)
+    messages_sent = db.Column(db.Integer, default=0, nullable=False)
+    messages_received = db.Column(db.Integer, default=0, nullable=False)
+    unread_delta = db.Column(db.Integer, default=0, nullable=False)
+    first_responses = db.Column(db.Integer, default=0, nullable=False)
+    first_response_seconds = db.Column(db.BigInteger, default=0, nullable=False)
+
+    @classmethod
+    def record(cls, connection, day, property_id, deltas):
+        """Add (user_id, role, {counter: amount}) deltas to the day's rows with one upsert"""
+        rows = []
+        for user_id, role, counts in deltas:
+            if user_id is None or not any(counts.values()):
+                continue
+            row = {'user_id': user_id, 'property_id': property_id or 0, 'day': day, 'role': role}
+            row.update({column: counts.get(column, 0) for column in cls.COUNTERS})
+            rows.append(row)
+        if not rows:
+            return
+
+        table = cls.__table__
+        dialect = connection.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            statement = (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(table).values(rows)
+            statement = statement.on_conflict_do_update(
+                index_elements=['user_id', 'property_id', 'day'],
+                set_={column: table.c[column] + statement.excluded[column] for column in cls.COUNTERS}
+            )
+            connection.execute(statement)
+            return
+
+        for row in rows:
+            updated = connection.execute(table.update().where(and_(
+                table.c.user_id == row['user_id'], table.c.property_id == row['property_id'], table.c.day == row['day']
+            )).values({column: table.c[column] + row[column] for column in cls.COUNTERS}))
+            if not updated.rowcount:
+                connection.execute(table.insert(), row)
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """Recompute every rollup (and first_response_at) from conversations and messages
+
+        Close and reopen history is not stored, so a closed conversation counts as
+        closed on its last update day. The current unread backlog is booked on today.
+        """
+        conversations = TenantConversation.__table__
+        messages = TenantMessage.__table__
+        db.session.execute(update(conversations).where(conversations.c.first_response_at.is_(None)).values(
+            first_response_at=select(func.min(messages.c.created_at)).where(
+                messages.c.conversation_id == conversations.c.id, messages.c.sender_type != 'tenant'
+            ).scalar_subquery()
+        ))
+
+        totals = {}
+
+        def add(user_id, role, property_id, day, column, amount):
+            if isinstance(day, str):
+                day = datetime.strptime(day[:10], '%Y-%m-%d').date()
+            elif isinstance(day, datetime):
+                day = day.date()
+            key = (user_id, property_id or 0, day)
+            row = totals.setdefault(key, dict({column: 0 for column in cls.COUNTERS}, role=role))
+            row[column] += amount
+
+        today = datetime.utcnow().date()
+        participants = {}
+        rows = db.session.query(
+            TenantConversation.id, TenantConversation.property_id, TenantConversation.status,
+            TenantConversation.created_at, TenantConversation.updated_at,
+            ConversationParticipant.user_id, ConversationParticipant.role, ConversationParticipant.unread_count
+        ).join(ConversationParticipant, ConversationParticipant.conversation_id == TenantConversation.id)
+        for conversation_id, property_id, status, created_at, updated_at, user_id, role, unread in rows.yield_per(batch_size):
+            participants.setdefault(conversation_id, (property_id, []))[1].append((user_id, role))
+            add(user_id, role, property_id, created_at, 'conversations_opened', 1)
+            if status == 'closed':
+                add(user_id, role, property_id, updated_at or created_at, 'conversations_closed', 1)
+            if unread:
+                add(user_id, role, property_id, today, 'unread_delta', unread)
+
+        day = func.date(TenantMessage.created_at)
+        counts = db.session.query(
+            TenantMessage.conversation_id, TenantMessage.sender_id, day, func.count()
+        ).group_by(TenantMessage.conversation_id, TenantMessage.sender_id, day)
+        for conversation_id, sender_id, message_day, count in counts.yield_per(batch_size):
+            property_id, members = participants.get(conversation_id, (None, []))
+            for user_id, role in members:
+                add(user_id, role, property_id, message_day,
+                    'messages_sent' if user_id == sender_id else 'messages_received', count)
+
+        # The earliest agent/owner message of each conversation is its first response
+        first_replies = db.session.query(
+            TenantMessage.conversation_id, TenantMessage.sender_id, TenantConversation.first_response_at,
+            TenantConversation.created_at
+        ).join(TenantConversation, TenantConversation.id == TenantMessage.conversation_id).filter(
+            TenantMessage.sender_type != 'tenant', TenantConversation.first_response_at.isnot(None)
+        ).order_by(TenantMessage.conversation_id, TenantMessage.created_at, TenantMessage.id)
+        previous = None
+        for conversation_id, sender_id, responded_at, created_at in first_replies.yield_per(batch_size):
+            if conversation_id == previous:
+                continue
+            previous = conversation_id
+            property_id, members = participants.get(conversation_id, (None, []))
+            role = next((role for user_id, role in members if user_id == sender_id), None)
+            if role:
+                add(sender_id, role, property_id, responded_at, 'first_responses', 1)
+                add(sender_id, role, property_id, responded_at, 'first_response_seconds',
+                    max(0, int((responded_at - created_at).total_seconds())))
+
+        db.session.execute(cls.__table__.delete())
+        rows = [dict(values, user_id=key[0], property_id=key[1], day=key[2]) for key, values in totals.items()]
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(cls.__table__.insert(), rows[start:start + batch_size])
+        db.session.commit()
+        return len(rows)
+
+    def __repr__(self):
+        return f'<MessagingRollup user {self.user_id} property {self.property_id} on {self.day}>'
+
+
+class MessageOutboxEvent(db.Model):
+    """Side effect of a messaging write, committed in the same transaction and drained by a worker"""
+    __tablename__ = 'tenant_message_outbox'
+    __table_args__ = (
+        # Worker claims: oldest pending events that are due
+        db.Index('ix_tenant_message_outbox_status_available', 'status', 'available_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False)  # message.created, conversation.created
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, processing, done, dead
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    @classmethod
+    def enqueue(cls, event_type, payload):
+        """Add an event to the current transaction; it is only visible once the caller commits"""
+        event = cls(event_type=event_type, payload=payload)
+        db.session.add(event)
+        return event
+
+    def __repr__(self):
+        return f'<MessageOutboxEvent {self.id}: {self.event_type} ({self.status})>'
+
+
+class ConversationIdAllocation(db.Model):
+    """Conversation and message id blocks on the primary database, used when messages are sharded
+
+    Each row reserves the sequence numbers id * block_size up to the next row's;
+    a sharded conversation's or message's id is sequence * shard_count + shard_index,
+    so every id is unique across shards and names the shard that holds the row.
+    """
+    __tablename__ = 'tenant_conversation_ids'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    def __repr__(self):
+        return f'<ConversationIdAllocation {self.id}>'
+
+
+class MessagingSchemaMigration(db.Model):
+    """Schema and data migrations of the messaging tables that have been applied (app/utils/schema_migrations.py)"""
+    __tablename__ = 'tenant_messaging_migrations'
+
+    name = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    RECHECK_SECONDS = 30  # How long a "not applied yet" answer is trusted (MESSAGING_MIGRATION_RECHECK)
+
+    @classmethod
+    def is_applied(cls, name):
+        """Whether a migration has run; cached per app once true, since migrations are never undone
+
+        A negative answer is cached for MESSAGING_MIGRATION_RECHECK seconds, so
+        requests served before a backfill finishes do not each query for it.
+        Read on a connection of its own so a missing table (nothing migrated yet)
+        cannot abort the caller's transaction.
+        """
+        applied = current_app.extensions.setdefault('messaging_migrations', set())
+        checked = current_app.extensions.setdefault('messaging_migrations_checked', {})
+        now = time.monotonic()
+        recheck = current_app.config.get('MESSAGING_MIGRATION_RECHECK', cls.RECHECK_SECONDS)
+        if name not in applied and (name not in checked or now - checked[name] >= recheck):
+            checked[name] = now
+            try:
+                with db.engine.connect() as connection:
+                    if connection.execute(select(cls.name).where(cls.name == name)).first():
+                        applied.add(name)
+            except DBAPIError:
+                pass
+        return name in applied
+
+    def __repr__(self):
+        return f'<MessagingSchemaMigration {self.name}>'
+
+
+class ConversationImport(db.Model):
+    """Maps a conversation key from an external source to the conversation it was imported as"""
+    __tablename__ = 'tenant_conversation_imports'
+
+    source = db.Column(db.String(100), primary_key=True)
+    external_id = db.Column(db.String(200), primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('tenant_conversations.id', ondelete='CASCADE'),
+                                nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<ConversationImport {self.source}:{self.external_id} -> {self.conversation_id}>'
+
+
+class ConversationImportProgress(db.Model):
+    """Input rows already committed for an import source; lets an interrupted import resume"""
+    __tablename__ = 'tenant_conversation_import_progress'
+
+    source = db.Column(db.String(100), primary_key=True)
+    rows_done = db.Column(db.Integer, default=0, nullable=False)
+    conversations = db.Column(db.Integer, default=0, nullable=False)
+    messages = db.Column(db.Integer, default=0, nullable=False)
+    rejected = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ConversationImportProgress {self.source}: {self.rows_done} rows>'
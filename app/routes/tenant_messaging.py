@@ -1,10 +1,17 @@
 # app/routes/tenant_messaging.py - Updated tenant messaging routes
 
-from flask import Blueprint, request, current_app, jsonify, send_file
+from flask import Blueprint, request, current_app, jsonify, send_file, g, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime
-from sqlalchemy import and_, or_, desc
+from datetime import datetime, timedelta
+import time
+from sqlalchemy import or_, desc, func, case
+from sqlalchemy.orm import aliased, selectinload
+import base64
+import click
+import json
 import os
+import re
+import signal
 import uuid
 from werkzeug.utils import secure_filename
 
@@ -12,8 +19,21 @@ from app import db
 from app.models.user_models import User, UserProfile
 from app.models.property_models import Property
 from app.models.tenant_verification import TenantProfile
-from app.models.tenant_messaging import TenantConversation, TenantMessage
+from app.models.tenant_messaging import TenantConversation, TenantMessage, ConversationParticipant, MessageOutboxEvent, MessagingRollup
 from app.utils.response_utils import success_response, error_response
+from app.utils.rate_limiter import rate_limit, db_latency
+from app.utils.idempotency import idempotent
+from app.utils.compression import compress_response
+from app.utils import message_partitions
+from app.utils import message_shards
+from app.utils import schema_migrations
+from app.utils.attachment_storage import get_attachment_storage
+from app.utils.inbox_cache import cached_inbox, invalidate_inbox
+from app.utils.request_profiler import create_request_profiler
+from app.utils import metrics
+from app.utils import presence
+from app.utils.structured_logging import configure_logging, assign_request_id, debug_fields, REQUEST_ID_HEADER
+from app.utils import startup
 
 tenant_messaging_bp = Blueprint('tenant_messaging', __name__)
 
@@ -21,25 +41,46 @@ tenant_messaging_bp = Blueprint('tenant_messaging', __name__)
 MESSAGING_UPLOAD_FOLDER = 'uploads/message_attachments'
 ALLOWED_ATTACHMENT_EXTENSIONS = {'pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png', 'txt', 'gif', 'mp4', 'avi', 'mov'}
 MAX_ATTACHMENT_SIZE = 10 * 1024 * 1024  # 10MB
+DIRECT_UPLOAD_EXPIRY = 15 * 60  # Seconds a presigned upload stays valid
+DIRECT_UPLOAD_KEY_PATTERN = re.compile(r'^(\d+|pending/\d+)/attachment_[0-9a-f]{32}\.[a-z0-9]+$')
+
+# Delta sync configuration
+SYNC_PAGE_SIZE = 200
+SYNC_SAFETY_WINDOW = timedelta(seconds=5)  # Covers transactions still in flight when a token is issued
+
+# Inbox payload configuration
+MESSAGE_PREVIEW_LENGTH = 100
+
+# Presence configuration
+MAX_PRESENCE_CONVERSATIONS = 100
+
+# Batch message prefetch configuration
+MAX_PREFETCH_CONVERSATIONS = 50
+PREFETCH_DEFAULT_MESSAGES = 20
+PREFETCH_MAX_MESSAGES = 100
+
+# Dashboard stats configuration
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = 366
+STATS_GROUPS = {'property': MessagingRollup.property_id, 'day': MessagingRollup.day, 'user': MessagingRollup.user_id}
 
 def allowed_attachment(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_ATTACHMENT_EXTENSIONS
 
+def attachment_storage():
+    """Configured attachment storage backend (local disk or S3-compatible)"""
+    return get_attachment_storage(MESSAGING_UPLOAD_FOLDER)
+
 def handle_attachment_upload(file, conversation_id):
     """Handle file upload for message attachments"""
     if not file or not file.filename or not allowed_attachment(file.filename):
         return None, None, None, None
     
     try:
-        # Create upload directory
-        upload_dir = os.path.join(current_app.root_path, MESSAGING_UPLOAD_FOLDER, str(conversation_id))
-        os.makedirs(upload_dir, exist_ok=True)
-        
         # Generate unique filename
         file_ext = file.filename.rsplit('.', 1)[1].lower()
         unique_filename = f"attachment_{uuid.uuid4().hex}.{file_ext}"
-        file_path = os.path.join(upload_dir, unique_filename)
         
         # Check file size
         file.seek(0, os.SEEK_END)
@@ -49,18 +90,42 @@ def handle_attachment_upload(file, conversation_id):
         if file_size > MAX_ATTACHMENT_SIZE:
             return None, None, None, None
         
-        # Save file
-        file.save(file_path)
+        # Save file; the storage key doubles as the relative URL path for the frontend
+        storage_key = f"{conversation_id}/{unique_filename}"
+        attachment_storage().save(file, storage_key, file.mimetype)
+        metrics.ATTACHMENT_BYTES.labels('in').inc(file_size)
         
-        # Return relative URL path for frontend
-        relative_path = os.path.join(str(conversation_id), unique_filename)
-        
-        return secure_filename(file.filename), relative_path, file_size, file_ext
+        return secure_filename(file.filename), storage_key, file_size, file_ext
         
     except Exception as e:
-        current_app.logger.error(f"Attachment upload error: {str(e)}")
+        current_app.logger.exception("Attachment upload error: %s", e)
         return None, None, None, None
 
+def discard_attachment(storage_key):
+    """Best-effort removal of an attachment whose message was never saved"""
+    try:
+        attachment_storage().delete(storage_key)
+    except Exception as e:
+        current_app.logger.exception("Attachment cleanup error: %s", e)
+
+def confirm_direct_upload(attachment_key, conversation_id, user_id, original_name=None):
+    """Validate an attachment uploaded straight to storage and return its metadata"""
+    allowed_prefixes = (f"{conversation_id}/", f"pending/{user_id}/")
+    if not DIRECT_UPLOAD_KEY_PATTERN.match(attachment_key) or not attachment_key.startswith(allowed_prefixes):
+        return None, None, None, None
+    
+    file_ext = attachment_key.rsplit('.', 1)[1]
+    if file_ext not in ALLOWED_ATTACHMENT_EXTENSIONS:
+        return None, None, None, None
+    
+    # Metadata only: the object store already holds the bytes
+    file_size = attachment_storage().size(attachment_key)
+    if file_size is None or file_size > MAX_ATTACHMENT_SIZE:
+        return None, None, None, None
+    
+    file_name = secure_filename(original_name or '') or os.path.basename(attachment_key)
+    return file_name, attachment_key, file_size, file_ext
+
 def get_user_role(user_id):
     """Get user role from User model"""
     user = User.query.get(user_id)
@@ -75,27 +140,274 @@ def get_user_role(user_id):
 
 def has_conversation_access(conversation, user_id, user_role):
     """Check if user has access to the conversation"""
-    if user_role == 'tenant':
-        return conversation.user_id == user_id
-    else:
-        return conversation.agent_id == user_id or conversation.owner_id == user_id
+    if not ConversationParticipant.ready():
+        return conversation.involves(user_id)
+    return ConversationParticipant.is_participant(conversation.id, user_id)
+
+def participant_conversations_query(user_id):
+    """Conversations the user takes part in, paired with the user's unread count"""
+    if not ConversationParticipant.ready():
+        return db.session.query(TenantConversation, TenantConversation.unread_column_for(user_id))\
+            .filter(TenantConversation.involving(user_id))
+    return db.session.query(TenantConversation, ConversationParticipant.unread_count)\
+        .join(ConversationParticipant, ConversationParticipant.conversation_id == TenantConversation.id)\
+        .filter(ConversationParticipant.user_id == user_id)
+
+def encode_sync_token(changed_at, conversation_id=0, message_id=0):
+    """Encode a delta sync cursor (change timestamp, conversation id, message id) as an opaque token"""
+    raw = f"{changed_at.isoformat()}|{conversation_id}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_sync_token(token):
+    """Decode a delta sync token; return None if it is malformed"""
+    try:
+        parts = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+        if len(parts) == 2:
+            # Tokens issued before the conversation id was added resume at the start of their timestamp
+            parts = [parts[0], 0, 0]
+        changed_at, conversation_id, message_id = parts
+        return datetime.fromisoformat(changed_at), int(conversation_id), int(message_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def encode_page_cursor(values):
+    """Encode the sort key of the last item on a page as an opaque cursor"""
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_page_cursor(token):
+    """Decode a page cursor; return None if it is malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+        if not isinstance(values, list):
+            return None
+        return tuple(datetime.fromisoformat(value) if isinstance(value, str) else value for value in values)
+    except (ValueError, UnicodeDecodeError, TypeError):
+        return None
+
+def message_preview(text):
+    """Truncate message text for inbox listings"""
+    if text and len(text) > MESSAGE_PREVIEW_LENGTH:
+        return text[:MESSAGE_PREVIEW_LENGTH] + '...'
+    return text
+
+def compact_requested():
+    """Check whether the client asked for the compact inbox payload"""
+    return request.args.get('compact', '').lower() in ('1', 'true', 'yes')
+
+def shape_conversations(conversations_data):
+    """Apply the fields= sparse fieldset and compact=1 property deduplication"""
+    fields = request.args.get('fields', '').strip()
+    compact = compact_requested()
+    wanted = {field.strip() for field in fields.split(',') if field.strip()} | {'id'} if fields else None
+    
+    properties = {} if compact else None
+    for conversation_data in conversations_data:
+        if wanted is not None:
+            for key in list(conversation_data.keys()):
+                if key not in wanted:
+                    del conversation_data[key]
+        
+        # Replace the repeated property block with a reference into a side table
+        if compact and conversation_data.get('property'):
+            property_data = conversation_data.pop('property')
+            properties[str(property_data['id'])] = property_data
+            conversation_data['property_id'] = property_data['id']
+    
+    return conversations_data, properties
+
+def enqueue_message_created(message, conversation):
+    """Queue post-send side effects for the outbox worker in the sender's transaction"""
+    db.session.flush()
+    MessageOutboxEvent.enqueue('message.created', {
+        'message_id': message.id,
+        'conversation_id': conversation.id,
+        'property_id': conversation.property_id,
+        'sender_id': message.sender_id,
+        'sender_type': message.sender_type,
+        'has_attachment': message.has_attachment()
+    })
+
+def invalidate_conversation_inboxes(conversation):
+    """Drop cached inbox views of everyone taking part in a conversation"""
+    invalidate_inbox(conversation.user_id, conversation.agent_id, conversation.owner_id)
+
+def add_presence(conversations_data, conversations, current_user_id):
+    """Fold online and typing state into inbox entries using ids already in memory"""
+    presence_by_id = presence.conversation_presence(
+        {conv.id: (conv.user_id, conv.agent_id, conv.owner_id) for conv in conversations}, current_user_id
+    )
+    for conversation_data in conversations_data:
+        conversation_ids = conversation_data.get('conversation_ids') or [conversation_data['id']]
+        entries = [presence_by_id[conversation_id] for conversation_id in conversation_ids
+                   if conversation_id in presence_by_id]
+        online = sorted({user_id for entry in entries for user_id in entry['online']})
+        conversation_data['presence'] = {
+            'is_online': bool(online),
+            'online_user_ids': online,
+            'typing': [typing for entry in entries for typing in entry['typing']]
+        }
+
+def rollup_totals_columns(since):
+    """Aggregates over rollup rows: gauges over all days, flows over the stats window"""
+    in_window = MessagingRollup.day >= since
+    
+    def windowed(column):
+        return func.coalesce(func.sum(case((in_window, column), else_=0)), 0)
+    
+    return [
+        func.coalesce(func.sum(MessagingRollup.conversations_opened), 0),
+        func.coalesce(func.sum(MessagingRollup.conversations_closed), 0),
+        func.coalesce(func.sum(MessagingRollup.conversations_reopened), 0),
+        func.coalesce(func.sum(MessagingRollup.unread_delta), 0),
+        windowed(MessagingRollup.messages_sent),
+        windowed(MessagingRollup.messages_received),
+        windowed(MessagingRollup.first_responses),
+        windowed(MessagingRollup.first_response_seconds),
+    ]
+
+def rollup_stats(totals):
+    """Dashboard stats from the aggregates of rollup_totals_columns"""
+    opened, closed, reopened, unread, sent, received, first_responses, first_response_seconds = (int(value) for value in totals)
+    return {
+        'total_conversations': opened,
+        'open_conversations': opened - closed + reopened,
+        'closed_conversations': closed - reopened,
+        'total_unread': max(unread, 0),
+        'messages_sent': sent,
+        'messages_received': received,
+        'first_responses': first_responses,
+        'avg_first_response_seconds': round(first_response_seconds / first_responses) if first_responses else None
+    }
 
 def add_cors_headers(response):
     """Add CORS headers to response"""
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Request-ID')
     response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PUT,DELETE,OPTIONS')
     return response
 
+@tenant_messaging_bp.record_once
+def setup_logging(state):
+    """Send app logs as JSON lines through a background queue listener"""
+    if state.app.config.get('STRUCTURED_LOGGING_ENABLED', True):
+        configure_logging(state.app)
+
+@tenant_messaging_bp.before_request
+def start_request_log_context():
+    """Tag every log line of this request with a correlation ID"""
+    assign_request_id()
+
+@tenant_messaging_bp.after_request
+def add_request_id_header(response):
+    """Echo the correlation ID so clients and proxies can quote it"""
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+@tenant_messaging_bp.after_request
+def record_presence_heartbeat(response):
+    """Any authenticated request counts as a presence heartbeat (no database access)"""
+    try:
+        current_user_id = get_jwt_identity()
+    except RuntimeError:  # No verified JWT on this request
+        return response
+    if current_user_id is not None:
+        presence.heartbeat(current_user_id)
+    return response
+
+@tenant_messaging_bp.record_once
+def setup_request_profiler(state):
+    """Create the opt-in request profiler when the blueprint is registered"""
+    state.app.extensions['request_profiler'] = create_request_profiler(state.app)
+
+@tenant_messaging_bp.record_once
+def setup_fork_safety(state):
+    """Let workers forked from a preloaded app open their own connections and log listener"""
+    startup.register_fork_handlers(state.app, db)
+
+@tenant_messaging_bp.record_once
+def setup_message_shards(state):
+    """Route this app's conversations and messages to MESSAGE_SHARD_BINDS when it is configured"""
+    if message_shards.shard_binds(state.app):
+        message_shards.configure_session(state.app, db)
+
+@tenant_messaging_bp.record_once
+def setup_schema_migrations(state):
+    """Apply pending messaging schema steps at startup when MESSAGING_AUTO_MIGRATE is set (off by default)
+
+    Only the quick DDL steps run here; backfills run from the migrate-schema
+    command, and reads use the legacy columns until they have. Deploys normally
+    run migrate-schema once instead, so worker boot does no migration work. A
+    failure stops the app from starting rather than serving a half-migrated schema.
+    """
+    if not state.app.config.get('MESSAGING_AUTO_MIGRATE', False):
+        return
+    with state.app.app_context():
+        applied = schema_migrations.apply_migrations(include_backfills=False)
+        if applied:
+            state.app.logger.info("Applied messaging migrations: %s", ', '.join(applied))
+
+@tenant_messaging_bp.record_once
+def setup_metrics(state):
+    """Start counting and timing SQL statements"""
+    metrics.install_query_timing()
+
+@tenant_messaging_bp.before_request
+def start_request_metrics():
+    """Track in-flight requests and note the start time for the latency histogram"""
+    g.metrics_started = time.perf_counter()
+    metrics.REQUESTS_IN_PROGRESS.inc()
+
+@tenant_messaging_bp.after_request
+def record_request_metrics(response):
+    """Observe request latency by endpoint and status, and pool utilisation"""
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        metrics.REQUEST_SECONDS.labels(request.endpoint, request.method, response.status_code)\
+            .observe(time.perf_counter() - started)
+    metrics.observe_pool(db.engine)
+    return response
+
+@tenant_messaging_bp.teardown_request
+def finish_request_metrics(exc):
+    """Runs even when the view raised, so the in-flight gauge never leaks"""
+    metrics.REQUESTS_IN_PROGRESS.dec()
+
+@tenant_messaging_bp.before_request
+def start_request_profile():
+    """Register the request with the sampling profiler (no-op unless PROFILER_ENABLED)"""
+    profiler = current_app.extensions.get('request_profiler')
+    if profiler:
+        profiler.start_request()
+
+@tenant_messaging_bp.teardown_request
+def finish_request_profile(exc):
+    """Write a profile if the request was slow or picked for sampling"""
+    profiler = current_app.extensions.get('request_profiler')
+    if profiler:
+        profiler.finish_request(f"{request.method} {request.endpoint}")
+
+@tenant_messaging_bp.after_request
+def compress_json_responses(response):
+    """Compress large JSON responses such as inbox listings"""
+    if current_app.config.get('RESPONSE_COMPRESSION_ENABLED', True):
+        return compress_response(response)
+    return response
+
 # Simple send endpoint (handles both new conversations and replies)
 @tenant_messaging_bp.route('/send', methods=['POST', 'OPTIONS'])
 @jwt_required()
+@rate_limit('send')
+@idempotent
 def send_message():
     """Send a message (create conversation or add to existing)"""
     if request.method == 'OPTIONS':
         response = jsonify({'message': 'OK'})
         return add_cors_headers(response)
     
+    uploaded_attachment = None
     try:
         current_user_id = get_jwt_identity()
         user = User.query.get(current_user_id)
@@ -119,7 +431,11 @@ def send_message():
         message_text = data.get('message_text', '').strip()
         subject = data.get('subject', '').strip()
         
-        current_app.logger.info(f"Validation - message_text: '{message_text}', len: {len(message_text)}, bool: {bool(message_text)}")
+        current_app.logger.debug(
+            "Send message validation", extra=debug_fields(current_app.logger, lambda: {
+                'conversation_id': conversation_id, 'message_length': len(message_text), 'has_files': bool(files)
+            })
+        )
         
         if not message_text:
             return error_response("Message is required", status_code=400)
@@ -157,7 +473,7 @@ def send_message():
                 status='open',
                 last_message_at=datetime.utcnow(),
                 unread_count_tenant=0,
-                unread_count_agent=1
+                unread_count_agent=0  # Incremented below together with the message
             )
             
             db.session.add(conversation)
@@ -182,6 +498,15 @@ def send_message():
             attachment_name, attachment_url, attachment_size, attachment_type = handle_attachment_upload(
                 files['attachment'], conversation_id
             )
+            uploaded_attachment = attachment_url
+        elif data.get('attachment_key'):
+            # Attachment already uploaded to storage with a presigned URL
+            attachment_name, attachment_url, attachment_size, attachment_type = confirm_direct_upload(
+                data['attachment_key'], conversation_id, current_user_id, data.get('attachment_name')
+            )
+            if not attachment_url:
+                db.session.rollback()
+                return error_response("Attachment upload not found or invalid", status_code=400)
         
         # Determine sender type
         if user_role == 'tenant':
@@ -201,19 +526,17 @@ def send_message():
             attachment_url=attachment_url,
             attachment_name=attachment_name,
             attachment_size=attachment_size,
-            attachment_type=attachment_type,
-            is_read_by_tenant=sender_type == 'tenant',
-            is_read_by_agent=sender_type != 'tenant'
+            attachment_type=attachment_type
         )
         
         db.session.add(message)
         
-        # Update conversation
-        conversation.last_message_at = datetime.utcnow()
-        conversation.status = 'open'
-        conversation.increment_unread_for_recipients(sender_type)
+        # Update conversation counters and last_message_at in a single atomic statement
+        conversation.increment_unread_for_recipients(sender_type, sender_id=current_user_id)
+        enqueue_message_created(message, conversation)
         
         db.session.commit()
+        invalidate_conversation_inboxes(conversation)
         
         return success_response(
             data={
@@ -229,32 +552,33 @@ def send_message():
         
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"Send message error: {str(e)}")
+        # The file was written before the failed commit; nothing references it now
+        if uploaded_attachment:
+            discard_attachment(uploaded_attachment)
+        current_app.logger.exception("Send message error: %s", e)
         return error_response("Failed to send message", status_code=500)
 
 
 # Get tenant's conversations (matches frontend API)
 @tenant_messaging_bp.route('/conversations', methods=['GET', 'OPTIONS'])
 @jwt_required()
+@rate_limit('poll')
+@cached_inbox
 def get_conversations():
     """Get all conversations for the current user"""
     if request.method == 'OPTIONS':
         response = jsonify({'message': 'OK'})
         return add_cors_headers(response)
     
-    current_app.logger.info("GET /conversations - Function reached")
-    
     try:
         current_user_id = get_jwt_identity()
         user = User.query.get(current_user_id)
         
-        current_app.logger.info(f"GET /conversations - User ID: {current_user_id}, User found: {user is not None}")
-        
         if not user:
             return error_response("User not found", status_code=404)
         
         user_role = get_user_role(current_user_id)
-        current_app.logger.info(f"GET /conversations - User role: {user_role}")
+        current_app.logger.debug("Listing conversations", extra={'user_id': current_user_id, 'role': user_role})
         
         if not user_role:
             return error_response("User role not found", status_code=403)
@@ -263,12 +587,30 @@ def get_conversations():
         limit = request.args.get('limit', 20, type=int)
         status_filter = request.args.get('status', 'all')
         search = request.args.get('search', '').strip()
+        cursor = request.args.get('cursor')
+        next_cursor = None
         
         # Modified query to group conversations by sender for agents/owners
         if user_role == 'tenant':
+            # Newest activity first; the id breaks ties so the order is total and a cursor can resume it
+            inbox_order = [func.coalesce(TenantConversation.last_message_at, TenantConversation.created_at),
+                           TenantConversation.id]
+            inbox_key = lambda conv: (conv.last_message_at or conv.created_at, conv.id)
             conversations_query = TenantConversation.query.filter_by(user_id=current_user_id)
-            conversations_query = conversations_query.order_by(desc(TenantConversation.last_message_at))
-            conversations = conversations_query.paginate(page=page, per_page=limit, error_out=False)
+            if cursor:
+                # Keyset pagination: each shard reads at most limit + 1 rows, however deep the page
+                after = decode_page_cursor(cursor)
+                if not after or len(after) != len(inbox_order):
+                    return error_response("Invalid cursor", status_code=400)
+                items, last = message_shards.keyset_page(conversations_query, inbox_order, limit, after, descending=True)
+                conversations = message_shards.ShardedPagination(items, page, limit, None)
+                next_cursor = encode_page_cursor(last) if last else None
+            else:
+                conversations_query = conversations_query.order_by(*[desc(column) for column in inbox_order])
+                conversations = message_shards.paginate(conversations_query, page, limit, key=inbox_key, reverse=True)
+                if conversations.has_next and conversations.items:
+                    next_cursor = encode_page_cursor(inbox_key(conversations.items[-1]))
+            listed_conversations = conversations.items
             
             conversations_data = []
             for conv in conversations.items:
@@ -303,7 +645,7 @@ def get_conversations():
                     'property': property_data,
                     'other_participant': other_participant,
                     'latest_message': {
-                        'text': latest_message.message_text[:100] + '...' if latest_message and latest_message.message_text and len(latest_message.message_text) > 100 else (latest_message.message_text if latest_message else None),
+                        'text': message_preview(latest_message.message_text),
                         'sender_name': latest_message.sender_name if latest_message else None,
                         'created_at': latest_message.created_at.isoformat() if latest_message else None,
                         'has_attachment': latest_message.has_attachment() if latest_message else False
@@ -315,12 +657,9 @@ def get_conversations():
         else:
             # For agents/owners: Group conversations by sender (user_id)
             # Get all conversations for this agent/owner
-            all_conversations = TenantConversation.query.filter(
-                or_(
-                    TenantConversation.agent_id == current_user_id,
-                    TenantConversation.owner_id == current_user_id
-                )
-            ).all()
+            participant_rows = participant_conversations_query(current_user_id).all()
+            all_conversations = [conv for conv, _ in participant_rows]
+            unread_by_conversation = {conv.id: unread for conv, unread in participant_rows}
             
             # Group conversations by user_id (sender)
             grouped_conversations = {}
@@ -342,7 +681,7 @@ def get_conversations():
                         grouped_conversations[user_key]['latest_message_time'] = conv.last_message_at
                 
                 # Add up unread counts from all conversations for this user
-                unread_count = conv.get_unread_count_for_user(current_user_id, user_role)
+                unread_count = unread_by_conversation[conv.id]
                 grouped_conversations[user_key]['total_unread'] += unread_count
             
             # Apply filters and search
@@ -389,6 +728,7 @@ def get_conversations():
             end_idx = start_idx + limit
             paginated_groups = sorted_groups[start_idx:end_idx]
             
+            listed_conversations = [conv for _, group_data in paginated_groups for conv in group_data['conversations']]
             conversations_data = []
             for user_id, group_data in paginated_groups:
                 # Get the most recent conversation for this user to represent the group
@@ -430,7 +770,7 @@ def get_conversations():
                     'property': property_data,
                     'other_participant': other_participant,
                     'latest_message': {
-                        'text': latest_message.message_text[:100] + '...' if latest_message and latest_message.message_text and len(latest_message.message_text) > 100 else (latest_message.message_text if latest_message else None),
+                        'text': message_preview(latest_message.message_text),
                         'sender_name': latest_message.sender_name if latest_message else None,
                         'created_at': latest_message.created_at.isoformat() if latest_message else None,
                         'has_attachment': latest_message.has_attachment() if latest_message else False
@@ -444,22 +784,30 @@ def get_conversations():
             has_prev = start_idx > 0
             total_pages = (total_groups + limit - 1) // limit
         
+        # Cached with the rest of the inbox, so this can lag by INBOX_CACHE_TTL; /presence is always current
+        add_presence(conversations_data, listed_conversations, current_user_id)
+        conversations_data, properties = shape_conversations(conversations_data)
+        response_data = {
+            'conversations': conversations_data,
+            'pagination': {
+                'total': total_groups if user_role != 'tenant' else conversations.total,
+                'page': page,
+                'pages': total_pages if user_role != 'tenant' else conversations.pages,
+                'has_next': has_next if user_role != 'tenant' else (conversations.has_next or bool(next_cursor)),
+                'has_prev': has_prev if user_role != 'tenant' else conversations.has_prev,
+                'next_cursor': next_cursor
+            }
+        }
+        if properties is not None:
+            response_data['properties'] = properties
+        
         return success_response(
-            data={
-                'conversations': conversations_data,
-                'pagination': {
-                    'total': total_groups if user_role != 'tenant' else conversations.total,
-                    'page': page,
-                    'pages': total_pages if user_role != 'tenant' else conversations.pages,
-                    'has_next': has_next if user_role != 'tenant' else conversations.has_next,
-                    'has_prev': has_prev if user_role != 'tenant' else conversations.has_prev
-                }
-            },
+            data=response_data,
             message="Conversations retrieved successfully"
         )
         
     except Exception as e:
-        current_app.logger.error(f"Get conversations error: {str(e)}")
+        current_app.logger.exception("Get conversations error: %s", e)
         return error_response("Failed to retrieve conversations", status_code=500)
 
 
@@ -467,6 +815,8 @@ def get_conversations():
 # Create new conversation endpoint
 @tenant_messaging_bp.route('/conversations', methods=['POST', 'OPTIONS'])
 @jwt_required()
+@rate_limit('send')
+@idempotent
 def create_conversation():
     """Create a new conversation (tenant only)"""
     if request.method == 'OPTIONS':
@@ -518,7 +868,7 @@ def create_conversation():
             status='open',
             last_message_at=datetime.utcnow(),
             unread_count_tenant=0,
-            unread_count_agent=1
+            unread_count_agent=0  # Incremented below together with the message
         )
         
         db.session.add(conversation)
@@ -530,13 +880,14 @@ def create_conversation():
             sender_id=current_user_id,
             sender_name=user.full_name,
             sender_type='tenant',
-            message_text=message_text,
-            is_read_by_tenant=True,
-            is_read_by_agent=False
+            message_text=message_text
         )
         
         db.session.add(message)
+        conversation.increment_unread_for_recipients('tenant', sender_id=current_user_id)
+        enqueue_message_created(message, conversation)
         db.session.commit()
+        invalidate_conversation_inboxes(conversation)
         
         return success_response(
             data={
@@ -553,12 +904,14 @@ def create_conversation():
         
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"Create conversation error: {str(e)}")
+        current_app.logger.exception("Create conversation error: %s", e)
         return error_response("Failed to create conversation", status_code=500)
 
 # Get tenant's conversations (preferred endpoint)
 @tenant_messaging_bp.route('/my-conversations', methods=['GET', 'OPTIONS'])
 @jwt_required()
+@rate_limit('poll')
+@cached_inbox
 def get_my_conversations():
     """Get tenant's conversations (simplified view)"""
     if request.method == 'OPTIONS':
@@ -576,28 +929,19 @@ def get_my_conversations():
         if not user_role:
             return error_response("User role not found", status_code=403)
         
-        # Query conversations based on user role
-        if user_role == 'tenant':
-            conversations_query = TenantConversation.query.filter_by(user_id=current_user_id)
-        else:
-            conversations_query = TenantConversation.query.filter(
-                or_(
-                    TenantConversation.agent_id == current_user_id,
-                    TenantConversation.owner_id == current_user_id
-                )
-            )
-        
-        conversations = conversations_query.order_by(desc(TenantConversation.last_message_at)).all()
+        # Query conversations the user takes part in, with their own unread count
+        conversations = message_shards.merge_ordered(
+            participant_conversations_query(current_user_id).order_by(desc(TenantConversation.last_message_at)).all(),
+            key=lambda row: row[0].last_message_at or datetime.min, reverse=True
+        )
+        compact = compact_requested()
         
         conversations_data = []
-        for conv in conversations:
+        for conv, unread_count in conversations:
             # Get latest message
             latest_message = TenantMessage.query.filter_by(conversation_id=conv.id)\
                 .order_by(desc(TenantMessage.created_at)).first()
             
-            # Get unread count for current user
-            unread_count = conv.get_unread_count_for_user(current_user_id, user_role)
-            
             conversation_data = {
                 'id': conv.id,
                 'subject': conv.subject,
@@ -606,7 +950,7 @@ def get_my_conversations():
                 'last_message_at': conv.last_message_at.isoformat() if conv.last_message_at else None,
                 'created_at': conv.created_at.isoformat(),
                 'latest_message': {
-                    'text': latest_message.message_text if latest_message else None,
+                    'text': message_preview(latest_message.message_text) if compact else latest_message.message_text,
                     'sender_name': latest_message.sender_name if latest_message else None,
                     'created_at': latest_message.created_at.isoformat() if latest_message else None
                 } if latest_message else None
@@ -614,18 +958,20 @@ def get_my_conversations():
             
             conversations_data.append(conversation_data)
         
+        conversations_data, _ = shape_conversations(conversations_data)
         return success_response(
             data={'conversations': conversations_data},
             message="Conversations retrieved successfully"
         )
         
     except Exception as e:
-        current_app.logger.error(f"Get my conversations error: {str(e)}")
+        current_app.logger.exception("Get my conversations error: %s", e)
         return error_response("Failed to retrieve conversations", status_code=500)
 
 # Get messages in specific conversation
 @tenant_messaging_bp.route('/conversations/<int:conversation_id>/messages', methods=['GET', 'OPTIONS'])
 @jwt_required()
+@rate_limit('poll')
 def get_conversation_messages(conversation_id):
     """Get messages for a specific conversation or grouped conversations"""
     if request.method == 'OPTIONS':
@@ -654,47 +1000,65 @@ def get_conversation_messages(conversation_id):
         # Get pagination parameters
         page = request.args.get('page', 1, type=int)
         limit = request.args.get('limit', 50, type=int)
+        cursor = request.args.get('cursor')
+        after = None
+        if cursor:
+            after = decode_page_cursor(cursor)
+            if not after or len(after) != 3:
+                return error_response("Invalid cursor", status_code=400)
         
         # For agents/owners, check if this is a grouped conversation
         # by finding all conversations with the same user_id
         if user_role != 'tenant':
             # Get all conversations for the same sender (user_id)
-            all_user_conversations = TenantConversation.query.filter(
-                and_(
-                    TenantConversation.user_id == conversation.user_id,
-                    or_(
-                        TenantConversation.agent_id == current_user_id,
-                        TenantConversation.owner_id == current_user_id
-                    )
-                )
-            ).all()
+            all_user_conversations = [
+                conv for conv, _ in participant_conversations_query(current_user_id)
+                .filter(TenantConversation.user_id == conversation.user_id).all()
+            ]
             
             # Get all conversation IDs for this user
             conversation_ids = [conv.id for conv in all_user_conversations]
             
-            # Get messages from all conversations for this user
+            # Get messages from all conversations for this user. No message predates its
+            # conversation, so the created_at bound lets PostgreSQL prune older partitions.
             messages_query = TenantMessage.query.filter(
-                TenantMessage.conversation_id.in_(conversation_ids)
-            ).order_by(TenantMessage.created_at)
+                TenantMessage.conversation_id.in_(conversation_ids),
+                TenantMessage.created_at >= min(conv.created_at for conv in all_user_conversations)
+            )
             
             # Mark all conversations as read for this user
             for conv in all_user_conversations:
                 conv.mark_messages_as_read(current_user_id, user_role)
         else:
             # For tenants, only show messages from the specific conversation
-            messages_query = TenantMessage.query.filter_by(conversation_id=conversation_id)\
-                .order_by(TenantMessage.created_at)
+            messages_query = TenantMessage.query.filter(
+                TenantMessage.conversation_id == conversation_id,
+                TenantMessage.created_at >= conversation.created_at
+            )
             
             # Mark this conversation as read
             conversation.mark_messages_as_read(current_user_id, user_role)
         
-        # Apply pagination
-        messages = messages_query.paginate(page=page, per_page=limit, error_out=False)
+        # Apply pagination on (created_at, conversation id, id), the same key as the cursors
+        message_order = [TenantMessage.created_at, TenantMessage.conversation_id, TenantMessage.id]
+        message_key = lambda message: (message.created_at, message.conversation_id, message.id)
+        next_cursor = None
+        if after:
+            items, last = message_shards.keyset_page(messages_query, message_order, limit, after)
+            messages = message_shards.ShardedPagination(items, page, limit, None)
+            next_cursor = encode_page_cursor(last) if last else None
+        else:
+            messages = message_shards.paginate(
+                messages_query.order_by(*message_order), page, limit, key=message_key
+            )
+            if messages.has_next and messages.items:
+                next_cursor = encode_page_cursor(message_key(messages.items[-1]))
         
         messages_data = [message.to_dict(user_role) for message in messages.items]
         
         # Commit the read status changes
         db.session.commit()
+        invalidate_inbox(current_user_id)
         
         return success_response(
             data={
@@ -704,21 +1068,101 @@ def get_conversation_messages(conversation_id):
                     'total': messages.total,
                     'page': page,
                     'pages': messages.pages,
-                    'has_next': messages.has_next,
-                    'has_prev': messages.has_prev
+                    'has_next': messages.has_next or bool(next_cursor),
+                    'has_prev': messages.has_prev,
+                    'next_cursor': next_cursor
                 }
             },
             message="Messages retrieved successfully"
         )
         
     except Exception as e:
-        current_app.logger.error(f"Get conversation messages error: {str(e)}")
+        current_app.logger.exception("Get conversation messages error: %s", e)
         return error_response("Failed to retrieve messages", status_code=500)
 
 
 
+# Prefetch the latest messages of several conversations
+@tenant_messaging_bp.route('/conversations/messages/batch', methods=['GET', 'OPTIONS'])
+@jwt_required()
+@rate_limit('poll')
+def get_batch_conversation_messages():
+    """Latest N messages for each requested conversation in one round-trip (read-only)"""
+    if request.method == 'OPTIONS':
+        response = jsonify({'message': 'OK'})
+        return add_cors_headers(response)
+    
+    try:
+        current_user_id = get_jwt_identity()
+        try:
+            conversation_ids = list(dict.fromkeys(
+                int(value) for value in request.args.get('conversation_ids', '').split(',') if value.strip()
+            ))
+        except ValueError:
+            return error_response("conversation_ids must be a comma-separated list of ids", status_code=400)
+        
+        if not conversation_ids:
+            return error_response("conversation_ids is required", status_code=400)
+        if len(conversation_ids) > MAX_PREFETCH_CONVERSATIONS:
+            return error_response(f"At most {MAX_PREFETCH_CONVERSATIONS} conversations per request", status_code=400)
+        limit = max(1, min(request.args.get('limit', PREFETCH_DEFAULT_MESSAGES, type=int), PREFETCH_MAX_MESSAGES))
+        
+        user_role = get_user_role(current_user_id)
+        if not user_role:
+            return error_response("User role not found", status_code=403)
+        
+        # One access check for the whole set: requested ids the caller takes part in
+        conversations = TenantConversation.query.options(selectinload(TenantConversation.property)).filter(
+            TenantConversation.id.in_(conversation_ids),
+            TenantConversation.id.in_(ConversationParticipant.conversation_ids_for(current_user_id))
+        ).all()
+        allowed_ids = [conversation.id for conversation in conversations]
+        
+        # Newest `limit` messages per conversation, ranked in a single window query
+        batch = {conversation.id: {'conversation': conversation.to_dict(user_role), 'messages': [], 'total': 0}
+                 for conversation in conversations}
+        if allowed_ids:
+            partition = TenantMessage.conversation_id
+            ranked = db.session.query(
+                TenantMessage,
+                func.row_number().over(
+                    partition_by=partition, order_by=(TenantMessage.created_at.desc(), TenantMessage.id.desc())
+                ).label('position'),
+                func.count().over(partition_by=partition).label('total')
+            ).filter(
+                TenantMessage.conversation_id.in_(allowed_ids),
+                TenantMessage.created_at >= min(conversation.created_at for conversation in conversations)
+            ).subquery()
+            latest = aliased(TenantMessage, ranked)
+            rows = db.session.query(latest, ranked.c.total).filter(ranked.c.position <= limit)\
+                .order_by(ranked.c.conversation_id, ranked.c.created_at, ranked.c.id).all()
+            for message, total in rows:
+                entry = batch[message.conversation_id]
+                entry['messages'].append(message.to_dict(user_role))
+                entry['total'] = total
+        for entry in batch.values():
+            entry['has_more'] = entry['total'] > len(entry['messages'])
+        
+        return success_response(
+            data={
+                'conversations': {str(conversation_id): entry for conversation_id, entry in batch.items()},
+                'unavailable_ids': [conversation_id for conversation_id in conversation_ids
+                                    if conversation_id not in batch],
+                'limit': limit
+            },
+            message="Messages retrieved successfully"
+        )
+        
+    except Exception as e:
+        current_app.logger.exception("Get batch conversation messages error: %s", e)
+        return error_response("Failed to retrieve messages", status_code=500)
+
+
 # Send reply message in existing conversation
 @tenant_messaging_bp.route('/conversations/<int:conversation_id>/messages', methods=['POST', 'OPTIONS'])
+@jwt_required()
+@rate_limit('send')
+@idempotent
 def send_reply_message(conversation_id):
     """Send reply message in existing conversation"""
     if request.method == 'OPTIONS':
@@ -764,19 +1208,17 @@ def send_reply_message(conversation_id):
             sender_id=current_user_id,
             sender_name=user.full_name,
             sender_type=sender_type,
-            message_text=message_text,
-            is_read_by_tenant=sender_type == 'tenant',
-            is_read_by_agent=sender_type != 'tenant'
+            message_text=message_text
         )
         
         db.session.add(message)
         
-        # Update conversation
-        conversation.last_message_at = datetime.utcnow()
-        conversation.status = 'open'
-        conversation.increment_unread_for_recipients(sender_type)
+        # Update conversation counters and last_message_at in a single atomic statement
+        conversation.increment_unread_for_recipients(sender_type, sender_id=current_user_id)
+        enqueue_message_created(message, conversation)
         
         db.session.commit()
+        invalidate_conversation_inboxes(conversation)
         
         return success_response(
             data={'message': message.to_dict(user_role)},
@@ -785,13 +1227,65 @@ def send_reply_message(conversation_id):
         
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"Send reply message error: {str(e)}")
+        current_app.logger.exception("Send reply message error: %s", e)
         return error_response("Failed to send reply", status_code=500)
 
-send_reply_message = jwt_required()(send_reply_message)
+# Dashboard stats, read from the incrementally maintained rollups only
+@tenant_messaging_bp.route('/stats', methods=['GET', 'OPTIONS'])
+@jwt_required()
+@rate_limit('poll')
+def get_messaging_stats():
+    """Conversation, backlog and first-response stats for the current user (admins: all agents)"""
+    if request.method == 'OPTIONS':
+        response = jsonify({'message': 'OK'})
+        return add_cors_headers(response)
+    
+    try:
+        current_user_id = get_jwt_identity()
+        user_role = get_user_role(current_user_id)
+        if not user_role:
+            return error_response("User role not found", status_code=403)
+        
+        days = min(max(request.args.get('days', STATS_DEFAULT_DAYS, type=int), 1), STATS_MAX_DAYS)
+        since = datetime.utcnow().date() - timedelta(days=days - 1)
+        group_by = request.args.get('group_by')
+        if group_by and group_by not in STATS_GROUPS:
+            return error_response("group_by must be one of: property, day, user", status_code=400)
+        
+        # Admins see every participant of a role (agent by default); everyone else sees their own rows
+        if user_role == 'admin':
+            scope = MessagingRollup.role == request.args.get('role', 'agent')
+        else:
+            scope = MessagingRollup.user_id == current_user_id
+        
+        # One aggregate row per message shard (a single row when not sharded)
+        columns = rollup_totals_columns(since)
+        totals = message_shards.sum_rows(db.session.query(*columns).filter(scope).all())
+        response_data = {'stats': rollup_stats(totals), 'period_days': days}
+        
+        if group_by:
+            group_column = STATS_GROUPS[group_by]
+            breakdown_query = db.session.query(group_column, *columns).filter(scope)
+            if group_by == 'day':
+                breakdown_query = breakdown_query.filter(MessagingRollup.day >= since)
+            breakdown = message_shards.merge_groups(breakdown_query.group_by(group_column).order_by(group_column).all())
+            response_data['breakdown'] = [
+                {group_by: key.isoformat() if group_by == 'day' and hasattr(key, 'isoformat') else key,
+                 **rollup_stats(row)}
+                for key, *row in breakdown
+            ]
+        
+        return success_response(data=response_data, message="Stats retrieved successfully")
+        
+    except Exception as e:
+        current_app.logger.exception("Get messaging stats error: %s", e)
+        return error_response("Failed to retrieve stats", status_code=500)
 
 # Get unread message count for tenant
 @tenant_messaging_bp.route('/unread-count', methods=['GET', 'OPTIONS'])
+@jwt_required()
+@rate_limit('poll', adaptive=True)
+@cached_inbox
 def get_unread_count():
     """Get unread message count for tenant"""
     if request.method == 'OPTIONS':
@@ -809,18 +1303,16 @@ def get_unread_count():
         if not user_role:
             return error_response("User role not found", status_code=403)
         
-        # Get total unread count
-        if user_role == 'tenant':
-            total_unread = db.session.query(db.func.sum(TenantConversation.unread_count_tenant))\
-                .filter_by(user_id=current_user_id).scalar() or 0
+        # Get total unread count (timed to drive the adaptive polling limit)
+        query_started = time.perf_counter()
+        if ConversationParticipant.ready():
+            unread_query = db.session.query(db.func.sum(ConversationParticipant.unread_count))\
+                .filter(ConversationParticipant.user_id == current_user_id)
         else:
-            total_unread = db.session.query(db.func.sum(TenantConversation.unread_count_agent))\
-                .filter(
-                    or_(
-                        TenantConversation.agent_id == current_user_id,
-                        TenantConversation.owner_id == current_user_id
-                    )
-                ).scalar() or 0
+            unread_query = db.session.query(db.func.sum(TenantConversation.unread_column_for(current_user_id)))\
+                .filter(TenantConversation.involving(current_user_id))
+        total_unread = message_shards.sum_rows(unread_query.all())[0]
+        db_latency.observe(time.perf_counter() - query_started)
         
         return success_response(
             data={'unread_count': total_unread},
@@ -828,13 +1320,150 @@ def get_unread_count():
         )
         
     except Exception as e:
-        current_app.logger.error(f"Get unread count error: {str(e)}")
+        current_app.logger.exception("Get unread count error: %s", e)
         return error_response("Failed to retrieve unread count", status_code=500)
 
-get_unread_count = jwt_required()(get_unread_count)
+# Delta sync: conversations and messages changed since a cursor
+@tenant_messaging_bp.route('/sync', methods=['GET', 'OPTIONS'])
+@jwt_required()
+@rate_limit('poll')
+def sync_changes():
+    """Get conversations and messages changed since the given sync token"""
+    if request.method == 'OPTIONS':
+        response = jsonify({'message': 'OK'})
+        return add_cors_headers(response)
+    
+    try:
+        current_user_id = get_jwt_identity()
+        user_role = get_user_role(current_user_id)
+        if not user_role:
+            return error_response("User role not found", status_code=403)
+        
+        since_token = request.args.get('since')
+        if since_token:
+            cursor = decode_sync_token(since_token)
+            if not cursor:
+                return error_response("Invalid sync token", status_code=400)
+        else:
+            cursor = (datetime.min, 0, 0)
+        since = cursor[0]
+        limit = min(request.args.get('limit', SYNC_PAGE_SIZE, type=int), SYNC_PAGE_SIZE)
+        sync_started_at = datetime.utcnow()
+        
+        conversation_ids = ConversationParticipant.conversation_ids_for(current_user_id)
+        
+        # Conversations whose metadata, counters or latest message changed
+        conversations = TenantConversation.query.filter(
+            TenantConversation.id.in_(conversation_ids),
+            or_(
+                TenantConversation.updated_at > since,
+                TenantConversation.last_message_at > since
+            )
+        ).all()
+        
+        # Messages created or updated after the cursor, ordered by (change time, conversation id, id),
+        # the key the sync token carries
+        changed_at = func.coalesce(TenantMessage.updated_at, TenantMessage.created_at)
+        messages, last = message_shards.keyset_page(
+            TenantMessage.query.filter(TenantMessage.conversation_id.in_(conversation_ids)),
+            [changed_at, TenantMessage.conversation_id, TenantMessage.id], limit, after=cursor
+        )
+        
+        has_more = last is not None
+        if has_more:
+            next_token = encode_sync_token(*last)
+        else:
+            next_token = encode_sync_token(max(since, sync_started_at - SYNC_SAFETY_WINDOW))
+        
+        return success_response(
+            data={
+                'conversations': [conv.to_dict(user_role) for conv in conversations],
+                'messages': [message.to_dict(user_role) for message in messages],
+                'next_token': next_token,
+                'has_more': has_more
+            },
+            message="Changes retrieved successfully"
+        )
+        
+    except Exception as e:
+        current_app.logger.exception("Sync changes error: %s", e)
+        return error_response("Failed to retrieve changes", status_code=500)
+
+# Typing indicator (kept in the presence store, never written to the database)
+@tenant_messaging_bp.route('/typing', methods=['POST', 'OPTIONS'])
+@jwt_required()
+@rate_limit('presence')
+def send_typing_indicator():
+    """Start or stop the current user's typing indicator in a conversation"""
+    if request.method == 'OPTIONS':
+        response = jsonify({'message': 'OK'})
+        return add_cors_headers(response)
+    
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        try:
+            conversation_id = int(data.get('conversation_id'))
+        except (TypeError, ValueError):
+            return error_response("conversation_id is required", status_code=400)
+        
+        if not ConversationParticipant.is_participant(conversation_id, current_user_id):
+            return error_response("Access denied", status_code=403)
+        
+        user = User.query.get(current_user_id)
+        if not user:
+            return error_response("User not found", status_code=404)
+        
+        is_typing = bool(data.get('is_typing', True))
+        presence.set_typing(conversation_id, current_user_id, user.full_name, is_typing)
+        
+        return success_response(
+            data={'conversation_id': conversation_id, 'is_typing': is_typing},
+            message="Typing status updated"
+        )
+        
+    except Exception as e:
+        current_app.logger.exception("Typing indicator error: %s", e)
+        return error_response("Failed to update typing status", status_code=500)
+
+# Online and typing state of the other participants in a set of conversations
+@tenant_messaging_bp.route('/presence', methods=['GET', 'OPTIONS'])
+@jwt_required()
+@rate_limit('presence')
+def get_presence():
+    """Presence for up to MAX_PRESENCE_CONVERSATIONS conversations (one participant lookup, no writes)"""
+    if request.method == 'OPTIONS':
+        response = jsonify({'message': 'OK'})
+        return add_cors_headers(response)
+    
+    try:
+        current_user_id = get_jwt_identity()
+        try:
+            conversation_ids = [int(value) for value in request.args.get('conversation_ids', '').split(',') if value.strip()]
+        except ValueError:
+            return error_response("conversation_ids must be a comma-separated list of ids", status_code=400)
+        
+        if not conversation_ids:
+            return error_response("conversation_ids is required", status_code=400)
+        if len(conversation_ids) > MAX_PRESENCE_CONVERSATIONS:
+            return error_response(f"At most {MAX_PRESENCE_CONVERSATIONS} conversations per request", status_code=400)
+        
+        # Participants of the requested conversations the caller also takes part in
+        participants = ConversationParticipant.user_ids_by_conversation(conversation_ids, current_user_id)
+        presence_data = presence.conversation_presence(participants, current_user_id)
+        
+        return success_response(
+            data={'presence': {str(conversation_id): entry for conversation_id, entry in presence_data.items()}},
+            message="Presence retrieved successfully"
+        )
+        
+    except Exception as e:
+        current_app.logger.exception("Get presence error: %s", e)
+        return error_response("Failed to retrieve presence", status_code=500)
 
 # Close conversation
 @tenant_messaging_bp.route('/conversations/<int:conversation_id>/close', methods=['POST', 'OPTIONS'])
+@jwt_required()
 def close_conversation(conversation_id):
     """Close conversation"""
     if request.method == 'OPTIONS':
@@ -862,6 +1491,7 @@ def close_conversation(conversation_id):
         
         conversation.status = 'closed'
         db.session.commit()
+        invalidate_conversation_inboxes(conversation)
         
         return success_response(
             data={'conversation': conversation.to_dict(user_role)},
@@ -870,13 +1500,12 @@ def close_conversation(conversation_id):
         
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"Close conversation error: {str(e)}")
+        current_app.logger.exception("Close conversation error: %s", e)
         return error_response("Failed to close conversation", status_code=500)
 
-close_conversation = jwt_required()(close_conversation)
-
 # Reopen closed conversation
 @tenant_messaging_bp.route('/conversations/<int:conversation_id>/reopen', methods=['POST', 'OPTIONS'])
+@jwt_required()
 def reopen_conversation(conversation_id):
     """Reopen closed conversation"""
     if request.method == 'OPTIONS':
@@ -904,6 +1533,7 @@ def reopen_conversation(conversation_id):
         
         conversation.status = 'open'
         db.session.commit()
+        invalidate_conversation_inboxes(conversation)
         
         return success_response(
             data={'conversation': conversation.to_dict(user_role)},
@@ -912,63 +1542,84 @@ def reopen_conversation(conversation_id):
         
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"Reopen conversation error: {str(e)}")
+        current_app.logger.exception("Reopen conversation error: %s", e)
         return error_response("Failed to reopen conversation", status_code=500)
 
-reopen_conversation = jwt_required()(reopen_conversation)
+# Legacy upload and download routes, imported on first use (app/routes/tenant_messaging_legacy.py)
+tenant_messaging_bp.add_url_rule('/upload', endpoint='upload_file', methods=['POST', 'OPTIONS'],
+                                 view_func=startup.LazyView('app.routes.tenant_messaging_legacy.upload_file'))
+tenant_messaging_bp.add_url_rule('/download/<path:filename>', endpoint='download_file', methods=['GET'],
+                                 view_func=startup.LazyView('app.routes.tenant_messaging_legacy.download_file'))
 
-# File upload endpoint (legacy)
-@tenant_messaging_bp.route('/upload', methods=['POST', 'OPTIONS'])
-def upload_file():
-    """Upload a file for messaging"""
+# Presigned direct-to-storage upload
+@tenant_messaging_bp.route('/attachments/presign', methods=['POST', 'OPTIONS'])
+@jwt_required()
+@rate_limit('upload')
+def presign_attachment_upload():
+    """Issue a presigned upload for an attachment to be confirmed by POST /send"""
     if request.method == 'OPTIONS':
         response = jsonify({'message': 'OK'})
         return add_cors_headers(response)
     
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user:
-            return error_response("User not found", status_code=404)
-        
-        if 'file' not in request.files:
-            return error_response("No file provided", status_code=400)
+        user_role = get_user_role(current_user_id)
+        if not user_role:
+            return error_response("User role not found", status_code=403)
         
-        file = request.files['file']
-        conversation_id = request.form.get('conversation_id')
+        data = request.get_json() or {}
+        file_name = data.get('file_name', '')
+        content_type = data.get('content_type') or 'application/octet-stream'
+        file_size = data.get('file_size')
+        conversation_id = data.get('conversation_id')
         
-        if file.filename == '':
-            return error_response("No file selected", status_code=400)
+        if not allowed_attachment(file_name):
+            return error_response("Invalid file type", status_code=400)
+        if not isinstance(file_size, int) or not 0 < file_size <= MAX_ATTACHMENT_SIZE:
+            return error_response("Invalid file size", status_code=400)
         
-        # If no conversation_id, create temp folder
-        temp_conv_id = conversation_id or 'temp'
+        storage = attachment_storage()
+        if not storage.supports_direct_upload:
+            return error_response("Direct uploads are not enabled", status_code=400)
         
-        original_name, file_url, file_size, file_type = handle_attachment_upload(file, temp_conv_id)
+        # New conversations do not have an id yet; their uploads live under the user's pending prefix
+        if conversation_id:
+            conversation = TenantConversation.query.get(conversation_id)
+            if not conversation:
+                return error_response("Conversation not found", status_code=404)
+            if not has_conversation_access(conversation, current_user_id, user_role):
+                return error_response("Access denied", status_code=403)
+            key_prefix = str(conversation.id)
+        else:
+            key_prefix = f"pending/{current_user_id}"
         
-        if not file_url:
-            return error_response("Failed to upload file or invalid file type", status_code=400)
+        file_ext = file_name.rsplit('.', 1)[1].lower()
+        attachment_key = f"{key_prefix}/attachment_{uuid.uuid4().hex}.{file_ext}"
+        upload = storage.presigned_upload(attachment_key, content_type, MAX_ATTACHMENT_SIZE, DIRECT_UPLOAD_EXPIRY)
         
         return success_response(
             data={
-                'file_url': file_url,
-                'file_name': original_name,
-                'file_size': file_size,
-                'file_type': file_type
+                'attachment_key': attachment_key,
+                'upload': upload,
+                'expires_in': DIRECT_UPLOAD_EXPIRY
             },
-            message="File uploaded successfully"
+            message="Upload URL created successfully"
         )
         
     except Exception as e:
-        current_app.logger.error(f"File upload error: {str(e)}")
-        return error_response("Failed to upload file", status_code=500)
+        current_app.logger.exception("Presign upload error: %s", e)
+        return error_response("Failed to create upload URL", status_code=500)
 
-upload_file = jwt_required()(upload_file)
-
-# File download endpoint
-@tenant_messaging_bp.route('/download/<path:filename>', methods=['GET'])
-def download_file(filename):
-    """Download a file attachment"""
+# Read-only conversation export for disputes and deposit claims
+@tenant_messaging_bp.route('/export', methods=['GET', 'OPTIONS'])
+@jwt_required()
+@rate_limit('export')
+def export_conversations():
+    """Stream a conversation, or all of a property's or tenant's conversations, as NDJSON, CSV or ZIP"""
+    if request.method == 'OPTIONS':
+        response = jsonify({'message': 'OK'})
+        return add_cors_headers(response)
+    
     try:
         current_user_id = get_jwt_identity()
         user = User.query.get(current_user_id)
@@ -976,19 +1627,293 @@ def download_file(filename):
         if not user:
             return error_response("User not found", status_code=404)
         
-        # Security check - ensure file path doesn't contain directory traversal
-        if '..' in filename or filename.startswith('/'):
-            return error_response("Invalid file path", status_code=400)
+        user_role = get_user_role(current_user_id)
+        if not user_role:
+            return error_response("User role not found", status_code=403)
+        
+        from app.utils import conversation_export  # Export-only dependencies load on first use
+        
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in conversation_export.EXPORT_FORMATS:
+            return error_response("Format must be one of: ndjson, csv, zip", status_code=400)
+        
+        conversation_id = request.args.get('conversation_id', type=int)
+        property_id = request.args.get('property_id', type=int)
+        tenant_id = request.args.get('tenant_id', type=int)
+        if not (conversation_id or property_id or tenant_id):
+            return error_response("conversation_id, property_id or tenant_id is required", status_code=400)
+        
+        if conversation_id:
+            conversation = TenantConversation.query.get(conversation_id)
+            if not conversation:
+                return error_response("Conversation not found", status_code=404)
+            if not has_conversation_access(conversation, current_user_id, user_role):
+                return error_response("Access denied", status_code=403)
+        
+        # Only conversations the caller takes part in; nothing is marked as read
+        conversation_query = TenantConversation.query.filter(
+            TenantConversation.id.in_(ConversationParticipant.conversation_ids_for(current_user_id))
+        )
+        if conversation_id:
+            conversation_query = conversation_query.filter(TenantConversation.id == conversation_id)
+        if property_id:
+            conversation_query = conversation_query.filter(TenantConversation.property_id == property_id)
+        if tenant_id:
+            conversation_query = conversation_query.filter(TenantConversation.user_id == tenant_id)
+        
+        if export_format == 'zip':
+            chunks = conversation_export.export_zip(conversation_query, user_role, attachment_storage())
+        elif export_format == 'csv':
+            chunks = conversation_export.export_csv(conversation_query, user_role)
+        else:
+            chunks = conversation_export.export_ndjson(conversation_query, user_role)
+        
+        def generate():
+            try:
+                yield from chunks
+            except Exception as e:
+                # Headers are already sent; the truncated body is all the client will see
+                current_app.logger.exception("Conversation export aborted: %s", e)
+        
+        mimetype, extension = conversation_export.EXPORT_FORMATS[export_format]
+        scope = f"conversation-{conversation_id}" if conversation_id else \
+            f"property-{property_id}" if property_id else f"tenant-{tenant_id}"
+        response = current_app.response_class(stream_with_context(generate()), mimetype=mimetype)
+        response.headers['Content-Disposition'] = \
+            f'attachment; filename="{scope}-{datetime.utcnow().strftime("%Y%m%d")}.{extension}"'
+        response.headers['Cache-Control'] = 'no-store'
+        return add_cors_headers(response)
+        
+    except Exception as e:
+        current_app.logger.exception("Export conversations error: %s", e)
+        return error_response("Failed to export conversations", status_code=500)
+
+# Prometheus metrics, aggregated across gunicorn workers
+@tenant_messaging_bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose messaging metrics in the Prometheus text format (needs METRICS_TOKEN as a bearer token)"""
+    refusal = metrics.scrape_refusal(current_app.config.get('METRICS_TOKEN'), request.headers.get('Authorization'))
+    if refusal == 404:
+        return error_response("Metrics are not enabled", status_code=404)
+    if refusal:
+        return error_response("Unauthorized", status_code=401)
+    
+    body, content_type = metrics.render_metrics()
+    return current_app.response_class(body, mimetype=None, content_type=content_type)
+
+# Admin: list and download request profiles
+@tenant_messaging_bp.route('/admin/profiles', methods=['GET'])
+@jwt_required()
+def list_request_profiles():
+    """List stored speedscope profiles of slow requests (admin only)"""
+    try:
+        if get_user_role(get_jwt_identity()) != 'admin':
+            return error_response("Admin access required", status_code=403)
+        
+        profiler = current_app.extensions.get('request_profiler')
+        if not profiler:
+            return error_response("Request profiling is not enabled", status_code=404)
+        
+        return success_response(
+            data={'profiles': profiler.list_profiles()},
+            message="Profiles retrieved successfully"
+        )
         
-        file_path = os.path.join(current_app.root_path, MESSAGING_UPLOAD_FOLDER, filename)
+    except Exception as e:
+        current_app.logger.exception("List profiles error: %s", e)
+        return error_response("Failed to retrieve profiles", status_code=500)
+
+@tenant_messaging_bp.route('/admin/profiles/<name>', methods=['GET'])
+@jwt_required()
+def download_request_profile(name):
+    """Download a speedscope profile (open at https://www.speedscope.app)"""
+    try:
+        if get_user_role(get_jwt_identity()) != 'admin':
+            return error_response("Admin access required", status_code=403)
         
-        if not os.path.exists(file_path):
-            return error_response("File not found", status_code=404)
+        profiler = current_app.extensions.get('request_profiler')
+        profile_path = profiler.profile_path(name) if profiler else None
+        if not profile_path:
+            return error_response("Profile not found", status_code=404)
         
-        return send_file(file_path, as_attachment=True)
+        return send_file(profile_path, mimetype='application/json', as_attachment=True, download_name=name)
         
     except Exception as e:
-        current_app.logger.error(f"File download error: {str(e)}")
-        return error_response("Failed to download file", status_code=500)
+        current_app.logger.exception("Download profile error: %s", e)
+        return error_response("Failed to download profile", status_code=500)
+
+# Maintenance commands (flask tenant_messaging <command>)
+@tenant_messaging_bp.cli.command('migrate-schema')
+@click.option('--schema-only', is_flag=True, help='Skip backfills (run them later, off-peak)')
+def migrate_schema_command(schema_only):
+    """Apply pending messaging schema changes and backfills; safe to re-run"""
+    applied = schema_migrations.apply_migrations(include_backfills=not schema_only)
+    click.echo(f"Applied {', '.join(applied)}" if applied else "Messaging schema is up to date")
+
+@tenant_messaging_bp.cli.command('migrate-read-watermarks')
+@click.option('--batch-size', default=1000, show_default=True, help='Conversations updated per transaction')
+def migrate_read_watermarks_command(batch_size):
+    """Derive per-side read watermarks from the legacy is_read_by_* message flags"""
+    updated = sum(TenantConversation.backfill_read_watermarks(batch_size) for _ in message_shards.each_shard())
+    click.echo(f"Set {updated} read watermarks")
+
+@tenant_messaging_bp.cli.command('import-conversations')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--source', help='Import name used to resume and to match conversation keys; defaults to the file name')
+@click.option('--format', 'input_format', type=click.Choice(['ndjson', 'csv']), help='Defaults to the file extension')
+@click.option('--chunk-size', type=int, help="Rows per transaction; defaults to the importer's chunk size")
+@click.option('--no-copy', is_flag=True, help='Use executemany instead of PostgreSQL COPY')
+@click.option('--rejects', type=click.Path(dir_okay=False), help='Append rejected rows to this NDJSON file')
+def import_conversations_command(path, source, input_format, chunk_size, no_copy, rejects):
+    """Bulk load historical conversations; re-run the same command to resume after a failure"""
+    if message_shards.sharding_enabled():
+        raise click.ClickException("Import into the primary before enabling MESSAGE_SHARD_BINDS, then run migrate-to-shards")
+    from app.utils.bulk_import import BulkImporter, read_records, DEFAULT_CHUNK_SIZE
+    importer = BulkImporter(source or os.path.basename(path), chunk_size=chunk_size or DEFAULT_CHUNK_SIZE,
+                            use_copy=not no_copy, reject_file=rejects)
+    report = importer.run(read_records(path, input_format))
+    click.echo(f"Imported {report['messages']} messages into {report['conversations']} new conversations; "
+               f"{report['rejected']} rejected, {report['skipped']} already imported")
+
+@tenant_messaging_bp.cli.command('rebuild-rollups')
+@click.option('--batch-size', default=1000, show_default=True)
+def rebuild_rollups_command(batch_size):
+    """Recompute messaging rollups and first_response_at from conversations and messages"""
+    rows = sum(MessagingRollup.rebuild(batch_size) for _ in message_shards.each_shard())
+    click.echo(f"Rebuilt {rows} rollup rows")
+
+@tenant_messaging_bp.cli.command('create-message-shards')
+def create_message_shards_command():
+    """Create the conversation and message tables on every MESSAGE_SHARD_BINDS database"""
+    if not message_shards.sharding_enabled():
+        raise click.ClickException("MESSAGE_SHARD_BINDS is not configured")
+    for shard, tables in message_shards.create_shard_tables().items():
+        click.echo(f"{shard}: created {', '.join(tables)}" if tables else f"{shard}: already up to date")
+
+@tenant_messaging_bp.cli.command('migrate-to-shards')
+@click.option('--batch-size', default=message_shards.MIGRATION_BATCH_SIZE, show_default=True)
+def migrate_to_shards_command(batch_size):
+    """Copy conversations and messages from the primary database to their shards; safe to re-run"""
+    if not message_shards.sharding_enabled():
+        raise click.ClickException("MESSAGE_SHARD_BINDS is not configured")
+    message_shards.create_shard_tables()
+    report = message_shards.migrate_legacy_conversations(batch_size)
+    click.echo(f"Copied {report['conversations']} conversations, {report['participants']} participants and "
+               f"{report['messages']} messages; {report['skipped']} already on their shard")
+    click.echo("Run rebuild-rollups next, and drop the primary's copies once verified")
+
+@tenant_messaging_bp.cli.command('profile-imports')
+@click.option('--module', default=startup.DEFAULT_MODULE, show_default=True)
+@click.option('--top', default=25, show_default=True, help='Modules to list, by cumulative import time')
+def profile_imports_command(module, top):
+    """Report what importing a module costs in a fresh interpreter (python -X importtime)"""
+    try:
+        total, rows = startup.profile_imports(module, top)
+    except RuntimeError as e:
+        raise click.ClickException(f"Importing {module} failed: {e}")
+    click.echo(f"{module}: {total / 1000:.1f} ms cumulative")
+    click.echo(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for self_us, cumulative_us, name in rows:
+        click.echo(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+@tenant_messaging_bp.cli.command('benchmark-startup')
+@click.option('--module', default=startup.DEFAULT_MODULE, show_default=True)
+@click.option('--runs', default=5, show_default=True)
+@click.option('--budget', type=float, help='Maximum median seconds; defaults to STARTUP_BUDGET_SECONDS or 2.0')
+@click.option('--baseline', type=float, help='Previous median seconds to compare against')
+@click.option('--tolerance', default=0.2, show_default=True, help='Allowed slowdown over the baseline')
+def benchmark_startup_command(module, runs, budget, baseline, tolerance):
+    """Time cold imports of a module; exits non-zero when boot time regresses (for CI)"""
+    budget = budget or current_app.config.get('STARTUP_BUDGET_SECONDS', 2.0)
+    try:
+        samples = startup.measure_startup(module, runs)
+    except RuntimeError as e:
+        raise click.ClickException(f"Importing {module} failed: {e}")
+    click.echo(f"{module}: " + ", ".join(f"{sample:.3f}s" for sample in samples))
+    failure = startup.startup_regressed(samples, budget, baseline, tolerance)
+    if failure:
+        raise click.ClickException(f"Startup regressed: {failure}")
+    click.echo("Startup within budget")
+
+@tenant_messaging_bp.cli.command('partition-messages')
+@click.option('--months-ahead', default=message_partitions.DEFAULT_MONTHS_AHEAD, show_default=True)
+def partition_messages_command(months_ahead):
+    """Convert tenant_messages to monthly range partitions on each message database (PostgreSQL only)"""
+    for engine in message_shards.message_engines():
+        with engine.begin() as connection:
+            if not message_partitions.is_postgresql(connection):
+                raise click.ClickException("Partitioning is only supported on PostgreSQL")
+            if message_partitions.migrate_to_partitioned(connection, months_ahead):
+                click.echo(f"Partitioned {message_partitions.PARENT_TABLE}; "
+                           f"drop {message_partitions.LEGACY_TABLE} once verified")
+            else:
+                click.echo(f"{message_partitions.PARENT_TABLE} is already partitioned")
+
+@tenant_messaging_bp.cli.command('ensure-message-partitions')
+@click.option('--months-ahead', default=message_partitions.DEFAULT_MONTHS_AHEAD, show_default=True)
+def ensure_message_partitions_command(months_ahead):
+    """Create upcoming monthly partitions; run daily from cron"""
+    for engine in message_shards.message_engines():
+        with engine.begin() as connection:
+            if not message_partitions.is_postgresql(connection) or not message_partitions.is_partitioned(connection):
+                raise click.ClickException(f"{message_partitions.PARENT_TABLE} is not partitioned")
+            for name in message_partitions.ensure_future_partitions(connection, months_ahead):
+                click.echo(f"Ensured partition {name}")
+
+@tenant_messaging_bp.cli.command('outbox-worker')
+@click.option('--batch-size', default=100, show_default=True)
+@click.option('--threads', default=4, show_default=True)
+@click.option('--max-attempts', default=8, show_default=True)
+@click.option('--retention-days', type=int, help='Purge processed events older than this; defaults to OUTBOX_RETENTION_DAYS')
+@click.option('--metrics-port', type=int, help='Serve worker metrics on this local port for Prometheus to scrape')
+def outbox_worker_command(batch_size, threads, max_attempts, retention_days, metrics_port):
+    """Drain the messaging outbox until interrupted"""
+    from app.utils.outbox_worker import OutboxWorker, DEFAULT_RETENTION_DAYS
+    if retention_days is None:
+        retention_days = current_app.config.get('OUTBOX_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    if metrics_port and not metrics.start_metrics_server(metrics_port):
+        click.echo("prometheus_client is not installed; worker metrics are not exported")
+    worker = OutboxWorker(current_app._get_current_object(), batch_size=batch_size,
+                          max_workers=threads, max_attempts=max_attempts, retention_days=retention_days)
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+    click.echo(f"Outbox worker stopped: {worker.metrics}")
+
+@tenant_messaging_bp.cli.command('purge-outbox')
+@click.option('--retention-days', type=int, help='Purge processed events older than this; defaults to OUTBOX_RETENTION_DAYS')
+def purge_outbox_command(retention_days):
+    """Delete processed outbox events past the retention period on every message database"""
+    from app.utils.outbox_worker import OutboxWorker, DEFAULT_RETENTION_DAYS
+    if retention_days is None:
+        retention_days = current_app.config.get('OUTBOX_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    worker = OutboxWorker(current_app._get_current_object(), retention_days=retention_days)
+    purged = sum(worker.purge_processed() for _ in message_shards.each_shard())
+    click.echo(f"Purged {purged} processed outbox events")
 
-download_file = jwt_required()(download_file)
\ No newline at end of file
+@tenant_messaging_bp.cli.command('gc-attachments')
+@click.option('--grace-hours', type=int, help='Skip objects younger than this; defaults to the collector grace period')
+@click.option('--max-objects', default=100000, show_default=True, help='Objects to scan before stopping; 0 for no limit')
+@click.option('--delete', 'delete_orphans', is_flag=True, help='Delete orphans instead of moving them to quarantine/')
+@click.option('--dry-run', is_flag=True)
+def gc_attachments_command(grace_hours, max_objects, delete_orphans, dry_run):
+    """Quarantine or delete attachments no message references"""
+    from app.utils.attachment_gc import collect_orphaned_attachments, DEFAULT_GRACE_PERIOD
+    state_file = current_app.config.get(
+        'ATTACHMENT_GC_STATE_FILE', os.path.join(current_app.instance_path, 'attachment_gc_state.json')
+    )
+    report = collect_orphaned_attachments(
+        attachment_storage(), state_file,
+        grace_period=DEFAULT_GRACE_PERIOD if grace_hours is None else grace_hours * 3600,
+        max_objects=max_objects or None,
+        quarantine=not delete_orphans,
+        dry_run=dry_run
+    )
+    click.echo(
+        f"Scanned {report['scanned']} objects, {report['orphaned']} orphaned, "
+        f"{report['reclaimed_bytes']} bytes reclaimed"
+        + (" (dry run)" if dry_run else "")
+        + ("; pass complete" if report['complete'] else f"; resumes after {report['cursor']}")
+    )
@@ -0,0 +1,87 @@
+# app/routes/tenant_messaging_legacy.py - Legacy attachment routes, imported on first use
+
+from flask import request, current_app, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from app.models.user_models import User
+from app.utils.response_utils import success_response, error_response
+from app.utils.rate_limiter import rate_limit
+from app.utils import metrics
+from app.routes.tenant_messaging import add_cors_headers, attachment_storage, handle_attachment_upload
+
+# Registered on tenant_messaging_bp through LazyView; most workers never serve these,
+# so the module is only imported by the first request that does.
+
+# File upload endpoint (legacy)
+@jwt_required()
+@rate_limit('upload')
+def upload_file():
+    """Upload a file for messaging"""
+    if request.method == 'OPTIONS':
+        response = jsonify({'message': 'OK'})
+        return add_cors_headers(response)
+    
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+        
+        if not user:
+            return error_response("User not found", status_code=404)
+        
+        if 'file' not in request.files:
+            return error_response("No file provided", status_code=400)
+        
+        file = request.files['file']
+        conversation_id = request.form.get('conversation_id')
+        
+        if file.filename == '':
+            return error_response("No file selected", status_code=400)
+        
+        # If no conversation_id, create temp folder
+        temp_conv_id = conversation_id or 'temp'
+        
+        original_name, file_url, file_size, file_type = handle_attachment_upload(file, temp_conv_id)
+        
+        if not file_url:
+            return error_response("Failed to upload file or invalid file type", status_code=400)
+        
+        return success_response(
+            data={
+                'file_url': file_url,
+                'file_name': original_name,
+                'file_size': file_size,
+                'file_type': file_type
+            },
+            message="File uploaded successfully"
+        )
+        
+    except Exception as e:
+        current_app.logger.exception("File upload error: %s", e)
+        return error_response("Failed to upload file", status_code=500)
+
+# File download endpoint
+@jwt_required()
+def download_file(filename):
+    """Download a file attachment"""
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+        
+        if not user:
+            return error_response("User not found", status_code=404)
+        
+        # Security check - ensure file path doesn't contain directory traversal
+        if '..' in filename or filename.startswith('/'):
+            return error_response("Invalid file path", status_code=400)
+        
+        storage = attachment_storage()
+        file_size = storage.size(filename)
+        if file_size is None:
+            return error_response("File not found", status_code=404)
+        
+        metrics.ATTACHMENT_BYTES.labels('out').inc(file_size)
+        return storage.send(filename)
+        
+    except Exception as e:
+        current_app.logger.exception("File download error: %s", e)
+        return error_response("Failed to download file", status_code=500)
@@ -0,0 +1,106 @@
+# app/utils/attachment_gc.py - Reconcile stored attachments against tenant_messages
+
+import json
+import os
+import time
+
+from app import db
+from app.models.tenant_messaging import TenantMessage
+
+QUARANTINE_PREFIX = 'quarantine/'
+DEFAULT_GRACE_PERIOD = 24 * 60 * 60  # Seconds; protects uploads whose message is not committed yet
+DEFAULT_BATCH_SIZE = 500
+
+
+def load_cursor(state_file):
+    """Last key processed by the previous run, or None to start from the beginning"""
+    try:
+        with open(state_file) as f:
+            return json.load(f).get('cursor')
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_cursor(state_file, cursor):
+    """Persist the cursor so the next run continues where this one stopped"""
+    os.makedirs(os.path.dirname(state_file) or '.', exist_ok=True)
+    temp_file = f"{state_file}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump({'cursor': cursor, 'updated_at': time.time()}, f)
+    os.replace(temp_file, state_file)
+
+
+def referenced_keys(keys):
+    """Subset of keys that some message references as its attachment_url"""
+    # Keys under a conversation folder are checked through the indexed conversation_id
+    conversation_ids = {int(key.split('/', 1)[0]) for key in keys if key.split('/', 1)[0].isdigit()}
+    other_keys = [key for key in keys if not key.split('/', 1)[0].isdigit()]
+
+    referenced = set()
+    if conversation_ids:
+        rows = db.session.query(TenantMessage.attachment_url).filter(
+            TenantMessage.conversation_id.in_(conversation_ids),
+            TenantMessage.attachment_url.isnot(None)
+        )
+        referenced.update(url for url, in rows)
+    if other_keys:
+        rows = db.session.query(TenantMessage.attachment_url).filter(
+            TenantMessage.attachment_url.in_(other_keys)
+        )
+        referenced.update(url for url, in rows)
+    return referenced & set(keys)
+
+
+def collect_orphaned_attachments(storage, state_file, grace_period=DEFAULT_GRACE_PERIOD,
+                                 max_objects=None, batch_size=DEFAULT_BATCH_SIZE,
+                                 quarantine=True, dry_run=False):
+    """Remove or quarantine unreferenced attachments older than the grace period
+
+    Objects are streamed in key order starting after the saved cursor. A run stops
+    after max_objects objects and the next run resumes from there; once the end of
+    the store is reached the cursor resets so the following run starts a new pass.
+    """
+    report = {'scanned': 0, 'orphaned': 0, 'reclaimed_bytes': 0, 'complete': False}
+    cutoff = time.time() - grace_period
+    cursor = load_cursor(state_file)
+    batch = []
+
+    def process(batch):
+        referenced = referenced_keys([key for key, _, _ in batch])
+        for key, size, modified_at in batch:
+            if key in referenced or modified_at > cutoff:
+                continue
+            report['orphaned'] += 1
+            report['reclaimed_bytes'] += size
+            if dry_run:
+                continue
+            if quarantine:
+                storage.move(key, QUARANTINE_PREFIX + key)
+            else:
+                storage.delete(key)
+
+    for key, size, modified_at in storage.iter_objects(start_after=cursor):
+        if key.startswith(QUARANTINE_PREFIX):
+            continue
+        batch.append((key, size, modified_at))
+        report['scanned'] += 1
+
+        if len(batch) >= batch_size:
+            process(batch)
+            cursor = batch[-1][0]
+            batch = []
+            if not dry_run:
+                save_cursor(state_file, cursor)
+        if max_objects and report['scanned'] >= max_objects:
+            break
+    else:
+        report['complete'] = True
+
+    if batch:
+        process(batch)
+        cursor = batch[-1][0]
+
+    if not dry_run:
+        save_cursor(state_file, None if report['complete'] else cursor)
+    report['cursor'] = None if report['complete'] else cursor
+    return report
@@ -0,0 +1,193 @@
+# app/utils/attachment_storage.py - Local-disk and S3-compatible storage for message attachments
+
+import os
+import shutil
+
+from flask import current_app, send_file, redirect
+
+
+class LocalAttachmentStorage:
+    """Attachments stored under a directory on the web node's disk
+
+    Uploads only arrive through Flask, so there is no presigned_upload; callers
+    check supports_direct_upload first.
+    """
+
+    supports_direct_upload = False
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        """Absolute path for a storage key, refusing keys that escape the root"""
+        path = os.path.realpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.realpath(self.root) + os.sep):
+            raise ValueError(f"Invalid attachment key: {key}")
+        return path
+
+    def save(self, file, key, content_type=None):
+        """Write an uploaded file (werkzeug FileStorage or file object) to key"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if hasattr(file, 'save'):
+            file.save(path)
+        else:
+            with open(path, 'wb') as destination:
+                shutil.copyfileobj(file, destination)
+
+    def size(self, key):
+        """Size in bytes of the object at key, or None if it does not exist"""
+        try:
+            return os.path.getsize(self.path(key))
+        except (OSError, ValueError):
+            return None
+
+    def open(self, key):
+        """Open the object at key for reading"""
+        return open(self.path(key), 'rb')
+
+    def delete(self, key):
+        """Remove the object at key if it exists"""
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def move(self, key, destination_key):
+        """Move an object to another key (used to quarantine orphans)"""
+        destination = self.path(destination_key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(self.path(key), destination)
+
+    def iter_objects(self, start_after=None):
+        """Yield (key, size, modified timestamp) in key order, streaming one directory at a time"""
+        def walk(directory, prefix):
+            # Sort by key (directories as 'name/') so keys come out in the same order as S3 listings
+            try:
+                entries = sorted(os.scandir(directory),
+                                 key=lambda entry: entry.name + '/' if entry.is_dir() else entry.name)
+            except FileNotFoundError:
+                return
+            for entry in entries:
+                key = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    # Skip whole subtrees that sort entirely before the cursor
+                    if start_after and not (start_after.startswith(key + '/') or key + '/' > start_after):
+                        continue
+                    yield from walk(entry.path, key + '/')
+                elif entry.is_file(follow_symlinks=False) and (not start_after or key > start_after):
+                    stat = entry.stat(follow_symlinks=False)
+                    yield key, stat.st_size, stat.st_mtime
+
+        yield from walk(self.root, '')
+
+    def send(self, key, download_name=None):
+        """Flask response serving the object as a download"""
+        return send_file(self.path(key), as_attachment=True, download_name=download_name)
+
+
+class S3AttachmentStorage:
+    """Attachments stored in an S3-compatible bucket (AWS S3, MinIO, Azure via gateway)"""
+
+    supports_direct_upload = True
+
+    def __init__(self, bucket, prefix='message_attachments/', client=None, **client_options):
+        if client is None:
+            import boto3  # Optional dependency, only needed for the S3 backend
+            client = boto3.client('s3', **client_options)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def object_key(self, key):
+        """Bucket key for a storage key"""
+        if '..' in key or key.startswith('/'):
+            raise ValueError(f"Invalid attachment key: {key}")
+        return self.prefix + key
+
+    def save(self, file, key, content_type=None):
+        """Stream an uploaded file to the bucket"""
+        extra_args = {'ContentType': content_type} if content_type else None
+        self.client.upload_fileobj(getattr(file, 'stream', file), self.bucket, self.object_key(key),
+                                   ExtraArgs=extra_args)
+
+    def size(self, key):
+        """Size in bytes of the object at key, or None if it does not exist"""
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+        except self.client.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return head['ContentLength']
+
+    def open(self, key):
+        """Open the object at key for streaming reads"""
+        return self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))['Body']
+
+    def delete(self, key):
+        """Remove the object at key"""
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+
+    def move(self, key, destination_key):
+        """Move an object to another key (used to quarantine orphans)"""
+        self.client.copy_object(Bucket=self.bucket, Key=self.object_key(destination_key),
+                                CopySource={'Bucket': self.bucket, 'Key': self.object_key(key)})
+        self.delete(key)
+
+    def iter_objects(self, start_after=None):
+        """Yield (key, size, modified timestamp) in key order, one listing page at a time"""
+        paginator = self.client.get_paginator('list_objects_v2')
+        options = {'Bucket': self.bucket, 'Prefix': self.prefix}
+        if start_after:
+            options['StartAfter'] = self.object_key(start_after)
+        for page in paginator.paginate(**options):
+            for item in page.get('Contents', []):
+                yield item['Key'][len(self.prefix):], item['Size'], item['LastModified'].timestamp()
+
+    def send(self, key, download_name=None):
+        """Redirect the client to a short-lived download URL so bytes bypass the web workers"""
+        params = {'Bucket': self.bucket, 'Key': self.object_key(key)}
+        if download_name:
+            params['ResponseContentDisposition'] = f'attachment; filename="{download_name}"'
+        url = self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=300)
+        return redirect(url)
+
+    def presigned_upload(self, key, content_type, max_size, expires_in):
+        """Presigned POST the client can upload to directly; the size limit is enforced by the store"""
+        return self.client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=self.object_key(key),
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, max_size]
+            ],
+            ExpiresIn=expires_in
+        )
+
+
+def create_attachment_storage(app, upload_folder):
+    """Build the storage backend selected by ATTACHMENT_STORAGE ('local' or 's3')"""
+    backend = app.config.get('ATTACHMENT_STORAGE', 'local')
+    if backend == 's3':
+        client_options = {}
+        if app.config.get('ATTACHMENT_S3_ENDPOINT_URL'):
+            client_options['endpoint_url'] = app.config['ATTACHMENT_S3_ENDPOINT_URL']
+        if app.config.get('ATTACHMENT_S3_REGION'):
+            client_options['region_name'] = app.config['ATTACHMENT_S3_REGION']
+        return S3AttachmentStorage(
+            app.config['ATTACHMENT_S3_BUCKET'],
+            prefix=app.config.get('ATTACHMENT_S3_PREFIX', 'message_attachments/'),
+            **client_options
+        )
+    return LocalAttachmentStorage(os.path.join(app.root_path, upload_folder))
+
+
+def get_attachment_storage(upload_folder):
+    """Storage backend for the current app, created on first use"""
+    storage = current_app.extensions.get('attachment_storage')
+    if storage is None:
+        storage = create_attachment_storage(current_app, upload_folder)
+        current_app.extensions['attachment_storage'] = storage
+    return storage
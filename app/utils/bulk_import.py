@@ -0,0 +1,453 @@
+# app/utils/bulk_import.py - Resumable bulk loader for historical conversations (NDJSON / CSV)
+
+from collections import defaultdict
+from datetime import datetime, timezone
+import csv
+import io
+import json
+
+from sqlalchemy import bindparam, func, insert, select, update
+
+from app import db
+from app.utils import message_partitions
+from app.models.user_models import User
+from app.models.property_models import Property
+from app.models.tenant_messaging import (
+    TenantConversation, TenantMessage, ConversationParticipant, ConversationImport, ConversationImportProgress,
+    MessagingRollup
+)
+
+DEFAULT_CHUNK_SIZE = 5000
+REQUIRED_FIELDS = ('conversation_key', 'tenant_email', 'sender_email', 'message_text', 'created_at')
+MESSAGE_COLUMNS = [
+    'conversation_id', 'sender_id', 'sender_name', 'sender_type', 'message_text',
+    'attachment_url', 'attachment_name', 'attachment_size', 'attachment_type',
+    'is_read_by_tenant', 'is_read_by_agent', 'created_at', 'updated_at'
+]
+
+
+class RejectedRecord(Exception):
+    """An input row that cannot be imported; it is reported and skipped"""
+
+
+def read_records(path, input_format=None):
+    """Yield (line number, record dict) from an NDJSON or CSV file without loading it whole"""
+    input_format = input_format or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    with open(path, newline='', encoding='utf-8') as f:
+        if input_format == 'csv':
+            for line_number, record in enumerate(csv.DictReader(f), start=1):
+                yield line_number, record
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_number, json.loads(line)
+
+
+def parse_timestamp(value):
+    """ISO 8601 timestamp as the naive UTC datetime the models store"""
+    parsed = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _email(value):
+    return (value or '').strip().lower() or None
+
+
+def _copy_field(value):
+    """A COPY CSV field: NULL is the bare empty field and every value is quoted
+
+    COPY only matches the NULL string against unquoted fields, so no message text
+    (an empty one or a literal \\N included) can be read back as NULL.
+    """
+    if value is None:
+        return ''
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class BulkImporter:
+    """Streams message records into conversations, one transaction per chunk
+
+    Each record is one message. Records sharing a conversation_key belong to the
+    same conversation and must be in chronological order: a record older than its
+    conversation's latest message (imported or sent since) is rejected, so the
+    unread counters and read watermarks stay those of an append. The conversation is
+    created on first sight with tenant_email, agent_email, owner_email,
+    property_id, subject and status taken from that record. Users and properties
+    are resolved with one query per chunk. Messages go in with PostgreSQL COPY
+    when the driver supports it, and executemany otherwise. The committed row
+    number is stored in the same transaction, so a failed run resumes after its
+    last complete chunk. first_response_at and the daily rollups are updated in
+    that transaction too, so stats include imported history without a rebuild.
+    """
+
+    def __init__(self, source, chunk_size=DEFAULT_CHUNK_SIZE, use_copy=True, reject_file=None):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.use_copy = use_copy
+        self.reject_file = reject_file
+        self.report = {'skipped': 0, 'conversations': 0, 'messages': 0, 'rejected': 0}
+        self._partitioned = None
+
+    def run(self, records):
+        """Import records, skipping those committed by an earlier run; returns a report"""
+        progress = db.session.get(ConversationImportProgress, self.source)
+        rows_done = progress.rows_done if progress else 0
+
+        chunk = []
+        for line_number, record in records:
+            if line_number <= rows_done:
+                self.report['skipped'] += 1
+                continue
+            chunk.append((line_number, record))
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+        return self.report
+
+    def import_chunk(self, chunk):
+        """Import one chunk of (line number, record) and commit it with the resume point"""
+        try:
+            users, properties, conversations = self._lookup(chunk)
+            messages, rejected = self._build(chunk, users, properties, conversations)
+
+            # A new conversation whose every row was rejected is not created
+            new_conversations = [state for state in conversations.values() if state.get('new') and state.get('touched')]
+            self._insert_conversations(new_conversations)
+            for message in messages:
+                message['conversation_id'] = message.pop('state')['id']
+            self._insert_messages(messages)
+            self._update_conversations([state for state in conversations.values()
+                                        if not state.get('new') and state.get('touched')])
+            self._set_watermarks([state['id'] for state in conversations.values() if state.get('touched')])
+            self._record_rollups([state for state in conversations.values() if state.get('touched')], messages)
+            self._save_progress(chunk[-1][0], len(new_conversations), len(messages), len(rejected))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        self.report['conversations'] += len(new_conversations)
+        self.report['messages'] += len(messages)
+        self.report['rejected'] += len(rejected)
+        self._write_rejects(rejected)
+
+    def _lookup(self, chunk):
+        """Users by email, known property ids and already-imported conversations, one query each"""
+        emails = set()
+        property_ids = set()
+        keys = set()
+        for _, record in chunk:
+            for field in ('tenant_email', 'agent_email', 'owner_email', 'sender_email'):
+                if _email(record.get(field)):
+                    emails.add(_email(record.get(field)))
+            if str(record.get('property_id') or '').strip().isdigit():
+                property_ids.add(int(record['property_id']))
+            keys.add(str(record.get('conversation_key')))
+
+        users = {}
+        if emails:
+            users = {user.email.lower(): user for user in User.query.filter(func.lower(User.email).in_(emails))}
+        properties = set()
+        if property_ids:
+            properties = {property_id for property_id, in db.session.query(Property.id).filter(Property.id.in_(property_ids))}
+
+        conversations = {}
+        rows = db.session.query(ConversationImport.external_id, TenantConversation).join(
+            TenantConversation, TenantConversation.id == ConversationImport.conversation_id
+        ).filter(ConversationImport.source == self.source, ConversationImport.external_id.in_(keys))
+        for key, conversation in rows:
+            conversations[key] = {
+                'id': conversation.id,
+                'user_id': conversation.user_id,
+                'agent_id': conversation.agent_id,
+                'owner_id': conversation.owner_id,
+                'property_id': conversation.property_id,
+                'status': conversation.status,
+                'created_at': conversation.created_at,
+                'last_message_at': conversation.last_message_at,
+                'first_response_at': conversation.first_response_at,
+                'unread_count_tenant': conversation.unread_count_tenant or 0,
+                'unread_count_agent': conversation.unread_count_agent or 0,
+                'unread_before': (conversation.unread_count_tenant or 0, conversation.unread_count_agent or 0),
+            }
+        return users, properties, conversations
+
+    def _build(self, chunk, users, properties, conversations):
+        """Message rows plus per-conversation counters, computed in one pass over the chunk"""
+        messages = []
+        rejected = []
+        now = datetime.utcnow()
+        for line_number, record in chunk:
+            try:
+                missing = [field for field in REQUIRED_FIELDS if not record.get(field)]
+                if missing:
+                    raise RejectedRecord(f"missing {', '.join(missing)}")
+                created_at = parse_timestamp(record['created_at'])
+                attachment_size = int(record['attachment_size']) if record.get('attachment_size') else None
+
+                key = str(record['conversation_key'])
+                state = conversations.get(key) or self._new_conversation(key, record, users, properties, created_at)
+                conversations[key] = state
+                if state['last_message_at'] and created_at < state['last_message_at']:
+                    raise RejectedRecord("older than the conversation's latest message")
+
+                sender = users.get(_email(record['sender_email']))
+                if not sender:
+                    raise RejectedRecord(f"unknown sender {record['sender_email']}")
+                if sender.id == state['user_id']:
+                    sender_type = 'tenant'
+                elif sender.id == state['agent_id']:
+                    sender_type = 'agent'
+                elif sender.id == state['owner_id']:
+                    sender_type = 'owner'
+                else:
+                    raise RejectedRecord(f"sender {record['sender_email']} is not a participant")
+            except (RejectedRecord, ValueError, TypeError) as e:
+                rejected.append({'line': line_number, 'reason': str(e), 'record': record})
+                continue
+
+            # Same bookkeeping as increment_unread_for_recipients, applied in memory
+            if sender_type == 'tenant':
+                state['unread_count_agent'] += 1
+                state['unread_count_tenant'] = 0
+            else:
+                state['unread_count_tenant'] += 1
+                state['unread_count_agent'] = 0
+                # The earliest reply of this import, unless an earlier import already recorded one
+                if state['first_response_at'] is None or (
+                        state.get('first_responder') and created_at < state['first_response_at']):
+                    state['first_response_at'] = created_at
+                    state['first_responder'] = (sender.id, sender_type)
+            state['created_at'] = min(state['created_at'], created_at)
+            state['last_message_at'] = max(state['last_message_at'] or created_at, created_at)
+            state['touched'] = True
+
+            messages.append({
+                'state': state,
+                'sender_id': sender.id,
+                'sender_name': (record.get('sender_name') or sender.full_name)[:100],
+                'sender_type': sender_type,
+                'message_text': record['message_text'],
+                'attachment_url': record.get('attachment_url') or None,
+                'attachment_name': record.get('attachment_name') or None,
+                'attachment_size': attachment_size,
+                'attachment_type': record.get('attachment_type') or None,
+                'is_read_by_tenant': False,
+                'is_read_by_agent': False,
+                'created_at': created_at,
+                'updated_at': now,
+            })
+        return messages, rejected
+
+    def _new_conversation(self, key, record, users, properties, created_at):
+        """In-memory state for a conversation first seen in this chunk"""
+        tenant = users.get(_email(record.get('tenant_email')))
+        if not tenant:
+            raise RejectedRecord(f"unknown tenant {record.get('tenant_email')}")
+        agent = users.get(_email(record.get('agent_email')))
+        owner = users.get(_email(record.get('owner_email')))
+        if record.get('agent_email') and not agent:
+            raise RejectedRecord(f"unknown agent {record.get('agent_email')}")
+        if record.get('owner_email') and not owner:
+            raise RejectedRecord(f"unknown owner {record.get('owner_email')}")
+        property_id = int(record['property_id']) if record.get('property_id') else None
+        if property_id and property_id not in properties:
+            raise RejectedRecord(f"unknown property {property_id}")
+
+        return {
+            'new': True,
+            'key': key,
+            'user_id': tenant.id,
+            'user_name': tenant.full_name[:100],
+            'agent_id': agent.id if agent else None,
+            'owner_id': owner.id if owner else None,
+            'property_id': property_id,
+            'subject': (record.get('subject') or 'Imported conversation')[:200],
+            'status': record.get('status') or 'open',
+            'created_at': created_at,
+            'last_message_at': None,
+            'first_response_at': None,
+            'unread_count_tenant': 0,
+            'unread_count_agent': 0,
+            'unread_before': (0, 0),
+        }
+
+    def _insert_conversations(self, states):
+        """Insert new conversations (executemany with RETURNING), their participants and import keys"""
+        if not states:
+            return
+        conversations = TenantConversation.__table__
+        now = datetime.utcnow()
+        rows = [{
+            'user_id': state['user_id'], 'user_name': state['user_name'], 'user_type': 'tenant',
+            'agent_id': state['agent_id'], 'owner_id': state['owner_id'], 'property_id': state['property_id'],
+            'subject': state['subject'], 'status': state['status'],
+            'last_message_at': state['last_message_at'] or state['created_at'],
+            'first_response_at': state['first_response_at'],
+            'unread_count_tenant': state['unread_count_tenant'], 'unread_count_agent': state['unread_count_agent'],
+            'created_at': state['created_at'], 'updated_at': now,
+        } for state in states]
+        ids = db.session.execute(
+            insert(conversations).returning(conversations.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+        participants = []
+        for state, conversation_id in zip(states, ids):
+            state['id'] = conversation_id
+            participants.extend(TenantConversation(
+                id=conversation_id, user_id=state['user_id'], agent_id=state['agent_id'], owner_id=state['owner_id'],
+                unread_count_tenant=state['unread_count_tenant'], unread_count_agent=state['unread_count_agent']
+            ).participant_rows())
+        db.session.execute(insert(ConversationParticipant.__table__), participants)
+        db.session.execute(insert(ConversationImport.__table__), [
+            {'source': self.source, 'external_id': state['key'], 'conversation_id': state['id']} for state in states
+        ])
+
+    def _insert_messages(self, messages):
+        """COPY on PostgreSQL/psycopg2, executemany elsewhere"""
+        if not messages:
+            return
+        connection = db.session.connection()
+        if message_partitions.is_postgresql(connection):
+            if self._partitioned is None:
+                self._partitioned = message_partitions.is_partitioned(connection)
+            if self._partitioned:
+                # History predates the pre-created months; give each month its own partition
+                for month in {message_partitions.month_start(message['created_at']) for message in messages}:
+                    message_partitions.create_partition(connection, month)
+        if self.use_copy and connection.dialect.name == 'postgresql':
+            cursor = connection.connection.cursor()
+            if hasattr(cursor, 'copy_expert'):
+                buffer = io.StringIO()
+                for message in messages:
+                    buffer.write(','.join(_copy_field(message[column]) for column in MESSAGE_COLUMNS) + '\n')
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY {TenantMessage.__tablename__} ({', '.join(MESSAGE_COLUMNS)}) "
+                    f"FROM STDIN WITH (FORMAT csv, NULL '')", buffer
+                )
+                return
+        db.session.execute(insert(TenantMessage.__table__), messages)
+
+    def _update_conversations(self, states):
+        """Write counters and latest-message fields of previously imported conversations"""
+        if not states:
+            return
+        conversations = TenantConversation.__table__
+        db.session.execute(update(conversations).where(conversations.c.id == bindparam('b_id')).values({
+            'created_at': bindparam('b_created_at'),
+            'last_message_at': bindparam('b_last_message_at'),
+            'first_response_at': bindparam('b_first_response_at'),
+            'unread_count_tenant': bindparam('b_unread_tenant'),
+            'unread_count_agent': bindparam('b_unread_agent'),
+        }), [{
+            'b_id': state['id'], 'b_created_at': state['created_at'], 'b_last_message_at': state['last_message_at'],
+            'b_first_response_at': state['first_response_at'],
+            'b_unread_tenant': state['unread_count_tenant'], 'b_unread_agent': state['unread_count_agent'],
+        } for state in states])
+
+        participants = ConversationParticipant.__table__
+        for tenant_side, counter in ((True, 'b_unread_tenant'), (False, 'b_unread_agent')):
+            role_filter = participants.c.role == 'tenant' if tenant_side else participants.c.role != 'tenant'
+            db.session.execute(update(participants).where(
+                participants.c.conversation_id == bindparam('b_id'), role_filter
+            ).values(unread_count=bindparam(counter)), [{
+                'b_id': state['id'], counter: state['unread_count_tenant' if tenant_side else 'unread_count_agent']
+            } for state in states])
+
+    def _set_watermarks(self, conversation_ids):
+        """Each side has read everything up to its own latest message, matching the counters
+
+        Positions are compared on (created_at, id) like live reads, and a watermark
+        only moves forward, so a reader who already read past it keeps their place.
+        """
+        if not conversation_ids:
+            return
+        conversations = TenantConversation.__table__
+        messages = TenantMessage.__table__
+        for column, own_side in (
+            (conversations.c.last_read_message_id_tenant, messages.c.sender_type == 'tenant'),
+            (conversations.c.last_read_message_id_agent, messages.c.sender_type != 'tenant'),
+        ):
+            latest_own = select(messages.c.created_at, messages.c.id).where(
+                messages.c.conversation_id == conversations.c.id, own_side
+            ).order_by(messages.c.created_at.desc(), messages.c.id.desc()).limit(1)
+            position = (latest_own.with_only_columns(messages.c.created_at).scalar_subquery(),
+                        latest_own.with_only_columns(messages.c.id).scalar_subquery())
+            db.session.execute(update(conversations).where(
+                conversations.c.id.in_(conversation_ids),
+                position[1].isnot(None),
+                ~TenantConversation.read_up_to(column, position)
+            ).values({column: position[1]}))
+
+    def _record_rollups(self, states, messages):
+        """Book the chunk into the daily rollups the way live writes and rebuild() do
+
+        Opened conversations count on their creation day, messages on theirs and
+        first responses on the reply day; closures and the change in unread
+        backlog go on today, as rebuild() books them.
+        """
+        today = datetime.utcnow().date()
+        deltas = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))  # (day, property) -> user -> counter
+
+        def add(day, state, user_id, counter, amount):
+            key = (day.date() if isinstance(day, datetime) else day, state['property_id'])
+            deltas[key][(user_id, roles[state['id']][user_id])][counter] += amount
+
+        roles = {}
+        for state in states:
+            rows = TenantConversation(
+                id=state['id'], user_id=state['user_id'], agent_id=state['agent_id'], owner_id=state['owner_id'],
+                unread_count_tenant=state['unread_count_tenant'], unread_count_agent=state['unread_count_agent']
+            ).participant_rows()
+            roles[state['id']] = {row['user_id']: row['role'] for row in rows}
+            before_tenant, before_agent = state['unread_before']
+            for row in rows:
+                before = before_tenant if row['role'] == 'tenant' else before_agent
+                add(today, state, row['user_id'], 'unread_delta', row['unread_count'] - before)
+                if state.get('new'):
+                    add(state['created_at'], state, row['user_id'], 'conversations_opened', 1)
+                    if state['status'] == 'closed':
+                        add(today, state, row['user_id'], 'conversations_closed', 1)
+            if state.get('first_responder'):
+                responder, _ = state['first_responder']
+                add(state['first_response_at'], state, responder, 'first_responses', 1)
+                add(state['first_response_at'], state, responder, 'first_response_seconds',
+                    max(0, int((state['first_response_at'] - state['created_at']).total_seconds())))
+
+        states_by_id = {state['id']: state for state in states}
+        for message in messages:
+            state = states_by_id[message['conversation_id']]
+            for user_id in roles[state['id']]:
+                counter = 'messages_sent' if user_id == message['sender_id'] else 'messages_received'
+                add(message['created_at'], state, user_id, counter, 1)
+
+        connection = db.session.connection()
+        for (day, property_id), users in deltas.items():
+            MessagingRollup.record(connection, day, property_id, [
+                (user_id, role, dict(counts)) for (user_id, role), counts in users.items()
+            ])
+
+    def _save_progress(self, line_number, conversations, messages, rejected):
+        """Record the resume point in the chunk's transaction"""
+        progress = db.session.get(ConversationImportProgress, self.source)
+        if not progress:
+            progress = ConversationImportProgress(source=self.source, rows_done=0,
+                                                  conversations=0, messages=0, rejected=0)
+            db.session.add(progress)
+        progress.rows_done = line_number
+        progress.conversations += conversations
+        progress.messages += messages
+        progress.rejected += rejected
+
+    def _write_rejects(self, rejected):
+        """Append rejected rows to the reject file as JSON lines"""
+        if not rejected or not self.reject_file:
+            return
+        with open(self.reject_file, 'a', encoding='utf-8') as f:
+            for entry in rejected:
+                f.write(json.dumps(entry, default=str) + '\n')
@@ -0,0 +1,53 @@
+# app/utils/compression.py - gzip/brotli compression for JSON API responses
+
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; fall back to gzip
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024  # Bytes; smaller bodies are not worth the CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def accepted_encodings():
+    """Parse Accept-Encoding into a set of encodings with a non-zero q-value"""
+    encodings = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0'):
+            continue
+        if name:
+            encodings.add(name.lower())
+    return encodings
+
+
+def compress_response(response, min_size=MIN_COMPRESS_SIZE):
+    """Compress a JSON response body with brotli or gzip when the client accepts it"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers
+            or response.status_code < 200 or response.status_code >= 300):
+        return response
+
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+
+    encodings = accepted_encodings()
+    if brotli and 'br' in encodings:
+        compressed, encoding = brotli.compress(body, quality=BROTLI_QUALITY), 'br'
+    elif 'gzip' in encodings:
+        compressed, encoding = gzip.compress(body, compresslevel=GZIP_LEVEL), 'gzip'
+    else:
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    response.headers['Content-Length'] = str(len(compressed))
+    response.vary.add('Accept-Encoding')
+    return response
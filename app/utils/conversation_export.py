@@ -0,0 +1,137 @@
+# app/utils/conversation_export.py - Streamed, read-only conversation exports (NDJSON, CSV, ZIP)
+
+import csv
+import io
+import json
+import zipfile
+
+from app import db
+from app.models.tenant_messaging import TenantConversation, TenantMessage
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'zip': ('application/zip', 'zip'),
+}
+EXPORT_BATCH_SIZE = 500   # Rows fetched per round trip from the server-side cursor
+COPY_CHUNK_SIZE = 64 * 1024
+CSV_FIELDS = [
+    'conversation_id', 'subject', 'message_id', 'created_at', 'sender_id', 'sender_name',
+    'sender_type', 'message_text', 'attachment_name', 'attachment_url', 'attachment_size'
+]
+
+
+def iter_conversations(conversation_query):
+    """Conversations of an export, streamed in id order"""
+    yield from conversation_query.order_by(TenantConversation.id).yield_per(EXPORT_BATCH_SIZE)
+
+
+def iter_messages(conversation):
+    """Messages of one conversation in order, streamed with a server-side cursor
+
+    Clean instances are only weakly referenced by the session, so rows that have
+    been written out are freed as the export advances.
+    """
+    yield from TenantMessage.query.filter(
+        TenantMessage.conversation_id == conversation.id,
+        TenantMessage.created_at >= conversation.created_at
+    ).order_by(TenantMessage.created_at, TenantMessage.id).yield_per(EXPORT_BATCH_SIZE)
+
+
+def export_ndjson(conversation_query, user_role):
+    """One JSON line per conversation header followed by one per message"""
+    for conversation in iter_conversations(conversation_query):
+        yield json.dumps({'type': 'conversation', **conversation.to_dict(user_role)}) + '\n'
+        for message in iter_messages(conversation):
+            yield json.dumps({'type': 'message', **message.to_dict(user_role)}) + '\n'
+
+
+def export_csv(conversation_query, user_role):
+    """Flat CSV with one row per message"""
+    line = io.StringIO()
+    writer = csv.DictWriter(line, fieldnames=CSV_FIELDS)
+
+    def drain():
+        value = line.getvalue()
+        line.seek(0)
+        line.truncate()
+        return value
+
+    writer.writeheader()
+    yield drain()
+    for conversation in iter_conversations(conversation_query):
+        for message in iter_messages(conversation):
+            writer.writerow({
+                'conversation_id': conversation.id,
+                'subject': conversation.subject,
+                'message_id': message.id,
+                'created_at': message.created_at.isoformat(),
+                'sender_id': message.sender_id,
+                'sender_name': message.sender_name,
+                'sender_type': message.sender_type,
+                'message_text': message.message_text,
+                'attachment_name': message.attachment_name,
+                'attachment_url': message.attachment_url,
+                'attachment_size': message.attachment_size
+            })
+            yield drain()
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Unseekable sink for ZipFile; the generator drains it after every write"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_attachments(conversation_query):
+    """(message id, conversation id, storage key, original name) for every attachment in the export"""
+    conversation_ids = conversation_query.with_entities(TenantConversation.id)
+    yield from db.session.query(
+        TenantMessage.id, TenantMessage.conversation_id, TenantMessage.attachment_url, TenantMessage.attachment_name
+    ).filter(
+        TenantMessage.conversation_id.in_(conversation_ids),
+        TenantMessage.attachment_url.isnot(None)
+    ).order_by(TenantMessage.conversation_id, TenantMessage.id).yield_per(EXPORT_BATCH_SIZE)
+
+
+def export_zip(conversation_query, user_role, storage):
+    """ZIP with messages.ndjson plus every attachment, emitted as it is written
+
+    ZipFile falls back to data descriptors on an unseekable sink, so no entry is
+    buffered whole; attachments are copied COPY_CHUNK_SIZE bytes at a time.
+    """
+    sink = _StreamBuffer()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('messages.ndjson', 'w', force_zip64=True) as entry:
+            for line in export_ndjson(conversation_query, user_role):
+                entry.write(line.encode('utf-8'))
+                yield sink.drain()
+        yield sink.drain()
+
+        for message_id, conversation_id, key, name in iter_attachments(conversation_query):
+            if storage.size(key) is None:
+                continue
+            info = zipfile.ZipInfo(f"attachments/{conversation_id}/{message_id}_{name or key.rsplit('/', 1)[-1]}")
+            info.compress_type = zipfile.ZIP_STORED  # Attachments are mostly already-compressed media
+            with storage.open(key) as source, archive.open(info, 'w', force_zip64=True) as entry:
+                while True:
+                    chunk = source.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    entry.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
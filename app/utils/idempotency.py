@@ -0,0 +1,168 @@
+# app/utils/idempotency.py - Idempotency-Key support for non-idempotent POST endpoints
+
+import base64
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import json
+import threading
+import time
+import zlib
+
+from flask import request, current_app, make_response
+from flask_jwt_extended import get_jwt_identity
+
+from app.utils.response_utils import error_response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+DEFAULT_TTL = 24 * 60 * 60  # 24 hours
+DEFAULT_PENDING_TTL = 60  # Seconds a key stays reserved by a request that never finishes
+PENDING = 'pending'
+
+
+class InMemoryIdempotencyStore:
+    """Bounded, expiring store of completed responses keyed by a 32-byte digest"""
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reserve(self, key, ttl):
+        """Claim a key for a new request; return the stored entry if it already exists"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+
+            self._entries[key] = (now + ttl, PENDING)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return None
+
+    def complete(self, key, record, ttl):
+        """Store the finished response for a reserved key"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, record)
+
+    def release(self, key):
+        """Forget a key so the request can be retried"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisIdempotencyStore:
+    """Idempotency records shared across workers through Redis"""
+
+    def __init__(self, client, prefix='idempotency:'):
+        self.client = client
+        self.prefix = prefix
+
+    def reserve(self, key, ttl):
+        """Claim a key with SET NX; return the stored entry if it already exists"""
+        redis_key = self.prefix + key.hex()
+        if self.client.set(redis_key, PENDING, nx=True, ex=ttl):
+            return None
+        value = self.client.get(redis_key)
+        if value is None:
+            return self.reserve(key, ttl)
+        if value == PENDING.encode():
+            return PENDING
+        try:
+            return json.loads(value)
+        except ValueError:  # Not a record this code wrote; never execute or trust it
+            self.client.delete(redis_key)
+            return self.reserve(key, ttl)
+
+    def complete(self, key, record, ttl):
+        """Store the finished response for a reserved key (as JSON, never pickle)"""
+        self.client.set(self.prefix + key.hex(), json.dumps(record), ex=ttl)
+
+    def release(self, key):
+        """Forget a key so the request can be retried"""
+        self.client.delete(self.prefix + key.hex())
+
+
+_default_store = InMemoryIdempotencyStore()
+
+
+def get_idempotency_store():
+    """Store configured on the app, falling back to the per-process store"""
+    return current_app.config.get('IDEMPOTENCY_STORE') or _default_store
+
+
+def request_fingerprint():
+    """Digest of the method, path and payload, to tell a retry from a reused key"""
+    digest = hashlib.sha256(f"{request.method}:{request.path}:".encode())
+    digest.update(request.get_data(cache=True, parse_form_data=True))
+    for name, value in sorted(request.form.items(multi=True)):
+        digest.update(f"form:{name}={value}".encode())
+    for name, file in sorted(request.files.items(multi=True), key=lambda item: (item[0], item[1].filename or '')):
+        digest.update(f"file:{name}={file.filename}:".encode())
+        for chunk in iter(lambda: file.stream.read(65536), b''):
+            digest.update(chunk)
+        file.stream.seek(0)
+    return digest.hexdigest()
+
+
+def serialize_response(response, fingerprint):
+    """JSON-safe record of a response: status, headers and the zlib-compressed body as base64"""
+    return {
+        'status': response.status_code,
+        'headers': [[name, value] for name, value in response.headers.items() if name.lower() != 'content-length'],
+        'body': base64.b64encode(zlib.compress(response.get_data())).decode('ascii'),
+        'fingerprint': fingerprint,
+    }
+
+
+def replay_response(record):
+    """Rebuild a stored response"""
+    response = current_app.response_class(zlib.decompress(base64.b64decode(record['body'])),
+                                          status=record['status'], headers=record['headers'])
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Replay the original response when a request repeats its Idempotency-Key"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        client_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if request.method == 'OPTIONS' or not client_key:
+            return view(*args, **kwargs)
+
+        if len(client_key) > MAX_KEY_LENGTH:
+            return error_response("Idempotency-Key is too long", status_code=400)
+
+        # Scope keys to the caller and endpoint so they cannot collide across users
+        scope = f"{get_jwt_identity()}:{request.method}:{request.path}:{client_key}"
+        key = hashlib.sha256(scope.encode()).digest()
+        ttl = current_app.config.get('IDEMPOTENCY_TTL', DEFAULT_TTL)
+        store = get_idempotency_store()
+        fingerprint = request_fingerprint()
+
+        # The reservation expires quickly so a worker that dies mid-request does not block the key
+        existing = store.reserve(key, current_app.config.get('IDEMPOTENCY_PENDING_TTL', DEFAULT_PENDING_TTL))
+        if existing == PENDING:
+            return error_response("A request with this Idempotency-Key is still in progress", status_code=409)
+        if existing:
+            if existing.get('fingerprint') != fingerprint:
+                return error_response("Idempotency-Key was already used with a different request", status_code=422)
+            return replay_response(existing)
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            store.release(key)
+            raise
+
+        # Only successful responses are remembered; failures may be retried
+        if 200 <= response.status_code < 300 and not response.is_streamed:
+            store.complete(key, serialize_response(response, fingerprint), ttl)
+        else:
+            store.release(key)
+        return response
+    return wrapped
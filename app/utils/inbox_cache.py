@@ -0,0 +1,181 @@
+# app/utils/inbox_cache.py - Per-user inbox response cache with a DB-latency circuit breaker
+
+from functools import wraps
+import threading
+import time
+
+from flask import request, current_app, make_response
+from flask_jwt_extended import get_jwt_identity
+
+from app.utils.rate_limiter import LatencyMonitor
+from app.utils.metrics import INBOX_CACHE_REQUESTS
+
+DEFAULT_FRESH_TTL = 5          # Seconds a cached inbox is served without querying
+DEFAULT_STALE_TTL = 10 * 60    # Seconds a cached inbox may be served while the breaker is open
+
+
+class InMemoryInboxCache:
+    """Cached inbox responses plus a per-user version bumped on every write"""
+
+    def __init__(self, max_entries=20000):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, user_id):
+        """Current cache version for a user"""
+        return self._versions.get(str(user_id), 0)
+
+    def get(self, key):
+        """(stored_at, version, status, mimetype, body) or None"""
+        return self._entries.get(key)
+
+    def set(self, key, entry):
+        """Store a response, evicting the oldest entries when full"""
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                for old_key in sorted(self._entries, key=lambda k: self._entries[k][0])[:self.max_entries // 10]:
+                    del self._entries[old_key]
+            self._entries[key] = entry
+
+    def invalidate(self, user_ids):
+        """Mark every cached inbox of these users as out of date (kept for stale serving)"""
+        with self._lock:
+            for user_id in user_ids:
+                if user_id is not None:
+                    self._versions[str(user_id)] = self._versions.get(str(user_id), 0) + 1
+
+
+class RedisInboxCache(InMemoryInboxCache):
+    """Inbox cache whose per-user versions live in Redis, so a write on any worker invalidates all
+
+    Response bodies stay in each worker's memory; only the small version
+    counters are shared. A version key outlives any fresh cache entry, so
+    letting it expire cannot revive an out-of-date entry.
+    """
+
+    def __init__(self, client, prefix='inbox-version:', version_ttl=24 * 3600, max_entries=20000):
+        super().__init__(max_entries=max_entries)
+        self.client = client
+        self.prefix = prefix
+        self.version_ttl = version_ttl
+
+    def version(self, user_id):
+        """Current shared cache version for a user"""
+        return int(self.client.get(self.prefix + str(user_id)) or 0)
+
+    def invalidate(self, user_ids):
+        """Bump the shared versions of these users"""
+        for user_id in user_ids:
+            if user_id is not None:
+                key = self.prefix + str(user_id)
+                self.client.incr(key)
+                self.client.expire(key, self.version_ttl)
+
+
+class CircuitBreaker:
+    """Opens when DB latency or consecutive errors pass a threshold, then probes after a cooldown"""
+
+    def __init__(self, latency_threshold=1.0, error_threshold=5, cooldown=30):
+        self.latency_threshold = latency_threshold
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.latency = LatencyMonitor(alpha=0.3)
+        self.consecutive_errors = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        """True while the breaker rejects queries; after the cooldown one request is let through"""
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # Half-open: let this caller probe the database, keep others on the cache
+                self.opened_at = time.monotonic()
+                return False
+            return True
+
+    def record_success(self, seconds):
+        """Record a completed query; close or open the breaker based on latency"""
+        self.latency.observe(seconds)
+        with self._lock:
+            self.consecutive_errors = 0
+            if self.latency.average > self.latency_threshold:
+                self.opened_at = self.opened_at or time.monotonic()
+            else:
+                self.opened_at = None
+
+    def record_failure(self):
+        """Record a failed query; open the breaker after repeated failures"""
+        with self._lock:
+            self.consecutive_errors += 1
+            if self.consecutive_errors >= self.error_threshold:
+                self.opened_at = time.monotonic()
+
+
+_default_cache = InMemoryInboxCache()
+inbox_breaker = CircuitBreaker()
+
+
+def get_inbox_cache():
+    """Cache configured on the app (e.g. RedisInboxCache(redis_client)), falling back to the per-process cache"""
+    return current_app.config.get('INBOX_CACHE') or _default_cache
+
+
+def invalidate_inbox(*user_ids):
+    """Drop cached inboxes for the participants of a conversation that was written to"""
+    get_inbox_cache().invalidate(user_ids)
+
+
+def _replay(entry, stale):
+    """Rebuild a Flask response from a cache entry"""
+    stored_at, _, status_code, mimetype, body = entry
+    response = current_app.response_class(body, status=status_code, mimetype=mimetype)
+    age = int(time.time() - stored_at)
+    response.headers['Age'] = str(age)
+    if stale:
+        response.headers['X-Inbox-Stale'] = 'true'
+        response.headers['Warning'] = '110 - "Response is Stale"'
+    return response
+
+
+def cached_inbox(view):
+    """Serve inbox and unread-count views from a per-user cache; serve stale copies while the DB is unhealthy"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if request.method == 'OPTIONS' or not current_app.config.get('INBOX_CACHE_ENABLED', True):
+            return view(*args, **kwargs)
+
+        user_id = get_jwt_identity()
+        cache = get_inbox_cache()
+        key = f"{user_id}:{request.full_path}"
+        entry = cache.get(key)
+        version = cache.version(user_id)
+
+        if entry:
+            age = time.time() - entry[0]
+            fresh_ttl = current_app.config.get('INBOX_CACHE_TTL', DEFAULT_FRESH_TTL)
+            stale_ttl = current_app.config.get('INBOX_CACHE_STALE_TTL', DEFAULT_STALE_TTL)
+            if entry[1] == version and age < fresh_ttl:
+                INBOX_CACHE_REQUESTS.labels(view.__name__, 'hit').inc()
+                return _replay(entry, stale=False)
+            if age < stale_ttl and inbox_breaker.is_open():
+                INBOX_CACHE_REQUESTS.labels(view.__name__, 'stale').inc()
+                return _replay(entry, stale=True)
+
+        INBOX_CACHE_REQUESTS.labels(view.__name__, 'miss').inc()
+        started = time.perf_counter()
+        response = make_response(view(*args, **kwargs))
+        if response.status_code >= 500:
+            inbox_breaker.record_failure()
+            if entry and time.time() - entry[0] < current_app.config.get('INBOX_CACHE_STALE_TTL', DEFAULT_STALE_TTL):
+                return _replay(entry, stale=True)
+            return response
+
+        inbox_breaker.record_success(time.perf_counter() - started)
+        if response.status_code == 200 and not response.is_streamed:
+            cache.set(key, (time.time(), version, response.status_code, response.mimetype, response.get_data()))
+        return response
+    return wrapped
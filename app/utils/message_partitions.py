@@ -0,0 +1,137 @@
+# app/utils/message_partitions.py - Monthly range partitioning of tenant_messages (PostgreSQL)
+
+from datetime import datetime
+
+from sqlalchemy import text
+
+PARENT_TABLE = 'tenant_messages'
+LEGACY_TABLE = 'tenant_messages_unpartitioned'
+# Created by earlier versions of migrate_to_partitioned; drained by ensure_future_partitions
+DEFAULT_PARTITION = f'{PARENT_TABLE}_default'
+DEFAULT_MONTHS_AHEAD = 3
+
+# Indexes declared on TenantMessage, recreated on the partitioned parent
+MESSAGE_INDEXES = {
+    'ix_tenant_messages_conversation_created': 'conversation_id, created_at',
+    'ix_tenant_messages_conversation_updated': 'conversation_id, updated_at',
+}
+
+
+def month_start(value):
+    """First instant of the month containing value"""
+    return datetime(value.year, value.month, 1)
+
+
+def next_month(value):
+    """First instant of the month after value's month"""
+    if value.month == 12:
+        return datetime(value.year + 1, 1, 1)
+    return datetime(value.year, value.month + 1, 1)
+
+
+def partition_name(start):
+    """Name of the monthly partition starting at start, e.g. tenant_messages_y2026m01"""
+    return f"{PARENT_TABLE}_y{start.year:04d}m{start.month:02d}"
+
+
+def is_postgresql(connection):
+    """Partitioning is only supported on PostgreSQL"""
+    return connection.dialect.name == 'postgresql'
+
+
+def is_partitioned(connection):
+    """Check whether tenant_messages is already a partitioned table"""
+    return bool(connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :name"
+    ), {'name': PARENT_TABLE}).scalar())
+
+
+def create_partition(connection, start):
+    """Create the monthly partition starting at start if it does not exist"""
+    end = next_month(start)
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+
+
+def create_partitions_between(connection, first, last):
+    """Create the monthly partitions covering first through last"""
+    start = month_start(first)
+    while start <= last:
+        create_partition(connection, start)
+        start = next_month(start)
+
+
+def drain_default_partition(connection):
+    """Move rows out of a DEFAULT partition into monthly partitions and drop it
+
+    PostgreSQL refuses to create a range partition while the DEFAULT partition
+    holds rows in that range, so the DEFAULT partition is detached, its months
+    are created and its rows re-inserted through the parent.
+    """
+    if not connection.execute(text("SELECT to_regclass(:name)"), {'name': DEFAULT_PARTITION}).scalar():
+        return False
+    connection.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    first, last = connection.execute(text(
+        f"SELECT MIN(created_at), MAX(created_at) FROM {DEFAULT_PARTITION}"
+    )).one()
+    if first is not None:
+        create_partitions_between(connection, first, last)
+        connection.execute(text(f"INSERT INTO {PARENT_TABLE} SELECT * FROM {DEFAULT_PARTITION}"))
+    connection.execute(text(f"DROP TABLE {DEFAULT_PARTITION}"))
+    return True
+
+
+def ensure_future_partitions(connection, months_ahead=DEFAULT_MONTHS_AHEAD, now=None):
+    """Create partitions for the current month and the next months_ahead months"""
+    drain_default_partition(connection)
+    start = month_start(now or datetime.utcnow())
+    created = []
+    for _ in range(months_ahead + 1):
+        create_partition(connection, start)
+        created.append(partition_name(start))
+        start = next_month(start)
+    return created
+
+
+def migrate_to_partitioned(connection, months_ahead=DEFAULT_MONTHS_AHEAD):
+    """Convert tenant_messages into a table range-partitioned by created_at month
+
+    The original table is renamed to tenant_messages_unpartitioned and its rows
+    are copied across; drop it once the new table has been verified. There is
+    no DEFAULT partition: inserts past the pre-created months fail loudly, so
+    ensure-message-partitions must run from cron.
+    """
+    if is_partitioned(connection):
+        return False
+
+    connection.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {LEGACY_TABLE}"))
+    for index_name in MESSAGE_INDEXES:
+        connection.execute(text(f"ALTER INDEX IF EXISTS {index_name} RENAME TO {index_name}_legacy"))
+    connection.execute(text(
+        f"CREATE TABLE {PARENT_TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE (created_at)"
+    ))
+    # The partition key must be part of every unique constraint
+    connection.execute(text(f"ALTER TABLE {PARENT_TABLE} ADD PRIMARY KEY (id, created_at)"))
+    connection.execute(text(
+        f"ALTER TABLE {PARENT_TABLE} ADD FOREIGN KEY (conversation_id) REFERENCES tenant_conversations (id)"
+    ))
+    # Keep the id sequence alive when the legacy table is dropped
+    connection.execute(text(
+        f"ALTER SEQUENCE IF EXISTS {PARENT_TABLE}_id_seq OWNED BY {PARENT_TABLE}.id"
+    ))
+    for index_name, columns in MESSAGE_INDEXES.items():
+        connection.execute(text(f"CREATE INDEX {index_name} ON {PARENT_TABLE} ({columns})"))
+
+    oldest, newest = connection.execute(text(
+        f"SELECT MIN(created_at), MAX(created_at) FROM {LEGACY_TABLE}"
+    )).one()
+    if oldest is not None:
+        create_partitions_between(connection, oldest, newest)
+    ensure_future_partitions(connection, months_ahead)
+
+    connection.execute(text(f"INSERT INTO {PARENT_TABLE} SELECT * FROM {LEGACY_TABLE}"))
+    return True
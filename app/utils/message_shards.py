@@ -0,0 +1,551 @@
+# app/utils/message_shards.py - Hash-sharded conversation storage across several database binds
+#
+# Failure modes: every database commits on its own, nothing is two-phase.
+# - A request writes one conversation's rows, which all live on one shard; the
+#   session refuses to flush ORM writes that span several shards. Marking a
+#   legacy grouped thread read issues Core UPDATEs that can touch several shards;
+#   they only move read state forward, so a partial commit is repaired by the next read.
+# - Conversation and message ids come from blocks reserved on the primary in their
+#   own committed transaction, so a failed shard commit leaves a gap, never a reused id.
+# - Writes that touch the primary and a shard in one request (users, tenancies)
+#   can commit on one and fail on the other; callers must not depend on both.
+# - Maintenance loops (each_shard) commit shard by shard; the migrations and
+#   rebuild-rollups are re-runnable, so a failed run is finished by running it again.
+# - Message ids are unique across shards, so clients can dedupe /sync and export
+#   rows by id; ids do not follow created_at, so orderings use (created_at, id).
+
+import math
+import os
+import threading
+import zlib
+
+from flask import current_app
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import Table, event, func, inspect, select, text, tuple_
+from sqlalchemy.exc import UnboundExecutionError
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.ddl import CreateTable
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+from sqlalchemy.sql.schema import Column
+
+from app import db
+from app.models.tenant_messaging import (
+    TenantConversation, TenantMessage, ConversationParticipant, MessagingRollup, MessageOutboxEvent,
+    ConversationIdAllocation
+)
+
+PRIMARY_SHARD = 'primary'   # Shard id of the default bind: users, properties and everything not sharded
+PINNED_SHARD = 'message_shard'   # db.session.info key set by each_shard()
+WRITTEN_SHARDS = 'written_message_shards'   # db.session.info key: shards flushed to in this transaction
+SESSION_CLASS = 'message_session_class'   # app.extensions key: class of db.session for that app
+MIGRATION_BATCH_SIZE = 500
+DEFAULT_ID_BLOCK_SIZE = 100   # Conversation and message ids reserved per primary INSERT (MESSAGE_SHARD_ID_BLOCK)
+
+# Tables stored with their conversation, in creation order, and the column naming it
+SHARDED_MODELS = (TenantConversation, ConversationParticipant, TenantMessage, MessagingRollup, MessageOutboxEvent)
+SHARDED_MODELS_BY_TABLE = {model.__tablename__: model for model in SHARDED_MODELS}
+SHARDED_TABLES = frozenset(SHARDED_MODELS_BY_TABLE)
+SHARD_KEY_COLUMNS = {
+    TenantConversation.__tablename__: 'id',
+    ConversationParticipant.__tablename__: 'conversation_id',
+    TenantMessage.__tablename__: 'conversation_id',
+}
+# Sequences interleaved across shards on PostgreSQL so their ids stay unique everywhere
+# (conversations and messages take ids from the primary's blocks instead)
+INTERLEAVED_TABLES = (MessageOutboxEvent.__tablename__,)
+
+
+def shard_binds(app=None):
+    """Bind keys (from SQLALCHEMY_BINDS) of the message shards, in shard order; empty when not sharded"""
+    return list((app or current_app).config.get('MESSAGE_SHARD_BINDS') or [])
+
+
+def sharding_enabled():
+    """True when conversations are spread over MESSAGE_SHARD_BINDS"""
+    return bool(shard_binds())
+
+
+def shard_index(conversation_id, shard_count):
+    """Shard number holding a conversation; the id encodes it"""
+    return int(conversation_id) % shard_count
+
+
+def tenant_shard_index(user_id, shard_count):
+    """Shard new conversations of a tenant are placed on, so grouped views stay on one shard"""
+    return zlib.crc32(str(user_id).encode()) % shard_count
+
+
+def message_engines():
+    """Engines holding messaging tables: one per shard, or just the default engine"""
+    binds = shard_binds()
+    return [db.engines[key] for key in binds] if binds else [db.engine]
+
+
+# Per-process id blocks: primary URL -> [pid, next sequence, end of block]
+_id_blocks = {}
+_id_blocks_lock = threading.Lock()
+
+
+def next_id_sequence():
+    """Next sequence number for a conversation or message id, reserving a new block on the primary when used up
+
+    The block is reserved on its own connection and committed at once, so the
+    shard transaction never waits on or depends on the primary. Blocks are per
+    process; a forked worker reserves its own.
+    """
+    primary = db.engines[None]
+    block_size = current_app.config.get('MESSAGE_SHARD_ID_BLOCK', DEFAULT_ID_BLOCK_SIZE)
+    with _id_blocks_lock:
+        block = _id_blocks.get(str(primary.url))
+        if not block or block[0] != os.getpid() or block[1] >= block[2]:
+            with primary.begin() as connection:
+                reserved = connection.execute(ConversationIdAllocation.__table__.insert()).inserted_primary_key[0]
+            block = _id_blocks[str(primary.url)] = [os.getpid(), reserved * block_size, (reserved + 1) * block_size]
+        sequence = block[1]
+        block[1] += 1
+        return sequence
+
+
+def _conjuncts(criteria):
+    """Top-level AND-ed criteria; anything under an OR is left alone"""
+    for criterion in criteria:
+        if isinstance(criterion, BooleanClauseList) and criterion.operator is operators.and_:
+            yield from _conjuncts(criterion.clauses)
+        else:
+            yield criterion
+
+
+def _statement_tables(statement):
+    """Names of the tables a statement reads or writes"""
+    return {element.name for element in visitors.iterate(statement) if isinstance(element, Table)}
+
+
+def _shard_key_values(statement):
+    """Conversation ids a statement is restricted to by its WHERE clause, or None if unrestricted"""
+    values = None
+    for criterion in _conjuncts(getattr(statement, '_where_criteria', ())):
+        if not isinstance(criterion, BinaryExpression):
+            continue
+        column, bind = criterion.left, criterion.right
+        if not isinstance(column, Column) or not isinstance(bind, BindParameter):
+            continue
+        if column.table is None or SHARD_KEY_COLUMNS.get(column.table.name) != column.name:
+            continue
+        if criterion.operator is operators.eq:
+            found = {bind.effective_value}
+        elif criterion.operator is operators.in_op:
+            found = set(bind.effective_value or ())
+        else:
+            continue
+        try:
+            found = {int(value) for value in found}
+        except (TypeError, ValueError):
+            continue
+        values = found if values is None else values & found
+    return values
+
+
+def _conversation_id_of(instance):
+    """Conversation id a new row belongs to"""
+    if instance is None:
+        return None
+    if isinstance(instance, TenantConversation):
+        return instance.id
+    if isinstance(instance, MessageOutboxEvent):
+        return (instance.payload or {}).get('conversation_id')
+    conversation_id = getattr(instance, 'conversation_id', None)
+    if conversation_id is None and getattr(instance, 'conversation', None) is not None:
+        conversation_id = instance.conversation.id  # Pending child attached through the relationship
+    return conversation_id
+
+
+class ShardedMessagingSession(ShardedSession, FlaskSession):
+    """db.session when MESSAGE_SHARD_BINDS is set
+
+    Conversations and the rows stored with them go to the shard their conversation
+    id names; every other model stays on the primary through Flask-SQLAlchemy's
+    usual bind lookup. Statements restricted to conversation ids run on those
+    shards only, the rest run on every shard and their rows are concatenated.
+    """
+
+    def __init__(self, db, **kwargs):
+        self.shard_keys = shard_binds()
+        engines = db.engines
+        missing = [key for key in self.shard_keys if key not in engines]
+        if missing:
+            raise UnboundExecutionError(f"MESSAGE_SHARD_BINDS names unknown binds: {', '.join(missing)}")
+        super().__init__(
+            db=db,
+            shard_chooser=self._choose_shard,
+            identity_chooser=self._choose_identity_shards,
+            execute_chooser=self._choose_execute_shards,
+            shards={PRIMARY_SHARD: engines[None], **{key: engines[key] for key in self.shard_keys}},
+            **kwargs
+        )
+        event.listen(self, 'before_flush', self._assign_ids)
+        event.listen(self, 'before_flush', self._refuse_multi_shard_writes)
+        for name in ('after_commit', 'after_rollback'):
+            event.listen(self, name, lambda session, *args: session.info.pop(WRITTEN_SHARDS, None))
+
+    def shard_for_conversation(self, conversation_id):
+        """Shard id holding a conversation"""
+        if not self.shard_keys:
+            return PRIMARY_SHARD
+        return self.shard_keys[shard_index(conversation_id, len(self.shard_keys))]
+
+    def _pinned(self):
+        return self.info.get(PINNED_SHARD)
+
+    def _is_sharded(self, mapper):
+        return bool(self.shard_keys) and mapper.local_table.name in SHARDED_TABLES
+
+    def _choose_shard(self, mapper, instance, clause=None, **kw):
+        """Shard for a row being flushed, or for a connection requested for a mapper"""
+        if not self._is_sharded(mapper):
+            return PRIMARY_SHARD
+        if self._pinned():
+            return self._pinned()
+        conversation_id = _conversation_id_of(instance)
+        if conversation_id is None:
+            raise UnboundExecutionError(
+                f"Cannot choose a message shard for {mapper.class_.__name__} without its conversation id"
+            )
+        return self.shard_for_conversation(conversation_id)
+
+    def _choose_identity_shards(self, mapper, primary_key, **kw):
+        """Shards to search for a primary key (Session.get and many-to-one lazy loads)"""
+        if not self._is_sharded(mapper):
+            return [PRIMARY_SHARD]
+        if self._pinned():
+            return [self._pinned()]
+        key = SHARD_KEY_COLUMNS.get(mapper.local_table.name)
+        for position, column in enumerate(mapper.primary_key):
+            if column.name == key:
+                try:
+                    return [self.shard_for_conversation(primary_key[position])]
+                except (TypeError, ValueError):
+                    break
+        return list(self.shard_keys)
+
+    def _choose_execute_shards(self, orm_context):
+        """Shards a statement runs on: the primary, the shards of its conversation ids, or all shards"""
+        statement = orm_context.statement
+        tables = _statement_tables(statement)
+        sharded = tables & SHARDED_TABLES
+        if not self.shard_keys or (tables and not sharded):
+            return [PRIMARY_SHARD]
+        if not tables:
+            return [self._pinned() or PRIMARY_SHARD]  # Textual SQL follows the pinned shard
+        if tables - SHARDED_TABLES:
+            raise UnboundExecutionError(
+                f"Cannot join sharded tables with {', '.join(sorted(tables - SHARDED_TABLES))} in one statement"
+            )
+        if self._pinned():
+            return [self._pinned()]
+        conversation_ids = _shard_key_values(statement)
+        if conversation_ids is not None:
+            shards = {self.shard_for_conversation(conversation_id) for conversation_id in conversation_ids}
+            return sorted(shards) or self.shard_keys[:1]
+        if orm_context.is_insert:
+            raise UnboundExecutionError("Inserts into sharded tables must be pinned to a shard")
+        return list(self.shard_keys)
+
+    def execute(self, statement, params=None, *, bind_arguments=None, **kw):
+        # A pinned statement runs on one shard directly, keeping its result's rowcount
+        if self._pinned() and not (bind_arguments or {}).get('shard_id') and \
+                _statement_tables(statement) <= SHARDED_TABLES:
+            bind_arguments = dict(bind_arguments or {}, shard_id=self._pinned())
+        return super().execute(statement, params, bind_arguments=bind_arguments, **kw)
+
+    def get_bind(self, mapper=None, *, shard_id=None, instance=None, clause=None, **kw):
+        if mapper is not None:
+            mapper = inspect(mapper)
+        if shard_id is None:
+            if mapper is None and instance is None:
+                shard_id = self._pinned() or PRIMARY_SHARD
+            else:
+                shard_id = self._choose_shard_and_assign(mapper, instance=instance, clause=clause)
+        if shard_id == PRIMARY_SHARD:
+            return FlaskSession.get_bind(self, mapper, clause=clause, **kw)
+        return super().get_bind(mapper, shard_id=shard_id, instance=instance, clause=clause, **kw)
+
+    @staticmethod
+    def _assign_ids(session, flush_context, instances):
+        """Give new conversations and messages ids from the primary sequence that name their shard
+
+        A conversation goes to its tenant's shard and a message to its conversation's,
+        so message ids are unique across shards just like conversation ids.
+        """
+        if not session.shard_keys:
+            return
+        shard_count = len(session.shard_keys)
+        for conversation in [obj for obj in session.new if isinstance(obj, TenantConversation) and obj.id is None]:
+            conversation.id = next_id_sequence() * shard_count + tenant_shard_index(conversation.user_id, shard_count)
+        for message in [obj for obj in session.new if isinstance(obj, TenantMessage) and obj.id is None]:
+            conversation_id = _conversation_id_of(message)
+            if conversation_id is not None:
+                message.id = next_id_sequence() * shard_count + shard_index(conversation_id, shard_count)
+
+    @staticmethod
+    def _refuse_multi_shard_writes(session, flush_context, instances):
+        """Shards commit one after another, so a transaction writing to two could half-commit"""
+        written = session.info.setdefault(WRITTEN_SHARDS, set())
+        changed = list(session.new) + list(session.deleted) + [obj for obj in session.dirty if session.is_modified(obj)]
+        for obj in changed:
+            state = inspect(obj)
+            if session._is_sharded(state.mapper):
+                written.add(state.identity_token or session._choose_shard(state.mapper, obj))
+        if len(written) > 1:
+            raise UnboundExecutionError(
+                f"One transaction wrote to message shards {', '.join(sorted(written))}; commit per shard"
+            )
+
+
+class _PerAppSessionClass:
+    """Class of db.session's factory that opens the session class the current app configured"""
+
+    def __init__(self, default):
+        self.default = default
+        self.__name__ = default.__name__
+
+    def __call__(self, **kwargs):
+        return current_app.extensions.get(SESSION_CLASS, self.default)(**kwargs)
+
+
+def configure_session(app, db):
+    """Open app's db.session as a ShardedMessagingSession
+
+    The class is recorded on the app when it is created; other apps sharing db
+    (tests, scripts, the static server) keep Flask-SQLAlchemy's session.
+    """
+    app.extensions[SESSION_CLASS] = ShardedMessagingSession
+    factory = db.session.session_factory
+    if not isinstance(factory.class_, _PerAppSessionClass):
+        factory.class_ = _PerAppSessionClass(factory.class_)
+
+
+def each_shard():
+    """Yield once per shard with db.session pinned to it (once, unpinned, when not sharded)
+
+    Maintenance code written against a single database runs unchanged inside the
+    loop: every statement on a sharded table, textual SQL included, goes to the
+    pinned shard.
+    """
+    binds = shard_binds()
+    if not binds:
+        yield None
+        return
+    for key in binds:
+        session = db.session()
+        session.info[PINNED_SHARD] = key
+        try:
+            yield key
+        finally:
+            session.info.pop(PINNED_SHARD, None)
+
+
+def merge_ordered(rows, key, reverse=False):
+    """Restore a query's ORDER BY over rows gathered from several shards"""
+    if not sharding_enabled():
+        return rows
+    return sorted(rows, key=key, reverse=reverse)
+
+
+def sum_rows(rows):
+    """Column-wise sum of an aggregate query's rows, one row per shard"""
+    totals = None
+    for row in rows:
+        values = [value or 0 for value in row]
+        totals = values if totals is None else [total + value for total, value in zip(totals, values)]
+    return totals
+
+
+def merge_groups(rows):
+    """Sum GROUP BY rows (key, *aggregates) that several shards returned for the same key"""
+    groups = {}
+    for key, *values in rows:
+        groups[key] = sum_rows([groups[key], values]) if key in groups else [value or 0 for value in values]
+    return [(key, *values) for key, values in sorted(groups.items(), key=lambda item: (item[0] is None, item[0]))]
+
+
+class ShardedPagination:
+    """The parts of Flask-SQLAlchemy's pagination the routes use, merged across shards"""
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def pages(self):
+        return math.ceil(self.total / self.per_page) if self.total else 0
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+
+def paginate(query, page, per_page, key, reverse=False):
+    """query.paginate() that stays correct when the rows come from several shards
+
+    Each shard returns its first page * per_page rows in the query's order; the
+    merged list is re-sorted with key and the requested page sliced from it.
+    Deep pages therefore cost page * per_page rows per shard: use keyset_page
+    (cursor pagination) for anything scrolled past the first few pages.
+    """
+    if not sharding_enabled():
+        return query.paginate(page=page, per_page=per_page, error_out=False)
+    page = max(page, 1)
+    per_page = per_page if per_page > 0 else 20
+    counts = db.session.query(func.count()).select_from(query.order_by(None).subquery()).all()
+    rows = merge_ordered(query.limit(page * per_page).all(), key, reverse)
+    return ShardedPagination(rows[(page - 1) * per_page:page * per_page], page, per_page, sum_rows(counts)[0])
+
+
+def keyset_page(query, columns, per_page, after=None, descending=False):
+    """One page of query ordered by columns, starting after the cursor values after
+
+    columns must end with a unique key (e.g. created_at, conversation_id, id).
+    Every shard returns at most per_page + 1 rows past the cursor, whatever the
+    depth. Returns (items, cursor of the last item or None on the last page).
+    """
+    per_page = per_page if per_page > 0 else 20
+    if after is not None:
+        position = tuple_(*columns)
+        query = query.filter(position < tuple_(*after) if descending else position > tuple_(*after))
+    order = [column.desc() if descending else column for column in columns]
+    rows = query.order_by(None).order_by(*order).add_columns(*columns).limit(per_page + 1).all()
+    rows = merge_ordered(rows, key=lambda row: tuple(row[1:]), reverse=descending)
+    page = rows[:per_page]
+    cursor = tuple(page[-1][1:]) if len(rows) > per_page else None
+    return [row[0] for row in page], cursor
+
+
+def create_shard_tables():
+    """Create the sharded tables on every shard and seed the conversation id sequence
+
+    Foreign keys to tables that stay on the primary (users, properties) are left
+    out. The id sequence starts above the primary's legacy conversation and
+    message ids. On PostgreSQL, outbox sequences of newly created tables are
+    interleaved (shard k hands out k, k + N, ...) above the primary's legacy ids.
+    """
+    binds = shard_binds()
+    if not binds:
+        raise RuntimeError("MESSAGE_SHARD_BINDS is not configured")
+    shard_count = len(binds)
+    primary = db.engines[None]
+
+    with primary.begin() as connection:
+        legacy_max = {}
+        for name in SHARDED_TABLES:
+            if inspect(connection).has_table(name) and 'id' in SHARDED_MODELS_BY_TABLE[name].__table__.c:
+                legacy_max[name] = connection.execute(
+                    select(func.max(SHARDED_MODELS_BY_TABLE[name].__table__.c.id))
+                ).scalar() or 0
+        seed_id_sequence(connection, max(legacy_max.get(TenantConversation.__tablename__, 0),
+                                         legacy_max.get(TenantMessage.__tablename__, 0)), shard_count)
+
+    created = {}
+    for index, key in enumerate(binds):
+        with db.engines[key].begin() as connection:
+            existing = set(inspect(connection).get_table_names())
+            created[key] = []
+            for model in SHARDED_MODELS:
+                table = model.__table__
+                if table.name in existing:
+                    continue
+                local_keys = [fk for fk in table.foreign_key_constraints if fk.referred_table.name in SHARDED_TABLES]
+                connection.execute(CreateTable(table, include_foreign_key_constraints=local_keys))
+                for table_index in table.indexes:
+                    table_index.create(connection)
+                created[key].append(table.name)
+
+            if connection.dialect.name == 'postgresql':
+                for name in INTERLEAVED_TABLES:
+                    if name not in created[key]:
+                        continue
+                    sequence = connection.execute(
+                        text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': name}
+                    ).scalar()
+                    if sequence:
+                        start = (legacy_max.get(name, 0) // shard_count + 1) * shard_count + index
+                        connection.execute(text(
+                            f"ALTER SEQUENCE {sequence} INCREMENT BY {shard_count} RESTART WITH {start}"
+                        ))
+    return created
+
+
+
+def seed_id_sequence(connection, legacy_max_id, shard_count):
+    """Start the id sequence so allocated ids land above every legacy conversation and message id"""
+    table = ConversationIdAllocation.__table__
+    table.create(connection, checkfirst=True)
+    seed = legacy_max_id // shard_count + 1
+    current = connection.execute(select(func.max(table.c.id))).scalar() or 0
+    if current >= seed - 1 or seed <= 1:
+        return
+    if connection.dialect.name == 'postgresql':
+        sequence = connection.execute(
+            text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': table.name}
+        ).scalar()
+        connection.execute(text("SELECT setval(CAST(:sequence AS regclass), :value)"),
+                           {'sequence': sequence, 'value': seed - 1})
+    else:
+        connection.execute(table.insert(), {'id': seed - 1})
+
+
+def migrate_legacy_conversations(batch_size=MIGRATION_BATCH_SIZE):
+    """Copy conversations still on the primary, with participants and messages, to shard id % N
+
+    Conversations already present on their shard are skipped, so an interrupted
+    run can be repeated. Rollups are not copied (run rebuild-rollups afterwards)
+    and the outbox should be drained first. The primary's copies are left in
+    place to be dropped once the shards are verified.
+    """
+    binds = shard_binds()
+    if not binds:
+        raise RuntimeError("MESSAGE_SHARD_BINDS is not configured")
+    conversations = TenantConversation.__table__
+    children = (ConversationParticipant.__table__, TenantMessage.__table__)
+    report = {'conversations': 0, 'participants': 0, 'messages': 0, 'skipped': 0}
+
+    with db.engines[None].connect() as source:
+        last_id = 0
+        while True:
+            rows = source.execute(
+                select(conversations).where(conversations.c.id > last_id).order_by(conversations.c.id).limit(batch_size)
+            ).mappings().all()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+
+            by_shard = {}
+            for row in rows:
+                by_shard.setdefault(shard_index(row['id'], len(binds)), []).append(dict(row))
+            for index, shard_rows in by_shard.items():
+                with db.engines[binds[index]].begin() as target:
+                    ids = [row['id'] for row in shard_rows]
+                    present = set(target.execute(
+                        select(conversations.c.id).where(conversations.c.id.in_(ids))
+                    ).scalars())
+                    missing = [row for row in shard_rows if row['id'] not in present]
+                    report['skipped'] += len(present)
+                    if not missing:
+                        continue
+                    target.execute(conversations.insert(), missing)
+                    report['conversations'] += len(missing)
+                    missing_ids = [row['id'] for row in missing]
+                    for table in children:
+                        result = source.execution_options(stream_results=True).execute(
+                            select(table).where(table.c.conversation_id.in_(missing_ids))
+                        ).mappings()
+                        for chunk in result.partitions(batch_size):
+                            target.execute(table.insert(), [dict(row) for row in chunk])
+                            report['participants' if table is children[0] else 'messages'] += len(chunk)
+    return report
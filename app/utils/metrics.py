@@ -0,0 +1,149 @@
+# app/utils/metrics.py - Prometheus metrics for the messaging API
+
+import hmac
+import os
+import time
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # prometheus_client is optional; metrics become no-ops without it
+    prometheus_client = None
+
+CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _NoopMetric:
+    """Stand-in used when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+def _metric(kind, name, documentation, labelnames=(), **kwargs):
+    """Create a metric, or a no-op when prometheus_client is missing"""
+    if prometheus_client is None:
+        return _NoopMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+
+
+REQUEST_SECONDS = _metric(
+    'Histogram', 'tenant_messaging_request_seconds', 'Messaging API request latency',
+    ('endpoint', 'method', 'status')
+)
+REQUESTS_IN_PROGRESS = _metric(
+    'Gauge', 'tenant_messaging_requests_in_progress', 'Messaging API requests being served',
+    multiprocess_mode='livesum'
+)
+DB_QUERIES = _metric('Counter', 'tenant_messaging_db_queries_total', 'SQL statements executed')
+DB_QUERY_SECONDS = _metric(
+    'Histogram', 'tenant_messaging_db_query_seconds', 'SQL statement latency',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+ATTACHMENT_BYTES = _metric(
+    'Counter', 'tenant_messaging_attachment_bytes_total', 'Attachment bytes uploaded and downloaded',
+    ('direction',)
+)
+# hit / (hit + stale + miss) per endpoint; endpoint="get_unread_count" is the unread-count cache hit ratio
+INBOX_CACHE_REQUESTS = _metric(
+    'Counter', 'tenant_messaging_inbox_cache_requests_total',
+    'Inbox and unread-count cache lookups by endpoint and result (hit, stale, miss)', ('endpoint', 'result')
+)
+DB_POOL_CHECKED_OUT = _metric(
+    'Gauge', 'tenant_messaging_db_pool_checked_out', 'Database connections in use',
+    multiprocess_mode='livesum'
+)
+DB_POOL_SIZE = _metric(
+    'Gauge', 'tenant_messaging_db_pool_size', 'Database connection pool size',
+    multiprocess_mode='livesum'
+)
+OUTBOX_EVENTS = _metric(
+    'Counter', 'tenant_messaging_outbox_events_total',
+    'Outbox events by result (processed, retried, dead_lettered, purged)', ('result',)
+)
+OUTBOX_BATCH_SECONDS = _metric(
+    'Histogram', 'tenant_messaging_outbox_batch_seconds', 'Time to claim and process one outbox batch'
+)
+
+_query_timing_installed = False
+
+
+def install_query_timing():
+    """Count and time every SQL statement via engine events (installed once per process)"""
+    from sqlalchemy import event  # Imported here so the static server can use this module without SQLAlchemy
+    from sqlalchemy.engine import Engine
+
+    global _query_timing_installed
+    if _query_timing_installed:
+        return
+    _query_timing_installed = True
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_times', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start_times = conn.info.get('query_start_times')
+        if start_times:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start_times.pop())
+        DB_QUERIES.inc()
+
+
+def observe_pool(engine):
+    """Record connection pool utilisation for this worker"""
+    pool = engine.pool
+    if hasattr(pool, 'checkedout'):
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        DB_POOL_SIZE.set(pool.size())
+
+
+def scrape_refusal(token, authorization):
+    """Status refusing a /metrics request: 404 without a configured token, 401 for a wrong one, else None"""
+    if not token:
+        return 404
+    if not hmac.compare_digest(authorization or '', f"Bearer {token}"):
+        return 401
+    return None
+
+
+def render_metrics():
+    """Exposition body and content type, aggregated across gunicorn workers when configured
+
+    Multiprocess mode needs PROMETHEUS_MULTIPROC_DIR set (and emptied) before the
+    workers start, and gunicorn's child_exit hook calling mark_worker_dead(worker.pid).
+    """
+    if prometheus_client is None:
+        return b'', CONTENT_TYPE_LATEST
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port, addr='127.0.0.1'):
+    """Serve this process's metrics on their own port (for workers that serve no HTTP)"""
+    if prometheus_client is None:
+        return False
+    prometheus_client.start_http_server(port, addr=addr)
+    return True
+
+
+def mark_worker_dead(pid):
+    """Drop a finished gunicorn worker's live gauges (call from the child_exit hook)"""
+    if prometheus_client is not None and os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
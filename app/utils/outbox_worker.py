@@ -0,0 +1,209 @@
+# app/utils/outbox_worker.py - Background worker draining the messaging outbox
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import threading
+import time
+
+from app import db
+from app.models.tenant_messaging import MessageOutboxEvent
+from app.utils import message_shards, metrics
+
+DEFAULT_RETENTION_DAYS = 7
+PURGE_BATCH_SIZE = 5000
+
+# Handlers per event type: callables taking the event payload dict. Nothing is
+# registered yet: notification, email and search-index consumers register here
+# as they are built; until then events are marked done and purged.
+outbox_handlers = {}
+
+
+def register_outbox_handler(event_type):
+    """Decorator registering a consumer for an outbox event type"""
+    def decorator(handler):
+        outbox_handlers.setdefault(event_type, []).append(handler)
+        return handler
+    return decorator
+
+
+class OutboxWorker:
+    """Claims due outbox events in batches and runs their handlers on a thread pool"""
+
+    def __init__(self, app, batch_size=100, max_workers=4, max_attempts=8,
+                 poll_interval=1.0, visibility_timeout=300,
+                 retention_days=DEFAULT_RETENTION_DAYS, purge_interval=3600):
+        self.app = app
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.visibility_timeout = timedelta(seconds=visibility_timeout)
+        self.retention = timedelta(days=retention_days)
+        self.purge_interval = purge_interval
+        self.stop_event = threading.Event()
+        self.metrics = {
+            'batches': 0,
+            'processed': 0,
+            'retried': 0,
+            'dead_lettered': 0,
+            'purged': 0,
+            'last_batch_seconds': 0.0,
+        }
+
+    def count(self, result, amount=1):
+        """Bump a local counter and its Prometheus counterpart"""
+        self.metrics[result] += amount
+        metrics.OUTBOX_EVENTS.labels(result).inc(amount)
+
+    def backoff(self, attempts):
+        """Delay before the next attempt: exponential, capped at one hour"""
+        return timedelta(seconds=min(3600, 2 ** attempts))
+
+    def release_stale_claims(self, now=None):
+        """Return events claimed longer than the visibility timeout to the queue; return the count
+
+        The claim counts as a failed attempt, so an event that kills its worker
+        is dead-lettered after max_attempts instead of being retried forever.
+        """
+        now = now or datetime.utcnow()
+        stale = MessageOutboxEvent.query.filter(
+            MessageOutboxEvent.status == 'processing',
+            MessageOutboxEvent.locked_at < now - self.visibility_timeout
+        )
+        changes = {
+            'attempts': MessageOutboxEvent.attempts + 1,
+            'last_error': 'Claim expired: the worker stopped before finishing the event',
+            'locked_at': None,
+        }
+        dead = stale.filter(MessageOutboxEvent.attempts + 1 >= self.max_attempts).update(
+            dict(changes, status='dead'), synchronize_session=False
+        )
+        retried = stale.update(dict(changes, status='pending', available_at=now), synchronize_session=False)
+        db.session.commit()
+        if dead:
+            self.count('dead_lettered', dead)
+            self.app.logger.error("Dead-lettered %s outbox events whose claims expired", dead)
+        if retried:
+            self.count('retried', retried)
+        return dead + retried
+
+    def claim_batch(self):
+        """Lock a batch of due events; SKIP LOCKED lets several workers run side by side"""
+        now = datetime.utcnow()
+        events = MessageOutboxEvent.query.filter(
+            MessageOutboxEvent.status == 'pending',
+            MessageOutboxEvent.available_at <= now
+        ).order_by(MessageOutboxEvent.id)\
+            .limit(self.batch_size)\
+            .with_for_update(skip_locked=True)\
+            .all()
+
+        # Read before the commit expires the instances, which would cost a SELECT each
+        batch = [(event.id, event.event_type, event.payload, event.attempts) for event in events]
+        for event in events:
+            event.status = 'processing'
+            event.locked_at = now
+        db.session.commit()
+        return batch
+
+    def run_handlers(self, event_type, payload):
+        """Run every handler for an event inside its own app context"""
+        with self.app.app_context():
+            for handler in outbox_handlers.get(event_type, []):
+                handler(payload)
+
+    def drain_once(self, executor):
+        """Process one batch; return the number of events claimed"""
+        started = time.perf_counter()
+        batch = self.claim_batch()
+        if not batch:
+            return 0
+
+        futures = {
+            event_id: (attempts, executor.submit(self.run_handlers, event_type, payload))
+            for event_id, event_type, payload, attempts in batch
+        }
+
+        now = datetime.utcnow()
+        done_ids = []
+        for event_id, (attempts, future) in futures.items():
+            error = future.exception()
+            if error is None:
+                done_ids.append(event_id)
+                continue
+
+            attempts += 1
+            changes = {'attempts': attempts, 'last_error': repr(error)[:2000], 'locked_at': None}
+            if attempts >= self.max_attempts:
+                changes['status'] = 'dead'
+                self.count('dead_lettered')
+                self.app.logger.error("Outbox event %s dead-lettered: %r", event_id, error, extra={'event_id': event_id})
+            else:
+                changes.update(status='pending', available_at=now + self.backoff(attempts))
+                self.count('retried')
+            MessageOutboxEvent.query.filter_by(id=event_id).update(changes, synchronize_session=False)
+        if done_ids:
+            MessageOutboxEvent.query.filter(MessageOutboxEvent.id.in_(done_ids)).update(
+                {'status': 'done', 'processed_at': now, 'locked_at': None}, synchronize_session=False
+            )
+            self.count('processed', len(done_ids))
+        db.session.commit()
+
+        elapsed = time.perf_counter() - started
+        self.metrics['batches'] += 1
+        self.metrics['last_batch_seconds'] = elapsed
+        metrics.OUTBOX_BATCH_SECONDS.observe(elapsed)
+        return len(batch)
+
+    def purge_processed(self, now=None):
+        """Delete done events older than the retention period in bounded batches; return the count"""
+        cutoff = (now or datetime.utcnow()) - self.retention
+        purged = 0
+        while True:
+            ids = [event_id for event_id, in db.session.query(MessageOutboxEvent.id).filter(
+                MessageOutboxEvent.status == 'done',
+                MessageOutboxEvent.processed_at < cutoff
+            ).limit(PURGE_BATCH_SIZE)]
+            if not ids:
+                break
+            MessageOutboxEvent.query.filter(MessageOutboxEvent.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            purged += len(ids)
+        if purged:
+            self.count('purged', purged)
+        return purged
+
+    def run(self):
+        """Drain the outbox until stop() is called
+
+        With sharded messages every shard has its own outbox table; each pass
+        releases expired claims and claims one batch per shard. Processed events
+        past the retention period are purged every purge_interval seconds.
+        """
+        with self.app.app_context(), ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            next_purge = time.monotonic()
+            while not self.stop_event.is_set():
+                if time.monotonic() >= next_purge:
+                    next_purge = time.monotonic() + self.purge_interval
+                    for shard in message_shards.each_shard():
+                        try:
+                            self.purge_processed()
+                        except Exception as e:
+                            db.session.rollback()
+                            self.app.logger.exception("Outbox purge error: %s", e, extra={'shard': shard})
+                claimed = 0
+                for shard in message_shards.each_shard():
+                    try:
+                        self.release_stale_claims()
+                        claimed = max(claimed, self.drain_once(executor))
+                    except Exception as e:
+                        db.session.rollback()
+                        self.app.logger.exception("Outbox worker error: %s", e, extra={'shard': shard})
+                db.session.remove()
+                # A full batch means more work is waiting; otherwise wait for new events
+                if claimed < self.batch_size:
+                    self.stop_event.wait(self.poll_interval)
+
+    def stop(self):
+        """Ask the worker loop to finish after the current batch"""
+        self.stop_event.set()
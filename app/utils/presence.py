@@ -0,0 +1,175 @@
+# app/utils/presence.py - Ephemeral online and typing state kept out of the database
+
+import json
+import threading
+import time
+
+from flask import current_app
+
+DEFAULT_PRESENCE_TTL = 60   # Seconds a heartbeat keeps a user online
+DEFAULT_TYPING_TTL = 8      # Seconds a typing indicator lasts without being refreshed
+
+
+class InMemoryPresenceStore:
+    """Per-process heartbeats and typing indicators
+
+    Expired typing entries are dropped when read, and every sweep_interval
+    seconds a write sweeps the whole store, so users and conversations nobody
+    touches again do not stay in memory.
+    """
+
+    def __init__(self, max_users=100000, sweep_interval=60):
+        self.max_users = max_users
+        self.sweep_interval = sweep_interval
+        self._online = {}   # user_id -> expires_at
+        self._typing = {}   # conversation_id -> {user_id: (user_name, expires_at)}
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._lock = threading.Lock()
+
+    def _sweep(self, now):
+        """Drop expired heartbeats and typing entries (caller holds the lock)"""
+        self._online = {key: expires for key, expires in self._online.items() if expires > now}
+        typing = {}
+        for conversation_id, entries in self._typing.items():
+            entries = {key: entry for key, entry in entries.items() if entry[1] > now}
+            if entries:
+                typing[conversation_id] = entries
+        self._typing = typing
+        self._next_sweep = now + self.sweep_interval
+
+    def heartbeat(self, user_id, ttl):
+        """Mark a user online for ttl seconds"""
+        now = time.monotonic()
+        with self._lock:
+            self._online[str(user_id)] = now + ttl
+            if len(self._online) > self.max_users or now >= self._next_sweep:
+                self._sweep(now)
+
+    def online(self, user_ids):
+        """Subset of user_ids with a live heartbeat"""
+        now = time.monotonic()
+        return {user_id for user_id in user_ids if self._online.get(str(user_id), 0) > now}
+
+    def set_typing(self, conversation_id, user_id, user_name, is_typing, ttl):
+        """Start (or refresh) or stop a user's typing indicator in a conversation"""
+        now = time.monotonic()
+        with self._lock:
+            typing = {key: entry for key, entry in self._typing.get(str(conversation_id), {}).items() if entry[1] > now}
+            if is_typing:
+                typing[str(user_id)] = (user_name, now + ttl)
+            else:
+                typing.pop(str(user_id), None)
+            if typing:
+                self._typing[str(conversation_id)] = typing
+            else:
+                self._typing.pop(str(conversation_id), None)
+            if now >= self._next_sweep:
+                self._sweep(now)
+
+    def typing(self, conversation_ids):
+        """{conversation_id: [{'user_id', 'user_name'}]} for conversations with someone typing"""
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for conversation_id in conversation_ids:
+                entries = self._typing.get(str(conversation_id))
+                if not entries:
+                    continue
+                active = {key: entry for key, entry in entries.items() if entry[1] > now}
+                if len(active) < len(entries):
+                    if active:
+                        self._typing[str(conversation_id)] = active
+                    else:
+                        del self._typing[str(conversation_id)]
+                if active:
+                    result[conversation_id] = [{'user_id': int(user_id), 'user_name': user_name}
+                                               for user_id, (user_name, _) in active.items()]
+        return result
+
+
+class RedisPresenceStore:
+    """Presence shared across workers: one expiring key per user, one sorted set per conversation"""
+
+    def __init__(self, client, prefix='presence:'):
+        self.client = client
+        self.prefix = prefix
+
+    def heartbeat(self, user_id, ttl):
+        """Mark a user online for ttl seconds"""
+        self.client.set(f"{self.prefix}user:{user_id}", 1, ex=ttl)
+
+    def online(self, user_ids):
+        """Subset of user_ids with a live heartbeat (one MGET)"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+        values = self.client.mget([f"{self.prefix}user:{user_id}" for user_id in user_ids])
+        return {user_id for user_id, value in zip(user_ids, values) if value is not None}
+
+    def set_typing(self, conversation_id, user_id, user_name, is_typing, ttl):
+        """Typing members are scored by expiry so stale ones can be trimmed by score"""
+        key = f"{self.prefix}typing:{conversation_id}"
+        member = json.dumps([user_id, user_name])
+        pipeline = self.client.pipeline()
+        if is_typing:
+            pipeline.zadd(key, {member: time.time() + ttl})
+            pipeline.expire(key, ttl)
+        else:
+            pipeline.zrem(key, member)
+        pipeline.execute()
+
+    def typing(self, conversation_ids):
+        """{conversation_id: [{'user_id', 'user_name'}]} for conversations with someone typing"""
+        conversation_ids = list(conversation_ids)
+        now = time.time()
+        pipeline = self.client.pipeline()
+        for conversation_id in conversation_ids:
+            pipeline.zrangebyscore(f"{self.prefix}typing:{conversation_id}", now, '+inf')
+        result = {}
+        for conversation_id, members in zip(conversation_ids, pipeline.execute()):
+            active = [dict(zip(('user_id', 'user_name'), json.loads(member))) for member in members]
+            if active:
+                result[conversation_id] = active
+        return result
+
+
+_default_store = InMemoryPresenceStore()
+
+
+def get_presence_store():
+    """Store configured on the app, falling back to the per-process store"""
+    return current_app.config.get('PRESENCE_STORE') or _default_store
+
+
+def heartbeat(user_id):
+    """Record that a user is active"""
+    get_presence_store().heartbeat(user_id, current_app.config.get('PRESENCE_TTL', DEFAULT_PRESENCE_TTL))
+
+
+def set_typing(conversation_id, user_id, user_name, is_typing):
+    """Record a typing indicator; a user who is typing is also online"""
+    store = get_presence_store()
+    store.set_typing(conversation_id, user_id, user_name, is_typing,
+                     current_app.config.get('TYPING_TTL', DEFAULT_TYPING_TTL))
+    store.heartbeat(user_id, current_app.config.get('PRESENCE_TTL', DEFAULT_PRESENCE_TTL))
+
+
+def conversation_presence(participants_by_conversation, current_user_id):
+    """{conversation_id: {'online': [...], 'typing': [...]}} for the other participants
+
+    participants_by_conversation maps conversation ids to participant user ids the
+    caller already has in memory, so no database access is needed.
+    """
+    store = get_presence_store()
+    others = {conversation_id: {user_id for user_id in user_ids if user_id and str(user_id) != str(current_user_id)}
+              for conversation_id, user_ids in participants_by_conversation.items()}
+    online = store.online(set().union(*others.values())) if others else set()
+    typing = store.typing(list(others))
+    return {
+        conversation_id: {
+            'online': sorted(user_id for user_id in user_ids if user_id in online),
+            'typing': [entry for entry in typing.get(conversation_id, [])
+                       if str(entry['user_id']) != str(current_user_id)]
+        }
+        for conversation_id, user_ids in others.items()
+    }
@@ -0,0 +1,171 @@
+# app/utils/rate_limiter.py - Token-bucket rate limiting for API endpoints
+
+from collections import OrderedDict
+from functools import wraps
+import math
+import threading
+import time
+
+from flask import request, current_app, make_response
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+from app.utils.response_utils import error_response
+
+# Default limits per endpoint class: (tokens per second, bucket capacity)
+DEFAULT_RATE_LIMITS = {
+    'send': (1.0, 10),       # Message sends and conversation creation
+    'upload': (0.2, 5),      # Attachment uploads
+    'poll': (0.5, 10),       # Inbox, message and unread-count polling
+    'presence': (5.0, 30),   # Typing indicators and presence lookups, sent at keystroke rate
+    'export': (0.02, 3),     # Streamed conversation exports
+}
+
+
+class InMemoryRateLimitBackend:
+    """Per-process token buckets keyed by user and endpoint class
+
+    Buckets are kept in least-recently-used order; past max_keys the least
+    recently used one is dropped, which only hands that caller a full bucket.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, capacity, cost=1):
+        """Take tokens from a bucket; return seconds to wait (0 when allowed)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                retry_after = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                retry_after = (cost - tokens) / rate
+            self._buckets.move_to_end(key)
+
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        return retry_after
+
+
+class RedisRateLimitBackend:
+    """Shared token buckets stored in Redis, for limits across several workers"""
+
+    # Refill and take tokens atomically on the Redis server
+    SCRIPT = """
+    local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or ARGV[2])
+    local updated_at = tonumber(redis.call('HGET', KEYS[1], 'updated_at') or ARGV[4])
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local now = tonumber(ARGV[4])
+    tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+    local retry_after = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+    else
+        retry_after = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(retry_after)
+    """
+
+    def __init__(self, client, prefix='ratelimit:'):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+
+    def consume(self, key, rate, capacity, cost=1):
+        """Take tokens from a shared bucket; return seconds to wait (0 when allowed)"""
+        result = self._script(keys=[self.prefix + key], args=[rate, capacity, cost, time.time()])
+        return float(result)
+
+
+class LatencyMonitor:
+    """Exponentially weighted moving average of observed database latency"""
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.average = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Record a latency sample in seconds"""
+        with self._lock:
+            if self.average is None:
+                self.average = seconds
+            else:
+                self.average = self.alpha * seconds + (1 - self.alpha) * self.average
+
+    def scale(self, idle_threshold, busy_threshold, max_boost=2.0, min_factor=0.25):
+        """Multiplier for rate limits: above 1 when the DB is idle, below 1 when it is slow"""
+        average = self.average
+        if average is None:
+            return 1.0
+        if average <= idle_threshold:
+            return max_boost
+        if average >= busy_threshold:
+            return max(min_factor, busy_threshold / average * 0.5)
+        return 1.0
+
+
+_default_backend = InMemoryRateLimitBackend()
+db_latency = LatencyMonitor()
+
+
+def get_rate_limit_backend():
+    """Backend configured on the app, falling back to the per-process store"""
+    return current_app.config.get('RATE_LIMIT_BACKEND') or _default_backend
+
+
+def get_rate_limit(endpoint_class):
+    """Resolve (rate, capacity) for an endpoint class from app config"""
+    limits = current_app.config.get('RATE_LIMITS', {})
+    return limits.get(endpoint_class, DEFAULT_RATE_LIMITS[endpoint_class])
+
+
+def _client_key():
+    """Identify the caller by JWT identity, or by remote address when anonymous"""
+    try:
+        verify_jwt_in_request(optional=True)
+        user_id = get_jwt_identity()
+    except Exception:
+        user_id = None
+    if user_id is not None:
+        return f"user:{user_id}"
+    return f"ip:{request.remote_addr}"
+
+
+def rate_limit(endpoint_class, adaptive=False):
+    """Decorator that rejects requests over the user's token bucket with 429"""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method == 'OPTIONS' or not current_app.config.get('RATE_LIMIT_ENABLED', True):
+                return view(*args, **kwargs)
+
+            rate, capacity = get_rate_limit(endpoint_class)
+            if adaptive:
+                factor = db_latency.scale(
+                    current_app.config.get('RATE_LIMIT_IDLE_LATENCY', 0.02),
+                    current_app.config.get('RATE_LIMIT_BUSY_LATENCY', 0.25)
+                )
+                rate, capacity = rate * factor, max(1, int(capacity * factor))
+
+            key = f"{_client_key()}:{endpoint_class}"
+            retry_after = get_rate_limit_backend().consume(key, rate, capacity)
+            if retry_after > 0:
+                response = make_response(error_response("Too many requests", status_code=429))
+                response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                return response
+
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
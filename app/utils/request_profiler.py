@@ -0,0 +1,184 @@
+# app/utils/request_profiler.py - Opt-in sampling profiler for slow requests (speedscope output)
+
+from datetime import datetime
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+PROFILE_SUFFIX = '.speedscope.json'
+
+
+class RequestProfiler:
+    """Samples the stacks of requests that run longer than a threshold
+
+    Fast requests only pay for registering and unregistering their thread; the
+    sampler thread sleeps until the earliest request could cross the threshold.
+    """
+
+    def __init__(self, output_dir, threshold=0.5, sample_every=0, interval=0.005, max_profiles=200, max_depth=128):
+        self.output_dir = output_dir
+        self.threshold = threshold
+        self.sample_every = sample_every  # Also profile 1 in N requests regardless of latency; 0 disables
+        self.interval = interval
+        self.max_profiles = max_profiles
+        self.max_depth = max_depth
+        self._active = {}
+        self._counter = itertools.count(1)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    def start_request(self):
+        """Register the current thread's request for possible sampling"""
+        always = bool(self.sample_every) and next(self._counter) % self.sample_every == 0
+        record = {'started': time.monotonic(), 'always': always, 'samples': []}
+        with self._lock:
+            # The sampler only needs waking from its idle wait, or to start sampling an
+            # always-profiled request now; any other request cannot be due before those
+            # it is already waiting on
+            wake = always or not self._active
+            self._active[threading.get_ident()] = record
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._sampler.start()
+        if wake:
+            self._wakeup.set()
+
+    def finish_request(self, name):
+        """Unregister the request; write a profile if it was slow or sampled"""
+        with self._lock:
+            record = self._active.pop(threading.get_ident(), None)
+        if not record:
+            return None
+        duration = time.monotonic() - record['started']
+        if record['samples'] and (record['always'] or duration >= self.threshold):
+            return self.write_profile(name, duration, record['samples'])
+        return None
+
+    def _run(self):
+        """Sampler loop: capture stacks of requests that are past the threshold"""
+        while True:
+            with self._lock:
+                active = list(self._active.items())
+            if not active:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            now = time.monotonic()
+            due = [(thread_id, record) for thread_id, record in active
+                   if record['always'] or now - record['started'] >= self.threshold]
+            if not due:
+                # Sleep until the oldest request would become slow (or a new one arrives)
+                next_due = min(record['started'] for _, record in active) + self.threshold
+                self._wakeup.wait(max(self.interval, next_due - now))
+                self._wakeup.clear()
+                continue
+
+            frames = sys._current_frames()
+            for thread_id, record in due:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    record['samples'].append((now - record['started'], self._stack(frame)))
+            time.sleep(self.interval)
+
+    def _stack(self, frame):
+        """Stack as a root-first tuple of (function, file, line)"""
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, frame.f_lineno))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def write_profile(self, name, duration, samples):
+        """Write samples in speedscope's sampled-profile format; return the file name
+
+        samples are (seconds since the request started, stack) pairs. The timeline
+        runs from the first sample to the end of the request, and each sample
+        weighs the time until the next one, so the weights add up to that span.
+        """
+        offsets = [offset for offset, _ in samples] + [max(duration, samples[-1][0])]
+        weights = [later - earlier for earlier, later in zip(offsets, offsets[1:])]
+        frame_index = {}
+        frames = []
+        indexed_samples = []
+        for _, stack in samples:
+            indexes = []
+            for entry in stack:
+                if entry not in frame_index:
+                    frame_index[entry] = len(frames)
+                    frames.append({'name': entry[0], 'file': entry[1], 'line': entry[2]})
+                indexes.append(frame_index[entry])
+            indexed_samples.append(indexes)
+
+        profile_name = f"{name} ({duration * 1000:.0f} ms)"
+        document = {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': profile_name,
+            'exporter': 'app.utils.request_profiler',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': profile_name,
+                'unit': 'seconds',
+                'startValue': offsets[0],
+                'endValue': offsets[-1],
+                'samples': indexed_samples,
+                'weights': weights
+            }]
+        }
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)[:60]
+        file_name = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}_{safe_name}{PROFILE_SUFFIX}"
+        with open(os.path.join(self.output_dir, file_name), 'w') as f:
+            json.dump(document, f)
+        self._prune()
+        return file_name
+
+    def _prune(self):
+        """Keep only the newest max_profiles files"""
+        profiles = self.list_profiles()
+        for profile in profiles[self.max_profiles:]:
+            try:
+                os.remove(os.path.join(self.output_dir, profile['name']))
+            except FileNotFoundError:
+                pass
+
+    def list_profiles(self):
+        """Stored profiles, newest first"""
+        try:
+            entries = [entry for entry in os.scandir(self.output_dir) if entry.name.endswith(PROFILE_SUFFIX)]
+        except FileNotFoundError:
+            return []
+        profiles = [{
+            'name': entry.name,
+            'size': entry.stat().st_size,
+            'created_at': datetime.utcfromtimestamp(entry.stat().st_mtime).isoformat()
+        } for entry in entries]
+        return sorted(profiles, key=lambda profile: profile['name'], reverse=True)
+
+    def profile_path(self, name):
+        """Path of a stored profile, or None for unknown or unsafe names"""
+        if os.sep in name or not name.endswith(PROFILE_SUFFIX):
+            return None
+        path = os.path.join(self.output_dir, name)
+        return path if os.path.isfile(path) else None
+
+
+def create_request_profiler(app):
+    """Profiler configured from PROFILER_* settings, or None when profiling is off"""
+    if not app.config.get('PROFILER_ENABLED', False):
+        return None
+    return RequestProfiler(
+        app.config.get('PROFILER_OUTPUT_DIR', os.path.join(app.instance_path, 'profiles')),
+        threshold=app.config.get('PROFILER_THRESHOLD', 0.5),
+        sample_every=app.config.get('PROFILER_SAMPLE_EVERY', 0),
+        interval=app.config.get('PROFILER_INTERVAL', 0.005),
+        max_profiles=app.config.get('PROFILER_MAX_PROFILES', 200)
+    )
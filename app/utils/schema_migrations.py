@@ -0,0 +1,147 @@
+# app/utils/schema_migrations.py - Ordered, idempotent schema changes and backfills for the messaging tables
+
+from flask import current_app
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.tenant_messaging import (
+    TenantConversation, ConversationParticipant, MessagingRollup, MessageOutboxEvent,
+    ConversationImport, ConversationImportProgress, MessagingSchemaMigration
+)
+from app.utils import message_shards
+
+ADVISORY_LOCK_KEY = 720431  # pg_try_advisory_lock key held while migrating, so one process migrates at a time
+
+# (name, function, is_backfill) in the order they must run
+MIGRATIONS = []
+
+
+def migration(name, backfill=False):
+    """Register a migration step; steps are re-runnable and run once per message shard"""
+    def decorator(step):
+        MIGRATIONS.append((name, step, backfill))
+        return step
+    return decorator
+
+
+def create_table(model):
+    """CREATE TABLE IF NOT EXISTS inside the session transaction, on the shard db.session is pinned to"""
+    model.__table__.create(db.session.connection(bind_arguments={'mapper': model}), checkfirst=True)
+
+
+def add_column(model, name):
+    """ALTER TABLE ... ADD COLUMN for a nullable model column the table does not have yet"""
+    connection = db.session.connection(bind_arguments={'mapper': model})
+    table = model.__table__
+    if name in {column['name'] for column in inspect(connection).get_columns(table.name)}:
+        return
+    column_type = table.c[name].type.compile(dialect=connection.dialect)
+    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {name} {column_type}'))
+
+
+@migration('0001_conversation_participants')
+def create_participants_table():
+    create_table(ConversationParticipant)
+
+
+@migration(ConversationParticipant.BACKFILL_MIGRATION, backfill=True)
+def backfill_participants():
+    ConversationParticipant.backfill()
+
+
+@migration('0003_read_watermarks')
+def add_read_watermarks():
+    add_column(TenantConversation, 'last_read_message_id_tenant')
+    add_column(TenantConversation, 'last_read_message_id_agent')
+
+
+@migration('0004_backfill_read_watermarks', backfill=True)
+def backfill_read_watermarks():
+    TenantConversation.backfill_read_watermarks()
+
+
+@migration('0005_messaging_rollups')
+def create_rollups():
+    add_column(TenantConversation, 'first_response_at')
+    create_table(MessagingRollup)
+
+
+@migration('0006_rebuild_messaging_rollups', backfill=True)
+def rebuild_rollups():
+    MessagingRollup.rebuild()
+
+
+@migration('0007_message_outbox')
+def create_outbox_table():
+    create_table(MessageOutboxEvent)
+
+
+@migration('0008_conversation_imports')
+def create_import_tables():
+    create_table(ConversationImport)
+    create_table(ConversationImportProgress)
+
+
+def messaging_tables_exist():
+    """Whether the database db.session is pinned to has the messaging tables (new shards get them complete)"""
+    connection = db.session.connection(bind_arguments={'mapper': TenantConversation})
+    return inspect(connection).has_table(TenantConversation.__tablename__)
+
+
+def applied_migrations():
+    """Names of the migrations recorded on the primary database"""
+    return {name for name, in db.session.query(MessagingSchemaMigration.name)}
+
+
+def pending_migrations(include_backfills=True):
+    """Registered steps not yet applied, in order"""
+    applied = applied_migrations()
+    return [(name, step) for name, step, backfill in MIGRATIONS
+            if name not in applied and (include_backfills or not backfill)]
+
+
+def apply_migrations(include_backfills=True):
+    """Run pending steps and record each one; return the names applied
+
+    Nothing runs before the base messaging tables exist (a fresh database gets
+    the current schema from create_all; the steps then only record themselves),
+    and shards still waiting for create-message-shards are skipped since they
+    are created with the current schema.
+    On PostgreSQL an advisory lock keeps concurrent runs from migrating twice;
+    a process that does not get it skips, and reads fall back to the legacy
+    columns until the migrating process finishes. Elsewhere the steps are
+    idempotent and a step another process recorded first is treated as applied.
+    """
+    if not inspect(db.engine).has_table(TenantConversation.__tablename__):
+        return []
+
+    with db.engine.connect() as lock_connection:
+        locking = lock_connection.dialect.name == 'postgresql'
+        if locking and not lock_connection.execute(
+                text('SELECT pg_try_advisory_lock(:key)'), {'key': ADVISORY_LOCK_KEY}).scalar():
+            return []
+        try:
+            create_table(MessagingSchemaMigration)
+            db.session.commit()
+            done = []
+            for name, step in pending_migrations(include_backfills):
+                for _ in message_shards.each_shard():
+                    if messaging_tables_exist():
+                        step()
+                    db.session.commit()
+                db.session.add(MessagingSchemaMigration(name=name))
+                try:
+                    db.session.commit()
+                except IntegrityError:
+                    db.session.rollback()  # Recorded by a concurrent run
+                current_app.extensions.setdefault('messaging_migrations', set()).add(name)
+                done.append(name)
+            return done
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            if locking:
+                lock_connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': ADVISORY_LOCK_KEY})
+                lock_connection.commit()
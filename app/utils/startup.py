@@ -0,0 +1,91 @@
+# app/utils/startup.py - Worker boot: lazy views, fork safety and import-time measurement
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from werkzeug.utils import cached_property, import_string
+
+DEFAULT_MODULE = 'app.routes.tenant_messaging'
+
+
+class LazyView:
+    """View imported on its first request, for routes most workers never serve"""
+
+    def __init__(self, import_name):
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+
+def register_fork_handlers(app, db):
+    """Reset per-process resources in workers forked from a preloaded app (gunicorn --preload)
+
+    Pooled connections opened by the master must not be shared with children, and
+    the log listener thread does not survive fork, so each child drops the pool
+    (leaving the parent's sockets open) and starts its own listener.
+    """
+    if app.extensions.get('fork_handlers') or not hasattr(os, 'register_at_fork'):
+        return
+
+    def after_fork_in_child():
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+        from app.utils.structured_logging import restart_log_listener
+        restart_log_listener(app)
+
+    os.register_at_fork(after_in_child=after_fork_in_child)
+    app.extensions['fork_handlers'] = True
+
+
+def profile_imports(module=DEFAULT_MODULE, top=25):
+    """Import module in a fresh interpreter under -X importtime
+
+    Returns (total_us, rows) with rows of (self_us, cumulative_us, name) sorted by
+    cumulative time, so the costliest subtrees come first.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, cwd=os.getcwd())
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    total = max((cumulative for _, cumulative, _ in rows), default=0)
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return total, rows[:top]
+
+
+def measure_startup(module=DEFAULT_MODULE, runs=5):
+    """Wall-clock seconds to import module in fresh interpreters, one sample per run"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', f'import {module}'], capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+        if result.returncode:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+        samples.append(elapsed)
+    return samples
+
+
+def startup_regressed(samples, budget_seconds, baseline_seconds=None, tolerance=0.2):
+    """Reason the median boot time is over budget or over baseline by more than tolerance, else None"""
+    median = statistics.median(samples)
+    if median > budget_seconds:
+        return f"median {median:.3f}s exceeds budget {budget_seconds:.3f}s"
+    if baseline_seconds and median > baseline_seconds * (1 + tolerance):
+        return f"median {median:.3f}s is more than {tolerance:.0%} over baseline {baseline_seconds:.3f}s"
+    return None
@@ -0,0 +1,131 @@
+# app/utils/structured_logging.py - JSON-lines logging with correlation IDs and a background writer
+
+from datetime import datetime, timezone
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import uuid
+
+from flask import g, has_request_context, request
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# LogRecord attributes that are not user-supplied fields
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+def current_request_id():
+    """Correlation ID of the request being served, or None outside a request"""
+    if has_request_context():
+        return g.get('request_id')
+    return None
+
+
+def assign_request_id():
+    """Reuse a well-formed incoming X-Request-ID or generate one"""
+    incoming = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = incoming if REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+    return g.request_id
+
+
+def debug_fields(logger, build):
+    """extra= dict from build() only when the logger emits DEBUG; skips the work otherwise"""
+    return build() if logger.isEnabledFor(logging.DEBUG) else {}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, request_id and extra fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and key != 'request_id' and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread; only request-bound state is captured here
+
+    The stock QueueHandler formats the whole record on the calling thread. This one
+    resolves the %-style message and the request ID (both need the caller's
+    context) and leaves JSON encoding and I/O to the listener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.request_id = current_request_id()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _stop_listener(listener):
+    """Stop a listener at exit unless it was stopped already (stop() is not idempotent before Python 3.12)"""
+    if listener._thread is not None:
+        listener.stop()
+
+
+def configure_logging(app):
+    """Route app.logger through a queue to a JSON (or plain) stream handler
+
+    LOG_FORMAT chooses 'json' (default) or 'text'; LOG_LEVEL sets the logger level.
+    The listener is started once per app and stopped at interpreter exit.
+    """
+    if app.extensions.get('log_listener'):
+        return app.extensions['log_listener']
+
+    stream = logging.StreamHandler()
+    if app.config.get('LOG_FORMAT', 'json') == 'json':
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop_listener, listener)
+
+    app.logger.handlers[:] = [RequestQueueHandler(log_queue)]
+    app.logger.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    app.logger.propagate = False
+    app.extensions['log_listener'] = listener
+    return listener
+
+
+def restart_log_listener(app):
+    """Give a forked worker its own queue and listener thread (threads do not survive fork)"""
+    listener = app.extensions.get('log_listener')
+    if not listener:
+        return None
+
+    log_queue = queue.SimpleQueue()
+    restarted = logging.handlers.QueueListener(log_queue, *listener.handlers, respect_handler_level=True)
+    restarted.start()
+    atexit.register(_stop_listener, restarted)
+
+    for handler in app.logger.handlers:
+        if isinstance(handler, RequestQueueHandler):
+            handler.queue = log_queue
+    app.extensions['log_listener'] = restarted
+    return restarted
@@ -1,13 +1,55 @@
-from flask import Flask, send_from_directory, send_file
+from flask import Flask, send_from_directory, send_file, request, g, abort
+from werkzeug.security import safe_join
 import os
+import time
+
+try:
+    from app.utils import metrics
+except ImportError:  # Metrics are optional for the static server (needs the app package alongside it)
+    metrics = None
 
 # When deployed, server.py is inside the build folder, so '.' is the static folder
 app = Flask(__name__, static_folder='.')
 
+if metrics and metrics.prometheus_client:
+    REQUEST_SECONDS = metrics.prometheus_client.Histogram(
+        'static_request_seconds', 'Static file request latency', ['kind', 'status']
+    )
+    RESPONSE_BYTES = metrics.prometheus_client.Counter(
+        'static_response_bytes_total', 'Bytes served by the static server', ['kind']
+    )
+
+    @app.before_request
+    def start_timer():
+        g.started = time.perf_counter()
+
+    @app.after_request
+    def record_metrics(response):
+        if request.path != '/metrics':
+            # Unknown paths fall back to index.html, so only files that exist count as assets
+            kind = 'asset' if request.endpoint == 'serve' and static_file(request.view_args.get('path')) else 'index'
+            REQUEST_SECONDS.labels(kind, response.status_code).observe(time.perf_counter() - g.started)
+            RESPONSE_BYTES.labels(kind).inc(response.content_length or 0)
+        return response
+
+    @app.route('/metrics')
+    def serve_metrics():
+        # Only served to scrapers presenting METRICS_TOKEN; without it the endpoint does not exist
+        refusal = metrics.scrape_refusal(os.environ.get('METRICS_TOKEN'), request.headers.get('Authorization'))
+        if refusal:
+            abort(refusal)
+        body, content_type = metrics.render_metrics()
+        return body, 200, {'Content-Type': content_type}
+
+def static_file(path):
+    """Path of an existing file under the static folder, or None"""
+    full_path = safe_join(app.static_folder, path) if path else None
+    return full_path if full_path and os.path.isfile(full_path) else None
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
-    if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
+    if static_file(path):
         return send_from_directory(app.static_folder, path)
     else:
         return send_file(os.path.join(app.static_folder, 'index.html'))
@@ -0,0 +1,178 @@
+# tests/conftest.py - Flask app, database and JWT fixtures for the tenant messaging tests
+
+import io
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from app import db
+from app.models.user_models import User
+from app.models.property_models import Property
+from app.models.tenant_verification import TenantProfile
+from app.routes.tenant_messaging import tenant_messaging_bp
+from app.utils import schema_migrations
+from app.utils.inbox_cache import InMemoryInboxCache
+
+API = '/api/tenant-messaging'
+
+# id -> (role, first name); property 1 is managed by agent 2 and owned by owner 3
+USERS = {1: ('tenant', 'Tess'), 2: ('agent', 'Alex'), 3: ('owner', 'Olive'), 4: ('admin', 'Ada'),
+         5: ('tenant', 'Theo'), 6: ('tenant', 'Tara')}
+
+
+def build_app(tmp_path, **config):
+    """App with only the messaging blueprint, on a SQLite file under tmp_path"""
+    app = Flask(__name__, root_path=str(tmp_path))
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.sqlite'}",
+        SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 30}},
+        JWT_SECRET_KEY='test-secret-key-that-is-long-enough-for-hs256',
+        JWT_VERIFY_SUB=False,
+        TESTING=True,
+        RATE_LIMIT_ENABLED=False,
+        STRUCTURED_LOGGING_ENABLED=False,
+        INBOX_CACHE=InMemoryInboxCache(),  # The module default would leak between tests
+    )
+    app.config.update(config)
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(tenant_messaging_bp, url_prefix=API)
+    return app
+
+
+def seed(app, migrate=True):
+    """Create every table and the users, property and tenancies of USERS, then record the migrations"""
+    with app.app_context():
+        # Default bind only: shards get their tables from create-message-shards, and the bind
+        # keys a sharded app registered stay on the shared db for apps built after it
+        db.create_all(bind_key=None)
+        if migrate:
+            schema_migrations.apply_migrations()
+        for user_id, (role, first_name) in USERS.items():
+            db.session.add(User(id=user_id, email=f'{first_name.lower()}@example.com',
+                                first_name=first_name, last_name='Test', role=role))
+        db.session.add(Property(id=1, title='Flat 1', address='1 High Street', city='Town', postcode='AB1 2CD',
+                                agent_id=2, owner_id=3))
+        for user_id, (role, _) in USERS.items():
+            if role == 'tenant':
+                db.session.add(TenantProfile(user_id=user_id, property_id=1, is_active=True))
+        db.session.commit()
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = build_app(tmp_path)
+    seed(app)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class FakeRedis:
+    """The Redis commands the shared stores use, without expiry"""
+
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return False
+        self.values[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, b'0')) + 1).encode()
+        return int(self.values[key])
+
+    def expire(self, key, seconds):
+        return key in self.values
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+def bearer(app, user_id):
+    """Authorization header for a user of app"""
+    with app.app_context():
+        return {'Authorization': f'Bearer {create_access_token(identity=user_id)}'}
+
+
+@pytest.fixture
+def auth(app):
+    """auth(user_id) -> Authorization header for that user"""
+    return lambda user_id: bearer(app, user_id)
+
+
+def start_conversation(client, headers, subject='Boiler', text='It is broken'):
+    """Create a conversation as a tenant; return its id"""
+    response = client.post(f'{API}/conversations', json={'subject': subject, 'message_text': text}, headers=headers)
+    assert response.status_code == 200, response.json
+    return response.json['data']['conversation']['id']
+
+
+class FakeS3Error(Exception):
+    """botocore ClientError as raised by a MinIO-style store"""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}}
+
+
+class FakeS3:
+    """The S3 client calls the attachment storage makes, against an in-memory bucket"""
+
+    class exceptions:
+        ClientError = FakeS3Error
+
+    def __init__(self):
+        self.objects = {}   # (bucket, key) -> (bytes, content type, modified datetime)
+        self.presigned = []
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None):
+        self.objects[bucket, key] = (fileobj.read(), (ExtraArgs or {}).get('ContentType'), datetime.utcnow())
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise FakeS3Error('404')
+        return {'ContentLength': len(self.objects[Bucket, Key][0])}
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[Bucket, Key][0])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def copy_object(self, Bucket, Key, CopySource):
+        self.objects[Bucket, Key] = self.objects[CopySource['Bucket'], CopySource['Key']]
+
+    def get_paginator(self, operation):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix='', StartAfter=''):
+                keys = sorted(key for bucket, key in client.objects
+                              if bucket == Bucket and key.startswith(Prefix) and key > StartAfter)
+                for start in range(0, len(keys), 2):  # Small pages, so listings span several
+                    yield {'Contents': [{'Key': key, 'Size': len(client.objects[Bucket, key][0]),
+                                         'LastModified': client.objects[Bucket, key][2]}
+                                        for key in keys[start:start + 2]]}
+        return Paginator()
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://minio.test/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+    def generate_presigned_post(self, Bucket, Key, Fields, Conditions, ExpiresIn):
+        self.presigned.append({'key': Key, 'conditions': Conditions, 'expires_in': ExpiresIn})
+        return {'url': f'https://minio.test/{Bucket}', 'fields': dict(Fields, key=Key)}
@@ -0,0 +1,80 @@
+# tests/test_attachment_gc.py - Orphaned attachment collection: grace period, quarantine and cursor resume
+
+import os
+import time
+
+from app import db
+from app.models.tenant_messaging import TenantMessage
+from app.utils.attachment_gc import collect_orphaned_attachments, load_cursor
+from app.utils.attachment_storage import LocalAttachmentStorage
+
+from conftest import start_conversation
+
+DAY = 24 * 60 * 60
+
+
+def put(storage, key, age=2 * DAY):
+    """Write an object and backdate it by age seconds"""
+    path = storage.path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(key.encode())
+    modified = time.time() - age
+    os.utime(path, (modified, modified))
+
+
+def stored_keys(storage):
+    return [key for key, _, _ in storage.iter_objects()]
+
+
+def test_gc_quarantines_old_orphans_and_resumes_from_its_cursor(app, client, auth, tmp_path):
+    conversation_id = start_conversation(client, auth(1))
+    storage = LocalAttachmentStorage(str(tmp_path / 'attachments'))
+    state_file = str(tmp_path / 'gc_state.json')
+    kept = f'{conversation_id}/attachment_kept.pdf'
+    with app.app_context():
+        db.session.add(TenantMessage(conversation_id=conversation_id, sender_id=1, sender_name='Tess Test',
+                                     sender_type='tenant', message_text='Lease', attachment_url=kept))
+        db.session.commit()
+
+    put(storage, kept)
+    put(storage, f'{conversation_id}/attachment_orphan.pdf')
+    put(storage, f'{conversation_id}/attachment_fresh.pdf', age=60)  # Message may not be committed yet
+    put(storage, 'pending/5/attachment_abandoned.pdf')
+
+    with app.app_context():
+        first = collect_orphaned_attachments(storage, state_file, grace_period=DAY, max_objects=2, batch_size=1)
+        assert (first['scanned'], first['complete']) == (2, False)
+        assert load_cursor(state_file) == first['cursor'] == f'{conversation_id}/attachment_kept.pdf'
+
+        second = collect_orphaned_attachments(storage, state_file, grace_period=DAY, batch_size=1)
+        assert (second['scanned'], second['complete']) == (2, True)
+        assert load_cursor(state_file) is None
+
+    assert first['orphaned'] + second['orphaned'] == 2
+    assert stored_keys(storage) == [
+        f'{conversation_id}/attachment_fresh.pdf',
+        kept,
+        f'quarantine/{conversation_id}/attachment_orphan.pdf',
+        'quarantine/pending/5/attachment_abandoned.pdf',
+    ]
+
+    # A new pass skips what is already quarantined
+    with app.app_context():
+        third = collect_orphaned_attachments(storage, state_file, grace_period=DAY)
+    assert (third['scanned'], third['orphaned'], third['complete']) == (2, 0, True)
+
+
+def test_gc_dry_run_and_delete(app, tmp_path):
+    storage = LocalAttachmentStorage(str(tmp_path / 'attachments'))
+    state_file = str(tmp_path / 'gc_state.json')
+    put(storage, '99/attachment_orphan.pdf')
+
+    with app.app_context():
+        report = collect_orphaned_attachments(storage, state_file, grace_period=DAY, dry_run=True)
+        assert report['orphaned'] == 1 and report['reclaimed_bytes'] == len(b'99/attachment_orphan.pdf')
+        assert stored_keys(storage) == ['99/attachment_orphan.pdf']
+        assert not os.path.exists(state_file)
+
+        collect_orphaned_attachments(storage, state_file, grace_period=DAY, quarantine=False)
+    assert stored_keys(storage) == []
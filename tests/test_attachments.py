@@ -0,0 +1,115 @@
+# tests/test_attachments.py - S3-compatible attachment storage, presigned uploads and their confirmation
+
+import io
+
+import pytest
+
+from app.utils.attachment_storage import S3AttachmentStorage
+
+from conftest import API, FakeS3, start_conversation
+
+BUCKET = 'attachments'
+
+
+@pytest.fixture
+def s3(app):
+    """FakeS3 client behind the app's attachment storage"""
+    client = FakeS3()
+    app.extensions['attachment_storage'] = S3AttachmentStorage(BUCKET, client=client)
+    return client
+
+
+def presign(client, headers, **fields):
+    body = dict({'file_name': 'lease.pdf', 'content_type': 'application/pdf', 'file_size': 1024}, **fields)
+    return client.post(f'{API}/attachments/presign', json=body, headers=headers)
+
+
+def upload(s3, key, data=b'%PDF-1.4 lease'):
+    """What the browser's POST to the presigned URL leaves in the bucket"""
+    s3.upload_fileobj(io.BytesIO(data), BUCKET, 'message_attachments/' + key)
+
+
+def send(client, headers, conversation_id, key):
+    return client.post(f'{API}/send', headers=headers, json={
+        'conversation_id': conversation_id, 'message_text': 'See attached', 'attachment_key': key,
+        'attachment_name': 'Lease.pdf',
+    })
+
+
+def test_storage_round_trip(s3):
+    storage = S3AttachmentStorage(BUCKET, client=s3)
+    for key in ('1/a.pdf', '1/b.pdf', '2/c.pdf'):
+        storage.save(io.BytesIO(key.encode()), key, 'application/pdf')
+
+    assert storage.size('1/a.pdf') == len(b'1/a.pdf')
+    assert storage.size('1/missing.pdf') is None
+    assert storage.open('1/b.pdf').read() == b'1/b.pdf'
+    assert [key for key, _, _ in storage.iter_objects()] == ['1/a.pdf', '1/b.pdf', '2/c.pdf']
+    assert [key for key, _, _ in storage.iter_objects(start_after='1/a.pdf')] == ['1/b.pdf', '2/c.pdf']
+
+    storage.move('2/c.pdf', 'quarantine/2/c.pdf')
+    storage.delete('1/a.pdf')
+    assert [key for key, _, _ in storage.iter_objects()] == ['1/b.pdf', 'quarantine/2/c.pdf']
+    with pytest.raises(ValueError):
+        storage.object_key('../secrets')
+
+
+def test_download_redirects_to_a_presigned_url(app, client, auth, s3):
+    upload(s3, '1/attachment_report.pdf')
+    response = client.get(f'{API}/download/1/attachment_report.pdf', headers=auth(1))
+    assert response.status_code == 302
+    assert response.headers['Location'].startswith(f'https://minio.test/{BUCKET}/message_attachments/1/')
+
+
+def test_presign_scopes_keys_to_the_conversation_or_the_user(app, client, auth, s3):
+    conversation_id = start_conversation(client, auth(1))
+
+    data = presign(client, auth(1), conversation_id=conversation_id).json['data']
+    assert data['attachment_key'].startswith(f'{conversation_id}/attachment_')
+    assert data['upload']['fields']['key'] == 'message_attachments/' + data['attachment_key']
+    assert ['content-length-range', 1, 10 * 1024 * 1024] in s3.presigned[-1]['conditions']
+
+    assert presign(client, auth(5)).json['data']['attachment_key'].startswith('pending/5/')
+    assert presign(client, auth(5), conversation_id=conversation_id).status_code == 403
+    assert presign(client, auth(1), file_name='run.exe').status_code == 400
+    assert presign(client, auth(1), file_size=11 * 1024 * 1024).status_code == 400
+
+
+def test_presign_needs_an_object_store(client, auth):
+    assert presign(client, auth(1)).status_code == 400
+
+
+def test_send_confirms_an_uploaded_key(app, client, auth, s3):
+    conversation_id = start_conversation(client, auth(1))
+    key = presign(client, auth(1), conversation_id=conversation_id).json['data']['attachment_key']
+
+    assert send(client, auth(1), conversation_id, key).status_code == 400  # Not uploaded yet
+    upload(s3, key)
+    response = send(client, auth(1), conversation_id, key)
+    assert response.status_code == 200, response.json
+    message = response.json['data']['message']
+    assert message['attachment_url'] == key
+    assert message['attachment_name'] == 'Lease.pdf'
+    assert message['attachment_size'] == len(b'%PDF-1.4 lease')
+
+
+def test_send_rejects_keys_of_other_conversations_and_users(app, client, auth, s3):
+    mine = start_conversation(client, auth(1))
+    theirs = start_conversation(client, auth(5), subject='Window')
+    others = [
+        f'{theirs}/attachment_{"a" * 32}.pdf',      # Another conversation
+        f'pending/5/attachment_{"b" * 32}.pdf',     # Another user's pending upload
+        f'{mine}/../{theirs}/attachment_{"c" * 32}.pdf',
+        f'{mine}/attachment_{"d" * 32}.exe',        # Extension not allowed
+    ]
+    for key in others:
+        upload(s3, key)
+        assert send(client, auth(1), mine, key).status_code == 400, key
+
+    oversized = f'{mine}/attachment_{"e" * 32}.pdf'
+    upload(s3, oversized, b'x' * (10 * 1024 * 1024 + 1))
+    assert send(client, auth(1), mine, oversized).status_code == 400
+
+    own_pending = f'pending/1/attachment_{"f" * 32}.pdf'
+    upload(s3, own_pending)
+    assert send(client, auth(1), mine, own_pending).status_code == 200
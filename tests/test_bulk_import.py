@@ -0,0 +1,98 @@
+# tests/test_bulk_import.py - Bulk import keeps first responses, rollups and read state in step with live writes
+
+import json
+
+from app import db
+from app.models.tenant_messaging import TenantConversation, TenantMessage, MessagingRollup
+from app.utils.bulk_import import BulkImporter, read_records, _copy_field
+
+from conftest import API
+
+
+def rollup_rows():
+    """Non-empty rollup rows (deltas that cancel out across chunks leave a row of zeros)"""
+    rows = []
+    for row in MessagingRollup.query:
+        counts = tuple(getattr(row, column) for column in MessagingRollup.COUNTERS)
+        if any(counts):
+            rows.append((row.user_id, row.property_id, row.day, row.role) + counts)
+    return sorted(rows)
+
+
+def write_history(path):
+    senders = ['tess', 'alex', 'tess', 'olive', 'theo', 'alex', 'tess']
+    with open(path, 'w') as f:
+        for index, sender in enumerate(senders * 3):
+            key = 'theo' if sender == 'theo' or index % 2 else 'tess'
+            if sender == 'tess' and key == 'theo':
+                sender = 'theo'
+            f.write(json.dumps({
+                'conversation_key': key, 'tenant_email': f'{key}@example.com',
+                'agent_email': 'alex@example.com', 'owner_email': 'olive@example.com', 'property_id': 1,
+                'status': 'closed' if key == 'theo' else 'open',
+                'sender_email': f'{sender}@example.com', 'message_text': f'Message {index}',
+                'created_at': f'2024-03-{1 + index:02d}T09:00:00Z',
+            }) + '\n')
+
+
+def test_import_updates_rollups_like_a_rebuild(app, tmp_path):
+    path = str(tmp_path / 'history.ndjson')
+    write_history(path)
+    with app.app_context():
+        report = BulkImporter('history', chunk_size=4).run(read_records(path))
+        assert report['rejected'] == 0 and report['conversations'] == 2
+        imported = rollup_rows()
+        first_responses = {conversation.id: conversation.first_response_at for conversation in TenantConversation.query}
+
+        MessagingRollup.rebuild()
+        assert imported == rollup_rows()
+        assert all(first_responses.values())
+        assert first_responses == {conversation.id: conversation.first_response_at
+                                   for conversation in TenantConversation.query}
+
+
+def append_rows(path, *rows):
+    """Append (sender, text, created_at) rows of Tess's conversation to the import file"""
+    with open(path, 'a') as f:
+        for sender, text, created_at in rows:
+            f.write(json.dumps({
+                'conversation_key': 'tess', 'tenant_email': 'tess@example.com', 'agent_email': 'alex@example.com',
+                'property_id': 1, 'sender_email': f'{sender}@example.com', 'message_text': text,
+                'created_at': created_at,
+            }) + '\n')
+
+
+def test_resumed_import_appends_after_live_messages(app, client, auth, tmp_path):
+    path = str(tmp_path / 'history.ndjson')
+    append_rows(path, ('tess', 'Boiler broken', '2024-03-01T09:00:00Z'), ('alex', 'On it', '2024-03-02T09:00:00Z'))
+    with app.app_context():
+        BulkImporter('history').run(read_records(path))
+        conversation_id = TenantConversation.query.one().id
+
+    # Live traffic after the first run: the tenant writes and the agent reads it
+    client.post(f'{API}/conversations/{conversation_id}/messages', json={'message_text': 'Still broken'},
+                headers=auth(1))
+    client.get(f'{API}/conversations/{conversation_id}/messages', headers=auth(2))
+
+    append_rows(path, ('alex', 'Late record', '2024-03-03T09:00:00Z'), ('tess', 'From the future', '2099-01-01T09:00:00Z'))
+    with app.app_context():
+        report = BulkImporter('history').run(read_records(path))
+        assert (report['skipped'], report['messages'], report['rejected']) == (2, 1, 1)
+
+        conversation = db.session.get(TenantConversation, conversation_id)
+        live = TenantMessage.query.filter_by(message_text='Still broken').one()
+        future = TenantMessage.query.filter_by(message_text='From the future').one()
+        assert conversation.last_read_message_id_agent == live.id  # Not moved back to 'On it'
+        assert conversation.last_read_message_id_tenant == future.id
+        assert (conversation.unread_count_agent, conversation.unread_count_tenant) == (1, 0)
+        messages = TenantMessage.query.order_by(TenantMessage.created_at, TenantMessage.id)
+        assert [(message.message_text, message.is_read_for('agent')) for message in messages] == [
+            ('Boiler broken', True), ('On it', True), ('Still broken', True), ('From the future', False),
+        ]
+
+
+def test_copy_fields_never_read_as_null():
+    assert _copy_field(None) == ''
+    assert _copy_field('\\N') == '"\\N"'
+    assert _copy_field('') == '""'
+    assert _copy_field('say "hi"') == '"say ""hi"""'
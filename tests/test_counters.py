@@ -0,0 +1,134 @@
+# tests/test_counters.py - Conversation counters under concurrent sends
+
+import threading
+from datetime import timedelta
+
+from app import db
+from app.models.tenant_messaging import TenantConversation, TenantMessage, ConversationParticipant
+
+from conftest import API, start_conversation
+
+THREADS = 8
+SENDS_PER_THREAD = 20
+MAX_ATTEMPTS = 50
+
+
+def test_concurrent_sends_lose_no_increments(app, auth):
+    tenant = auth(1)
+    conversation_id = start_conversation(app.test_client(), tenant)
+    sent = []
+    lock = threading.Lock()
+
+    def send(thread_index):
+        client = app.test_client()
+        for index in range(SENDS_PER_THREAD):
+            # SQLite serialises writers and may answer "database is locked"; retry under the same
+            # Idempotency-Key so a send that did commit is replayed rather than sent twice
+            headers = dict(tenant, **{'Idempotency-Key': f'counter-{thread_index}-{index}'})
+            for _ in range(MAX_ATTEMPTS):
+                response = client.post(f'{API}/conversations/{conversation_id}/messages',
+                                       json={'message_text': f'ping {index}'}, headers=headers)
+                if response.status_code == 200:
+                    with lock:
+                        sent.append(response.json['data']['message']['id'])
+                    break
+
+    threads = [threading.Thread(target=send, args=(index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every send must succeed and be counted exactly once
+    assert len(sent) == len(set(sent)) == THREADS * SENDS_PER_THREAD
+    with app.app_context():
+        conversation = db.session.get(TenantConversation, conversation_id)
+        message_count = TenantMessage.query.filter_by(conversation_id=conversation_id).count()
+        assert message_count == THREADS * SENDS_PER_THREAD + 1
+        assert conversation.unread_count_agent == message_count
+        assert conversation.unread_count_tenant == 0
+        for user_id in (2, 3):
+            assert db.session.get(ConversationParticipant, (user_id, conversation_id)).unread_count == message_count
+        assert db.session.get(ConversationParticipant, (1, conversation_id)).unread_count == 0
+
+
+def test_reply_resets_sender_side(client, auth):
+    conversation_id = start_conversation(client, auth(1))
+    for text in ('one', 'two'):
+        client.post(f'{API}/conversations/{conversation_id}/messages', json={'message_text': text}, headers=auth(1))
+    client.post(f'{API}/conversations/{conversation_id}/messages', json={'message_text': 'on it'}, headers=auth(2))
+
+    with client.application.app_context():
+        conversation = db.session.get(TenantConversation, conversation_id)
+        assert conversation.unread_count_agent == 0
+        assert conversation.unread_count_tenant == 1
+        assert db.session.get(ConversationParticipant, (2, conversation_id)).unread_count == 0
+        assert db.session.get(ConversationParticipant, (3, conversation_id)).unread_count == 4
+
+
+def test_read_watermark_only_moves_forward(app, client, auth, monkeypatch):
+    conversation_id = start_conversation(client, auth(1))
+    client.post(f'{API}/conversations/{conversation_id}/messages', json={'message_text': 'Still broken'}, headers=auth(1))
+    client.get(f'{API}/conversations/{conversation_id}/messages', headers=auth(2))
+    with app.app_context():
+        first, newest = [message.id for message in TenantMessage.query.order_by(TenantMessage.id)]
+        assert db.session.get(TenantConversation, conversation_id).last_read_message_id_agent == newest
+
+    # A reader working from an older snapshot, e.g. on another device, must not move it back
+    with app.app_context():
+        conversation = db.session.get(TenantConversation, conversation_id)
+        stale = db.session.get(TenantMessage, first)
+        monkeypatch.setattr(TenantConversation, 'latest_message_position', lambda self: (stale.created_at, stale.id))
+        conversation.unread_count_agent = 1
+        db.session.commit()
+        conversation.mark_messages_as_read(2, 'agent')
+        db.session.commit()
+    with app.app_context():
+        conversation = db.session.get(TenantConversation, conversation_id)
+        assert conversation.last_read_message_id_agent == newest
+        assert conversation.unread_count_agent == 0
+
+
+def test_read_state_follows_created_at_not_ids(app, client, auth):
+    conversation_id = start_conversation(client, auth(1))
+    client.get(f'{API}/conversations/{conversation_id}/messages', headers=auth(2))
+    with app.app_context():
+        # Imported history gets ids above the live messages it predates
+        conversation = db.session.get(TenantConversation, conversation_id)
+        db.session.add(TenantMessage(conversation_id=conversation_id, sender_id=1, sender_name='Tess Test',
+                                     sender_type='tenant', message_text='From the old system',
+                                     created_at=conversation.created_at - timedelta(days=30)))
+        db.session.commit()
+    client.post(f'{API}/conversations/{conversation_id}/messages', json={'message_text': 'Any news?'}, headers=auth(1))
+
+    def read_flags():
+        with app.app_context():
+            messages = TenantMessage.query.filter_by(conversation_id=conversation_id).order_by(
+                TenantMessage.created_at, TenantMessage.id)
+            return [(message.message_text, message.is_read_for('agent')) for message in messages]
+
+    assert read_flags() == [('From the old system', True), ('It is broken', True), ('Any news?', False)]
+    client.get(f'{API}/conversations/{conversation_id}/messages', headers=auth(2))
+    assert read_flags() == [('From the old system', True), ('It is broken', True), ('Any news?', True)]
+    with app.app_context():
+        newest = TenantMessage.query.filter_by(message_text='Any news?').one()
+        assert db.session.get(TenantConversation, conversation_id).last_read_message_id_agent == newest.id
+
+
+def test_backfill_sets_watermarks_before_the_first_unread_message(app, client, auth):
+    conversation_id = start_conversation(client, auth(1))
+    client.post(f'{API}/conversations/{conversation_id}/messages', json={'message_text': 'On it'}, headers=auth(2))
+    client.post(f'{API}/conversations/{conversation_id}/messages', json={'message_text': 'Thanks'}, headers=auth(1))
+    with app.app_context():
+        messages = TenantMessage.query.order_by(TenantMessage.created_at, TenantMessage.id).all()
+        for message, read_by_agent in zip(messages, (True, True, False)):
+            message.is_read_by_agent = read_by_agent
+            message.is_read_by_tenant = True
+        conversation = db.session.get(TenantConversation, conversation_id)
+        conversation.last_read_message_id_tenant = conversation.last_read_message_id_agent = None
+        db.session.commit()
+
+        assert TenantConversation.backfill_read_watermarks() == 2
+        conversation = db.session.get(TenantConversation, conversation_id)
+        assert conversation.last_read_message_id_agent == messages[1].id
+        assert conversation.last_read_message_id_tenant == messages[2].id
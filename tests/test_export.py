@@ -0,0 +1,83 @@
+# tests/test_export.py - Streamed NDJSON, CSV and ZIP exports and their scoping
+
+import csv
+import io
+import json
+import zipfile
+
+from conftest import API, start_conversation
+
+
+def export(client, headers, **params):
+    query = '&'.join(f'{name}={value}' for name, value in params.items())
+    return client.get(f'{API}/export?{query}', headers=headers)
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.data.decode().splitlines()]
+
+
+def test_ndjson_export_streams_only_the_requested_tenant(client, auth):
+    first = start_conversation(client, auth(1), subject='Boiler')
+    second = start_conversation(client, auth(1), subject='Window')
+    start_conversation(client, auth(5), subject='Door')
+    client.post(f'{API}/conversations/{first}/messages', json={'message_text': 'On it'}, headers=auth(2))
+
+    response = export(client, auth(2), tenant_id=1)
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Content-Disposition'].startswith('attachment; filename="tenant-1-')
+
+    lines = ndjson(response)
+    assert [(line['type'], line.get('subject') or line['message_text']) for line in lines] == [
+        ('conversation', 'Boiler'), ('message', 'It is broken'), ('message', 'On it'),
+        ('conversation', 'Window'), ('message', 'It is broken'),
+    ]
+    assert {line['id'] for line in lines if line['type'] == 'conversation'} == {first, second}
+
+    # Exporting reads nothing as read
+    assert client.get(f'{API}/unread-count', headers=auth(2)).json['data']['unread_count'] == 2
+
+
+def test_export_is_scoped_to_the_callers_conversations(client, auth):
+    theirs = start_conversation(client, auth(1))
+    start_conversation(client, auth(5), subject='Door')
+
+    assert export(client, auth(5), conversation_id=theirs).status_code == 403
+    assert [line['subject'] for line in ndjson(export(client, auth(5), tenant_id=1))] == []
+    assert [line['subject'] for line in ndjson(export(client, auth(5), property_id=1))
+            if line['type'] == 'conversation'] == ['Door']
+    assert export(client, auth(5)).status_code == 400
+    assert export(client, auth(5), tenant_id=5, format='xml').status_code == 400
+
+
+def test_csv_export_has_one_row_per_message(client, auth):
+    conversation_id = start_conversation(client, auth(1), text='Line one, with "quotes"')
+    client.post(f'{API}/conversations/{conversation_id}/messages', json={'message_text': 'On it'}, headers=auth(2))
+
+    response = export(client, auth(3), conversation_id=conversation_id, format='csv')
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.data.decode())))
+    assert [(row['sender_type'], row['message_text']) for row in rows] == [
+        ('tenant', 'Line one, with "quotes"'), ('agent', 'On it'),
+    ]
+    assert {row['conversation_id'] for row in rows} == {str(conversation_id)}
+
+
+def test_zip_export_bundles_messages_and_attachments(client, auth):
+    conversation_id = start_conversation(client, auth(1))
+    response = client.post(f'{API}/send', headers=auth(1), content_type='multipart/form-data', data={
+        'conversation_id': str(conversation_id), 'message_text': 'Photo attached',
+        'attachment': (io.BytesIO(b'\x89PNG boiler photo'), 'boiler.png'),
+    })
+    assert response.status_code == 200, response.json
+    message_id = response.json['data']['message']['id']
+
+    response = export(client, auth(2), conversation_id=conversation_id, format='zip')
+    assert response.mimetype == 'application/zip'
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert archive.namelist() == ['messages.ndjson', f'attachments/{conversation_id}/{message_id}_boiler.png']
+    assert archive.read(f'attachments/{conversation_id}/{message_id}_boiler.png') == b'\x89PNG boiler photo'
+    lines = [json.loads(line) for line in archive.read('messages.ndjson').decode().splitlines()]
+    assert [line['type'] for line in lines] == ['conversation', 'message', 'message']
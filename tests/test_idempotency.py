@@ -0,0 +1,49 @@
+# tests/test_idempotency.py - Idempotency-Key replay, key reuse and the Redis record format
+
+import json
+import time
+
+from app.utils.idempotency import InMemoryIdempotencyStore, RedisIdempotencyStore, PENDING
+
+from conftest import API, FakeRedis, bearer, build_app, seed
+
+
+def send(client, headers, text, key='send-1'):
+    return client.post(f'{API}/conversations', headers=dict(headers, **{'Idempotency-Key': key}),
+                       json={'subject': 'Heating', 'message_text': text})
+
+
+def test_retry_replays_and_reuse_is_rejected(tmp_path):
+    redis = FakeRedis()
+    app = build_app(tmp_path, IDEMPOTENCY_STORE=RedisIdempotencyStore(redis))
+    seed(app)
+    client = app.test_client()
+    tenant = bearer(app, 1)
+
+    first = send(client, tenant, 'No hot water')
+    retry = send(client, tenant, 'No hot water')
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.json == first.json
+
+    # Stored as plain JSON: status, headers, base64 body and the request fingerprint
+    record = json.loads(next(iter(redis.values.values())))
+    assert set(record) == {'status', 'headers', 'body', 'fingerprint'}
+
+    reused = send(client, tenant, 'Something else entirely')
+    assert reused.status_code == 422
+
+
+def test_pending_reservation_expires_quickly():
+    store = InMemoryIdempotencyStore()
+    assert store.reserve(b'key', 0.05) is None
+    assert store.reserve(b'key', 0.05) == PENDING
+    time.sleep(0.1)
+    assert store.reserve(b'key', 0.05) is None
+
+
+def test_redis_store_ignores_records_it_cannot_parse():
+    redis = FakeRedis()
+    store = RedisIdempotencyStore(redis)
+    redis.values['idempotency:' + b'key'.hex()] = b'\x80\x04not json'
+    assert store.reserve(b'key', 10) is None
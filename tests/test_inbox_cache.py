@@ -0,0 +1,28 @@
+# tests/test_inbox_cache.py - Inbox cache versions shared across workers through Redis
+
+from app.utils.inbox_cache import RedisInboxCache
+
+from conftest import API, FakeRedis, bearer, build_app, seed, start_conversation
+
+
+def inbox_size(client, headers):
+    return len(client.get(f'{API}/my-conversations', headers=headers).json['data']['conversations'])
+
+
+def test_write_on_one_worker_invalidates_the_others(tmp_path):
+    redis = FakeRedis()
+    worker_a, worker_b = RedisInboxCache(redis), RedisInboxCache(redis)
+    app = build_app(tmp_path, INBOX_CACHE=worker_a, INBOX_CACHE_TTL=300)
+    seed(app)
+    client = app.test_client()
+    tenant, agent = bearer(app, 1), bearer(app, 2)
+
+    start_conversation(client, tenant)
+    assert inbox_size(client, agent) == 1  # Cached on worker A
+
+    app.config['INBOX_CACHE'] = worker_b
+    start_conversation(client, tenant, subject='Window')  # Served and invalidated by worker B
+
+    app.config['INBOX_CACHE'] = worker_a
+    assert worker_a.version(2) == worker_b.version(2) > 0
+    assert inbox_size(client, agent) == 2
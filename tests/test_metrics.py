@@ -0,0 +1,47 @@
+# tests/test_metrics.py - /metrics access on the API and static server, and the unread-count cache counters
+
+import pytest
+
+from conftest import API, start_conversation
+
+prometheus_client = pytest.importorskip('prometheus_client')
+
+
+def test_metrics_need_a_configured_token(app, client):
+    assert client.get(f'{API}/metrics').status_code == 404
+
+    app.config['METRICS_TOKEN'] = 'scrape-secret'
+    assert client.get(f'{API}/metrics').status_code == 401
+    assert client.get(f'{API}/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get(f'{API}/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
+
+
+def test_unread_count_is_cached_and_counted(client, auth):
+    def lookups(result):
+        return prometheus_client.REGISTRY.get_sample_value(
+            'tenant_messaging_inbox_cache_requests_total', {'endpoint': 'get_unread_count', 'result': result}
+        ) or 0
+
+    conversation_id = start_conversation(client, auth(1))
+    hits, misses = lookups('hit'), lookups('miss')
+    for _ in range(3):
+        assert client.get(f'{API}/unread-count', headers=auth(2)).json['data']['unread_count'] == 1
+    assert (lookups('hit') - hits, lookups('miss') - misses) == (2, 1)
+
+    # Reading the conversation invalidates the cached count
+    client.get(f'{API}/conversations/{conversation_id}/messages', headers=auth(2))
+    assert client.get(f'{API}/unread-count', headers=auth(2)).json['data']['unread_count'] == 0
+
+
+def test_static_server_shares_the_scrape_check(monkeypatch):
+    import server
+
+    client = server.app.test_client()
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+    assert client.get('/metrics').status_code == 404
+
+    monkeypatch.setenv('METRICS_TOKEN', 'scrape-secret')
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+    assert response.status_code == 200
+    assert b'static_request_seconds' in response.data
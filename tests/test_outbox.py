@@ -0,0 +1,98 @@
+# tests/test_outbox.py - Outbox worker batches, retries, expired claims and retention purge
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models.tenant_messaging import MessageOutboxEvent
+from app.utils import outbox_worker
+from app.utils.outbox_worker import OutboxWorker
+
+from conftest import start_conversation
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(outbox_worker, 'outbox_handlers', registry)
+    return registry
+
+
+def drain(app, worker):
+    with app.app_context(), ThreadPoolExecutor(max_workers=2) as executor:
+        return worker.drain_once(executor)
+
+
+def test_events_are_processed_retried_and_dead_lettered(app, client, auth, handlers):
+    seen = []
+    handlers['message.created'] = [lambda payload: seen.append(payload['message_id'])]
+    start_conversation(client, auth(1))
+    start_conversation(client, auth(5), subject='Window')
+
+    worker = OutboxWorker(app, max_attempts=2)
+    assert drain(app, worker) == 2
+    assert len(seen) == 2 and worker.metrics['processed'] == 2
+    assert drain(app, worker) == 0
+
+    handlers['message.created'] = [lambda payload: 1 / 0]
+    start_conversation(client, auth(6), subject='Door')
+    drain(app, worker)
+    with app.app_context():
+        event = MessageOutboxEvent.query.filter_by(status='pending').one()
+        assert event.attempts == 1 and 'ZeroDivisionError' in event.last_error
+        event.available_at = datetime.utcnow()
+        db.session.commit()
+    drain(app, worker)
+    with app.app_context():
+        assert MessageOutboxEvent.query.filter_by(status='dead').count() == 1
+    assert worker.metrics['retried'] == 1 and worker.metrics['dead_lettered'] == 1
+
+
+def test_purge_removes_only_old_processed_events(app, client, auth, handlers):
+    start_conversation(client, auth(1))
+    start_conversation(client, auth(5), subject='Window')
+    worker = OutboxWorker(app, retention_days=7)
+    drain(app, worker)
+
+    with app.app_context():
+        old = MessageOutboxEvent.query.order_by(MessageOutboxEvent.id).first()
+        old.processed_at = datetime.utcnow() - timedelta(days=8)
+        MessageOutboxEvent.enqueue('message.created', {'message_id': 0})
+        db.session.commit()
+        assert worker.purge_processed() == 1
+        assert sorted(status for status, in db.session.query(MessageOutboxEvent.status)) == ['done', 'pending']
+
+
+def test_purge_outbox_command(app, client, auth):
+    start_conversation(client, auth(1))
+    with app.app_context():
+        MessageOutboxEvent.query.update({'status': 'done', 'processed_at': datetime.utcnow() - timedelta(days=30)})
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['tenant_messaging', 'purge-outbox'])
+    assert result.exit_code == 0, result.output
+    assert 'Purged 1 processed outbox events' in result.output
+
+
+def test_expired_claims_are_released_and_count_as_attempts(app, client, auth, handlers):
+    start_conversation(client, auth(1))
+    worker = OutboxWorker(app, max_attempts=2, visibility_timeout=60)
+
+    def claim_and_die():
+        assert len(worker.claim_batch()) == 1
+        assert worker.release_stale_claims() == 0
+        MessageOutboxEvent.query.update({'locked_at': datetime.utcnow() - timedelta(seconds=61)})
+        db.session.commit()
+        assert worker.release_stale_claims() == 1
+        return MessageOutboxEvent.query.one()
+
+    with app.app_context():
+        event = claim_and_die()
+        assert (event.status, event.attempts, event.locked_at) == ('pending', 1, None)
+        assert 'Claim expired' in event.last_error
+
+        # It kills the next worker too: that was the last attempt
+        event = claim_and_die()
+        assert (event.status, event.attempts) == ('dead', 2)
+    assert worker.metrics['retried'] == 1 and worker.metrics['dead_lettered'] == 1
@@ -0,0 +1,127 @@
+# tests/test_participants.py - Participant rows: legacy fallback, migration and in-place updates
+
+from sqlalchemy import text
+
+from app import db
+from app.models.tenant_messaging import (
+    TenantConversation, ConversationParticipant, MessagingRollup, MessageOutboxEvent, MessagingSchemaMigration
+)
+from app.utils import schema_migrations
+
+from conftest import API, bearer, build_app, seed, start_conversation
+
+
+def inbox_ids(client, headers):
+    data = client.get(f'{API}/my-conversations', headers=headers).json['data']
+    return sorted(entry['id'] for entry in data['conversations'])
+
+
+def test_reads_fall_back_to_legacy_columns_until_backfilled(tmp_path):
+    app = build_app(tmp_path)
+    seed(app, migrate=False)
+    client = app.test_client()
+    tenant, agent, stranger = bearer(app, 1), bearer(app, 2), bearer(app, 5)
+    conversation_id = start_conversation(client, tenant)
+
+    # Data written before participant rows existed
+    with app.app_context():
+        ConversationParticipant.query.delete()
+        db.session.commit()
+        assert not ConversationParticipant.ready()
+
+    assert inbox_ids(client, agent) == [conversation_id]
+    assert client.get(f'{API}/unread-count', headers=agent).json['data']['unread_count'] == 1
+    assert client.get(f'{API}/conversations/{conversation_id}/messages', headers=tenant).status_code == 200
+    assert client.get(f'{API}/conversations/{conversation_id}/messages', headers=stranger).status_code == 403
+    assert client.get(f'{API}/presence?conversation_ids={conversation_id}', headers=agent).status_code == 200
+
+    with app.app_context():
+        assert schema_migrations.apply_migrations() == [name for name, _, _ in schema_migrations.MIGRATIONS]
+        assert ConversationParticipant.ready()
+        assert ConversationParticipant.query.filter_by(conversation_id=conversation_id).count() == 3
+        assert schema_migrations.apply_migrations() == []
+
+    assert inbox_ids(client, agent) == [conversation_id]
+    assert client.get(f'{API}/conversations/{conversation_id}/messages', headers=stranger).status_code == 403
+
+
+def test_migrations_wait_for_the_base_tables(tmp_path):
+    app = build_app(tmp_path)
+    with app.app_context():
+        assert schema_migrations.apply_migrations() == []
+        assert not MessagingSchemaMigration.is_applied(ConversationParticipant.BACKFILL_MIGRATION)
+
+
+def test_migrations_bring_an_old_schema_up_to_date(tmp_path):
+    app = build_app(tmp_path)
+    seed(app, migrate=False)
+    client = app.test_client()
+    conversation_id = start_conversation(client, bearer(app, 1))
+    client.post(f'{API}/conversations/{conversation_id}/messages', json={'message_text': 'On it'},
+                headers=bearer(app, 2))
+
+    with app.app_context():
+        # The schema before read watermarks, rollups and the outbox
+        for column in ('last_read_message_id_tenant', 'last_read_message_id_agent', 'first_response_at'):
+            db.session.execute(text(f'ALTER TABLE tenant_conversations DROP COLUMN {column}'))
+        for table in ('tenant_messaging_rollups', 'tenant_message_outbox'):
+            db.session.execute(text(f'DROP TABLE {table}'))
+        db.session.commit()
+
+        schema_migrations.apply_migrations()
+        assert not schema_migrations.pending_migrations()
+        conversation = db.session.get(TenantConversation, conversation_id)
+        assert conversation.first_response_at is not None
+        assert conversation.last_read_message_id_tenant is not None
+        assert MessagingRollup.query.count() > 0
+        assert MessageOutboxEvent.query.count() == 0
+
+
+def test_reassignment_keeps_read_state_of_remaining_participants(app, client, auth):
+    conversation_id = start_conversation(client, auth(1))
+    client.post(f'{API}/conversations/{conversation_id}/messages', json={'message_text': 'more'}, headers=auth(1))
+    client.get(f'{API}/conversations/{conversation_id}/messages', headers=auth(3))  # Owner reads
+
+    with app.app_context():
+        owner_row = db.session.get(ConversationParticipant, (3, conversation_id))
+        last_read_at = owner_row.last_read_at
+        assert owner_row.unread_count == 0 and last_read_at is not None
+
+        conversation = db.session.get(TenantConversation, conversation_id)
+        conversation.agent_id = 4
+        db.session.commit()
+
+        rows = {row.user_id: row for row in ConversationParticipant.query.filter_by(conversation_id=conversation_id)}
+        assert set(rows) == {1, 3, 4}
+        assert rows[3].last_read_at == last_read_at and rows[3].unread_count == 0
+        assert rows[4].role == 'agent'
+
+
+def test_boot_does_no_migration_work_unless_asked(tmp_path):
+    seed(build_app(tmp_path), migrate=False)
+
+    with build_app(tmp_path).app_context():
+        assert schema_migrations.applied_migrations() == set()
+
+    # Opting in applies only the schema steps; backfills wait for migrate-schema
+    with build_app(tmp_path, MESSAGING_AUTO_MIGRATE=True).app_context():
+        applied = schema_migrations.applied_migrations()
+        assert applied == {name for name, _, backfill in schema_migrations.MIGRATIONS if not backfill}
+        assert not ConversationParticipant.ready()
+
+
+def test_unapplied_migration_is_rechecked_only_after_a_while(tmp_path):
+    app = build_app(tmp_path)
+    seed(app, migrate=False)
+    with app.app_context():
+        schema_migrations.create_table(MessagingSchemaMigration)
+        db.session.commit()
+        assert not ConversationParticipant.ready()
+
+        # Recorded by another process: the cached answer stands until the recheck interval passes
+        with db.engine.begin() as connection:
+            connection.execute(MessagingSchemaMigration.__table__.insert(),
+                               {'name': ConversationParticipant.BACKFILL_MIGRATION})
+        assert not ConversationParticipant.ready()
+        app.config['MESSAGING_MIGRATION_RECHECK'] = 0
+        assert ConversationParticipant.ready()
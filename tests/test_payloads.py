@@ -0,0 +1,93 @@
+# tests/test_payloads.py - Compact inbox payloads and Accept-Encoding negotiation
+
+import gzip
+import json
+
+from app import db
+from app.models.user_models import User
+from app.models.tenant_messaging import TenantConversation, TenantMessage
+from app.utils import compression
+
+from conftest import API, start_conversation
+
+LONG_TEXT = 'The boiler makes a knocking noise every morning. ' * 40
+LARGE_INBOX = 1000
+
+
+def test_compact_inbox_moves_properties_to_a_side_table(client, auth):
+    for tenant_id in (1, 5, 6):
+        start_conversation(client, auth(tenant_id), text=LONG_TEXT)
+
+    full = client.get(f'{API}/conversations', headers=auth(2)).json['data']
+    compact = client.get(f'{API}/conversations?compact=1', headers=auth(2)).json['data']
+
+    assert all('property' in entry for entry in full['conversations'])
+    assert 'properties' not in full
+    assert all('property' not in entry and entry['property_id'] == entry_full['property']['id']
+               for entry, entry_full in zip(compact['conversations'], full['conversations']))
+    assert list(compact['properties']) == ['1']
+    assert all(len(entry['latest_message']['text']) <= 103 for entry in compact['conversations'])
+    assert len(json.dumps(compact)) < len(json.dumps(full))
+
+
+def test_sparse_fieldset_keeps_only_requested_fields(client, auth):
+    start_conversation(client, auth(1))
+    data = client.get(f'{API}/my-conversations?fields=subject,status', headers=auth(1)).json['data']
+    assert [set(entry) for entry in data['conversations']] == [{'id', 'subject', 'status'}]
+
+
+def test_large_json_is_gzipped_only_when_accepted(client, auth):
+    start_conversation(client, auth(1), text=LONG_TEXT)
+    url = f'{API}/my-conversations'
+
+    plain = client.get(url, headers=auth(1))
+    assert 'Content-Encoding' not in plain.headers
+
+    refused = client.get(url, headers=dict(auth(1), **{'Accept-Encoding': 'gzip;q=0'}))
+    assert 'Content-Encoding' not in refused.headers
+
+    accepted = client.get(url, headers=dict(auth(1), **{'Accept-Encoding': 'br, gzip'}))
+    expected = 'br' if compression.brotli else 'gzip'
+    assert accepted.headers['Content-Encoding'] == expected
+    assert 'Accept-Encoding' in accepted.headers['Vary']
+    body = compression.brotli.decompress(accepted.data) if expected == 'br' else gzip.decompress(accepted.data)
+    assert json.loads(body) == plain.json
+    assert len(accepted.data) < len(plain.data)
+
+
+def test_small_responses_are_left_alone(client, auth):
+    response = client.get(f'{API}/unread-count', headers=dict(auth(1), **{'Accept-Encoding': 'gzip'}))
+    assert len(response.data) < compression.MIN_COMPRESS_SIZE
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_large_agent_inbox_shrinks_with_compact_fields_and_gzip(app, client, auth):
+    """Byte sizes of an agent's inbox of LARGE_INBOX conversations, one per tenant"""
+    with app.app_context():
+        for index in range(LARGE_INBOX):
+            user_id = 1000 + index
+            db.session.add(User(id=user_id, email=f'tenant{index}@example.com', first_name=f'Tenant{index}',
+                                last_name='Test', role='tenant'))
+            conversation = TenantConversation(user_id=user_id, user_name=f'Tenant{index} Test', agent_id=2,
+                                              owner_id=3, property_id=1, subject=f'Repair request {index}')
+            db.session.add(conversation)
+            db.session.flush()
+            db.session.add(TenantMessage(conversation_id=conversation.id, sender_id=user_id,
+                                         sender_name=f'Tenant{index} Test', sender_type='tenant',
+                                         message_text=LONG_TEXT))
+        db.session.commit()
+
+    def size(query, encoding='identity'):
+        headers = dict(auth(2), **{'Accept-Encoding': encoding})
+        response = client.get(f'{API}/conversations?limit={LARGE_INBOX}{query}', headers=headers)
+        assert response.status_code == 200
+        return len(response.data)
+
+    full = size('')
+    full_gzip = size('', 'gzip')
+    compact = size('&compact=1')
+    slim_gzip = size('&compact=1&fields=id,unread_count,last_message_at,latest_message', 'gzip')
+
+    assert compact < full
+    assert full_gzip * 10 < full
+    assert slim_gzip * 2 < full_gzip
@@ -0,0 +1,51 @@
+# tests/test_prefetch.py - Batch message prefetch: access control, per-conversation limits, read-only
+
+from conftest import API, start_conversation
+
+
+def prefetch(client, headers, conversation_ids, **params):
+    query = ''.join(f'&{name}={value}' for name, value in params.items())
+    ids = ','.join(str(conversation_id) for conversation_id in conversation_ids)
+    return client.get(f'{API}/conversations/messages/batch?conversation_ids={ids}{query}', headers=headers)
+
+
+def test_prefetch_leaves_out_conversations_the_caller_cannot_see(client, auth):
+    mine = start_conversation(client, auth(1), subject='Boiler', text='Mine')
+    theirs = start_conversation(client, auth(5), subject='Door', text='Private to Theo')
+    other = start_conversation(client, auth(6), subject='Window', text='Private to Tara')
+
+    response = prefetch(client, auth(1), [theirs, mine, other, 999999])
+    assert response.status_code == 200
+    data = response.json['data']
+    assert list(data['conversations']) == [str(mine)]
+    assert data['unavailable_ids'] == [theirs, other, 999999]
+    assert [message['message_text'] for message in data['conversations'][str(mine)]['messages']] == ['Mine']
+
+    # Only conversations of another user: nothing of theirs leaks
+    data = prefetch(client, auth(1), [theirs]).json['data']
+    assert data['conversations'] == {}
+    assert data['unavailable_ids'] == [theirs]
+
+    # The property's agent takes part in all three
+    data = prefetch(client, auth(2), [mine, theirs, other]).json['data']
+    assert set(data['conversations']) == {str(mine), str(theirs), str(other)}
+    assert data['unavailable_ids'] == []
+
+
+def test_prefetch_returns_the_newest_messages_without_reading_them(client, auth):
+    conversation_id = start_conversation(client, auth(1), text='Message 0')
+    for index in range(1, 5):
+        client.post(f'{API}/conversations/{conversation_id}/messages',
+                    json={'message_text': f'Message {index}'}, headers=auth(1))
+
+    entry = prefetch(client, auth(2), [conversation_id], limit=2).json['data']['conversations'][str(conversation_id)]
+    assert [message['message_text'] for message in entry['messages']] == ['Message 3', 'Message 4']
+    assert (entry['total'], entry['has_more']) == (5, True)
+    assert not any(message['is_read'] for message in entry['messages'])
+    assert client.get(f'{API}/unread-count', headers=auth(2)).json['data']['unread_count'] == 5
+
+
+def test_prefetch_validates_the_id_list(client, auth):
+    assert prefetch(client, auth(1), []).status_code == 400
+    assert client.get(f'{API}/conversations/messages/batch?conversation_ids=1,x', headers=auth(1)).status_code == 400
+    assert prefetch(client, auth(1), range(1, 52)).status_code == 400
@@ -0,0 +1,79 @@
+# tests/test_presence.py - Heartbeat and typing expiry, and pruning of abandoned entries
+
+import types
+
+import pytest
+
+from app.utils import presence
+from app.utils.presence import InMemoryPresenceStore
+
+from conftest import API, start_conversation
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable monotonic clock for the presence module; advance with clock.now += seconds"""
+    fake = types.SimpleNamespace(now=1000.0)
+    fake.monotonic = lambda: fake.now
+    fake.time = lambda: fake.now
+    monkeypatch.setattr(presence, 'time', fake)
+    return fake
+
+
+def test_heartbeats_and_typing_expire_after_their_ttl(clock):
+    store = InMemoryPresenceStore()
+    store.heartbeat(1, ttl=60)
+    store.set_typing(7, 1, 'Tess Test', True, ttl=8)
+    assert store.online([1, 2]) == {1}
+    assert store.typing([7, 8]) == {7: [{'user_id': 1, 'user_name': 'Tess Test'}]}
+
+    clock.now += 9
+    assert store.typing([7]) == {}
+    assert store.online([1]) == {1}
+    clock.now += 60
+    assert store.online([1]) == set()
+
+
+def test_stopping_typing_removes_the_conversation(clock):
+    store = InMemoryPresenceStore()
+    store.set_typing(7, 1, 'Tess Test', True, ttl=8)
+    store.set_typing(7, 1, 'Tess Test', False, ttl=8)
+    assert store.typing([7]) == {}
+    assert store._typing == {}
+
+
+def test_expired_typing_is_pruned_on_read_and_by_the_sweep(clock):
+    store = InMemoryPresenceStore(sweep_interval=60)
+    for conversation_id in range(100):
+        store.set_typing(conversation_id, 1, 'Tess Test', True, ttl=8)
+
+    clock.now += 9
+    assert store.typing([0, 1]) == {}
+    assert len(store._typing) == 98  # Read conversations are pruned at once
+
+    # Abandoned conversations go at the next write after the sweep interval
+    clock.now += 60
+    store.heartbeat(2, ttl=60)
+    assert store._typing == {}
+    assert set(store._online) == {'2'}
+
+
+def test_typing_shows_in_presence_until_it_expires(app, client, auth, clock):
+    app.config.update(PRESENCE_STORE=InMemoryPresenceStore(), TYPING_TTL=8, PRESENCE_TTL=60)
+    conversation_id = start_conversation(client, auth(1))
+
+    assert client.post(f'{API}/typing', json={'conversation_id': conversation_id}, headers=auth(1)).status_code == 200
+    assert client.post(f'{API}/typing', json={'conversation_id': conversation_id}, headers=auth(5)).status_code == 403
+
+    def seen_by_agent():
+        response = client.get(f'{API}/presence?conversation_ids={conversation_id}', headers=auth(2))
+        return response.json['data']['presence'][str(conversation_id)]
+
+    entry = seen_by_agent()
+    assert entry['online'] == [1]
+    assert [typing['user_id'] for typing in entry['typing']] == [1]
+
+    clock.now += 9
+    assert seen_by_agent() == {'online': [1], 'typing': []}
+    clock.now += 60
+    assert seen_by_agent() == {'online': [], 'typing': []}
@@ -0,0 +1,80 @@
+# tests/test_rate_limits.py - Token buckets: per-class separation, 429 responses, adaptive limits and eviction
+
+from app.utils.rate_limiter import InMemoryRateLimitBackend, LatencyMonitor, DEFAULT_RATE_LIMITS, db_latency
+
+from conftest import API, bearer, build_app, seed, start_conversation
+
+
+def test_typing_does_not_drain_the_poll_bucket(tmp_path):
+    app = build_app(tmp_path, RATE_LIMIT_ENABLED=True, RATE_LIMIT_BACKEND=InMemoryRateLimitBackend())
+    seed(app)
+    client = app.test_client()
+    tenant = bearer(app, 1)
+    conversation_id = start_conversation(client, tenant)
+
+    _, typing_burst = DEFAULT_RATE_LIMITS['presence']
+    _, poll_burst = DEFAULT_RATE_LIMITS['poll']
+    assert typing_burst > poll_burst
+    for _ in range(poll_burst + 5):
+        response = client.post(f'{API}/typing', json={'conversation_id': conversation_id}, headers=tenant)
+        assert response.status_code == 200
+
+    assert client.get(f'{API}/conversations', headers=tenant).status_code == 200
+    assert client.get(f'{API}/unread-count', headers=tenant).status_code == 200
+
+
+def test_exhausted_bucket_answers_429_with_retry_after(tmp_path):
+    app = build_app(tmp_path, RATE_LIMIT_ENABLED=True, RATE_LIMIT_BACKEND=InMemoryRateLimitBackend(),
+                    RATE_LIMITS={'poll': (0.1, 2)})
+    seed(app)
+    client = app.test_client()
+    tenant = bearer(app, 1)
+
+    for _ in range(2):
+        assert client.get(f'{API}/conversations', headers=tenant).status_code == 200
+    response = client.get(f'{API}/conversations', headers=tenant)
+    assert response.status_code == 429
+    assert 1 <= int(response.headers['Retry-After']) <= 10
+
+    # Buckets are per user
+    assert client.get(f'{API}/conversations', headers=bearer(app, 5)).status_code == 200
+
+
+def test_adaptive_limit_shrinks_while_the_database_is_slow(tmp_path, monkeypatch):
+    app = build_app(tmp_path, RATE_LIMIT_ENABLED=True, RATE_LIMIT_BACKEND=InMemoryRateLimitBackend(),
+                    RATE_LIMITS={'poll': (0.01, 8)}, RATE_LIMIT_BUSY_LATENCY=0.25, INBOX_CACHE_ENABLED=False)
+    seed(app)
+    client = app.test_client()
+    tenant = bearer(app, 1)
+
+    # One second average latency scales the poll capacity to a quarter for adaptive endpoints only
+    monkeypatch.setattr(db_latency, 'average', 1.0)
+    statuses = [client.get(f'{API}/unread-count', headers=tenant).status_code for _ in range(4)]
+    assert statuses == [200, 200, 429, 429]
+    other_tenant = bearer(app, 5)
+    statuses = [client.get(f'{API}/conversations', headers=other_tenant).status_code for _ in range(9)]
+    assert statuses == [200] * 8 + [429]
+
+
+def test_latency_scale():
+    monitor = LatencyMonitor()
+    assert monitor.scale(0.02, 0.25) == 1.0
+    monitor.observe(0.01)
+    assert monitor.scale(0.02, 0.25) == 2.0
+    monitor.average = 0.1
+    assert monitor.scale(0.02, 0.25) == 1.0
+    monitor.average = 0.5
+    assert monitor.scale(0.02, 0.25) == 0.25
+
+
+def test_backend_evicts_least_recently_used_bucket():
+    backend = InMemoryRateLimitBackend(max_keys=2)
+    assert backend.consume('a', 0.001, 1) == 0
+    assert backend.consume('b', 0.001, 1) == 0
+    assert backend.consume('a', 0.001, 1) > 0
+    backend.consume('c', 0.001, 1)
+
+    assert list(backend._buckets) == ['a', 'c']
+    # 'a' kept its drained bucket, 'b' starts over full
+    assert backend.consume('a', 0.001, 1) > 0
+    assert backend.consume('b', 0.001, 1) == 0
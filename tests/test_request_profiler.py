@@ -0,0 +1,55 @@
+# tests/test_request_profiler.py - Slow-request profiles: timeline and sampler wakeups
+
+import json
+import os
+import threading
+import time
+
+from app.utils.request_profiler import RequestProfiler
+
+
+class CountingEvent(threading.Event):
+    def __init__(self):
+        super().__init__()
+        self.sets = 0
+
+    def set(self):
+        self.sets += 1
+        super().set()
+
+
+def test_profile_timeline_starts_at_first_sample(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), threshold=0.05, interval=0.005)
+    profiler.start_request()
+    time.sleep(0.2)
+    file_name = profiler.finish_request('GET /slow')
+
+    with open(os.path.join(tmp_path, file_name)) as f:
+        profile = json.load(f)['profiles'][0]
+    assert 0.05 <= profile['startValue'] < 0.1
+    assert 0.2 <= profile['endValue'] < 0.3
+    assert abs(sum(profile['weights']) - (profile['endValue'] - profile['startValue'])) < 1e-9
+    assert len(profile['weights']) == len(profile['samples'])
+
+
+def test_sampler_is_only_woken_when_idle(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), threshold=10)
+    profiler._wakeup = CountingEvent()
+    results = []
+
+    def request():
+        profiler.start_request()
+        time.sleep(0.05)
+        results.append(profiler.finish_request('GET /fast'))
+
+    first = threading.Thread(target=request)
+    first.start()
+    time.sleep(0.01)
+    others = [threading.Thread(target=request) for _ in range(5)]
+    for thread in others:
+        thread.start()
+    for thread in [first] + others:
+        thread.join()
+
+    assert profiler._wakeup.sets == 1
+    assert results == [None] * 6
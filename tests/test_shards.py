@@ -0,0 +1,166 @@
+# tests/test_shards.py - Routing, scatter-gather pagination and stats across three SQLite message shards
+
+import zlib
+
+import pytest
+from sqlalchemy.exc import UnboundExecutionError
+
+from app import db
+from app.models.tenant_messaging import TenantConversation, TenantMessage
+from app.utils import message_shards
+from conftest import API, build_app, seed, bearer, start_conversation
+
+SHARDS = ['s0', 's1', 's2']
+TENANTS = (1, 5, 6)
+
+
+@pytest.fixture
+def sharded_app(tmp_path):
+    app = build_app(
+        tmp_path,
+        SQLALCHEMY_BINDS={key: f"sqlite:///{tmp_path / key}.sqlite" for key in SHARDS},
+        MESSAGE_SHARD_BINDS=SHARDS,
+        MESSAGE_SHARD_ID_BLOCK=4,
+    )
+    seed(app)
+    result = app.test_cli_runner().invoke(args=['tenant_messaging', 'create-message-shards'])
+    assert result.exit_code == 0, result.output
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def threads(sharded_app):
+    """Three conversations per tenant, each with an agent reply; returns {tenant id: [conversation ids]}"""
+    client = sharded_app.test_client()
+    created = {}
+    for tenant_id in TENANTS:
+        for index in range(3):
+            conversation_id = start_conversation(client, bearer(sharded_app, tenant_id), subject=f'Issue {index}')
+            response = client.post(f'{API}/conversations/{conversation_id}/messages',
+                                   json={'message_text': 'On it'}, headers=bearer(sharded_app, 2))
+            assert response.status_code == 200, response.json
+            created.setdefault(tenant_id, []).append(conversation_id)
+    return created
+
+
+def shard_rows(app, model):
+    """{shard: ids of model rows stored there}"""
+    with app.app_context():
+        rows = {}
+        for key in message_shards.each_shard():
+            rows[key] = {row.id for row in db.session.query(model.id)}
+        return rows
+
+
+def test_conversations_live_on_their_tenants_shard(sharded_app, threads):
+    stored = shard_rows(sharded_app, TenantConversation)
+    for tenant_id, conversation_ids in threads.items():
+        shard = SHARDS[zlib.crc32(str(tenant_id).encode()) % len(SHARDS)]
+        for conversation_id in conversation_ids:
+            assert conversation_id % len(SHARDS) == SHARDS.index(shard)
+            assert conversation_id in stored[shard]
+    all_ids = [conversation_id for ids in threads.values() for conversation_id in ids]
+    assert len(set(all_ids)) == len(all_ids)
+
+
+def test_message_ids_are_unique_and_name_their_shard(sharded_app, threads):
+    stored = shard_rows(sharded_app, TenantMessage)
+    assert len([shard for shard in stored.values() if shard]) > 1
+    all_ids = [message_id for ids in stored.values() for message_id in ids]
+    assert len(all_ids) == len(set(all_ids)) == 2 * len(TENANTS) * 3
+    for shard, message_ids in stored.items():
+        assert all(message_id % len(SHARDS) == SHARDS.index(shard) for message_id in message_ids)
+
+
+def test_other_apps_keep_the_unsharded_session(sharded_app, tmp_path):
+    (tmp_path / 'plain').mkdir()
+    plain_app = build_app(tmp_path / 'plain')
+    seed(plain_app)
+    with plain_app.app_context():
+        assert not isinstance(db.session(), message_shards.ShardedMessagingSession)
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    with sharded_app.app_context():
+        assert isinstance(db.session(), message_shards.ShardedMessagingSession)
+
+
+def test_writes_to_two_shards_refuse_to_commit(sharded_app, threads):
+    first, second = threads[1][0], threads[5][0]
+    with sharded_app.app_context():
+        session = db.session()
+        assert session.shard_for_conversation(first) != session.shard_for_conversation(second)
+        db.session.get(TenantConversation, first).subject = 'Renamed'
+        db.session.get(TenantConversation, second).subject = 'Renamed'
+        with pytest.raises(UnboundExecutionError):
+            db.session.commit()
+        db.session.rollback()
+        assert db.session.get(TenantConversation, first).subject != 'Renamed'
+
+
+def test_inbox_cursor_pages_cover_every_conversation(sharded_app, threads):
+    client = sharded_app.test_client()
+    headers = bearer(sharded_app, 1)
+    first = client.get(f'{API}/conversations?limit=2', headers=headers).json['data']
+    seen = [conversation['id'] for conversation in first['conversations']]
+    cursor = first['pagination']['next_cursor']
+    while cursor:
+        data = client.get(f'{API}/conversations?limit=2&cursor={cursor}', headers=headers).json['data']
+        seen += [conversation['id'] for conversation in data['conversations']]
+        cursor = data['pagination']['next_cursor']
+    assert sorted(seen) == sorted(threads[1])
+    assert len(seen) == len(set(seen))
+
+    response = client.get(f'{API}/conversations?cursor=not-a-cursor', headers=headers)
+    assert response.status_code == 400
+
+
+def test_message_cursor_pages_match_page_numbers(sharded_app, threads):
+    client = sharded_app.test_client()
+    headers = bearer(sharded_app, 2)
+    conversation_id = threads[5][0]
+    by_page = client.get(f'{API}/conversations/{conversation_id}/messages?limit=100', headers=headers).json['data']
+    expected = [(message['conversation_id'], message['id']) for message in by_page['messages']]
+
+    seen = []
+    data = client.get(f'{API}/conversations/{conversation_id}/messages?limit=2', headers=headers).json['data']
+    while True:
+        seen += [(message['conversation_id'], message['id']) for message in data['messages']]
+        cursor = data['pagination']['next_cursor']
+        if not cursor:
+            break
+        data = client.get(f'{API}/conversations/{conversation_id}/messages?limit=2&cursor={cursor}',
+                          headers=headers).json['data']
+    assert seen == expected
+    assert len(seen) == len(set(seen))
+
+
+def test_sync_returns_every_message_once(sharded_app, threads):
+    client = sharded_app.test_client()
+    headers = bearer(sharded_app, 2)
+    seen = []
+    token = ''
+    while True:
+        data = client.get(f'{API}/sync?limit=4&since={token}', headers=headers).json['data']
+        seen += [(message['conversation_id'], message['id']) for message in data['messages']]
+        token = data['next_token']
+        if not data['has_more']:
+            break
+    assert len(seen) == 2 * len(TENANTS) * 3
+    assert len(seen) == len(set(seen))
+
+
+def test_stats_and_unread_sum_across_shards(sharded_app, threads):
+    client = sharded_app.test_client()
+    stats = client.get(f'{API}/stats', headers=bearer(sharded_app, 2)).json['data']['stats']
+    assert stats['total_conversations'] == 9
+    assert stats['messages_sent'] == 9
+    assert stats['messages_received'] == 9
+    assert stats['first_responses'] == 9
+
+    unread = client.get(f'{API}/unread-count', headers=bearer(sharded_app, 5)).json['data']['unread_count']
+    assert unread == 3
@@ -0,0 +1,43 @@
+# tests/test_startup.py - Worker boot: lazily imported legacy views and the import-time tooling
+
+import io
+import os
+import sys
+
+from app.utils import startup
+
+from conftest import API
+
+LEGACY_MODULE = 'app.routes.tenant_messaging_legacy'
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_lazy_view_imports_its_target_on_first_call(monkeypatch):
+    monkeypatch.delitem(sys.modules, 'colorsys', raising=False)
+    view = startup.LazyView('colorsys.rgb_to_hsv')
+    assert (view.__module__, view.__name__) == ('colorsys', 'rgb_to_hsv')
+    assert 'colorsys' not in sys.modules
+    assert view(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert 'colorsys' in sys.modules
+
+
+def test_boot_does_not_import_the_legacy_views(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    _, rows = startup.profile_imports(top=None)
+    names = {name.strip() for _, _, name in rows}
+    assert startup.DEFAULT_MODULE in names
+    assert LEGACY_MODULE not in names
+
+
+def test_legacy_upload_and_download_are_served_through_lazy_views(app, client, auth):
+    response = client.post(f'{API}/upload', headers=auth(1), content_type='multipart/form-data', data={
+        'conversation_id': '1', 'file': (io.BytesIO(b'%PDF-1.4 lease'), 'lease.pdf'),
+    })
+    assert response.status_code == 200, response.json
+    file_url = response.json['data']['file_url']
+
+    response = client.get(f'{API}/download/{file_url}', headers=auth(1))
+    assert response.status_code == 200
+    assert response.data == b'%PDF-1.4 lease'
+    assert isinstance(app.view_functions['tenant_messaging.download_file'], startup.LazyView)
+    assert LEGACY_MODULE in sys.modules
@@ -0,0 +1,93 @@
+# tests/test_structured_logging.py - JSON log lines: caller-thread capture, background formatting and fork safety
+
+import json
+import logging
+import os
+import threading
+
+import pytest
+
+from app.utils import structured_logging
+from app.utils.structured_logging import JsonFormatter, restart_log_listener
+
+from conftest import API, bearer, build_app, seed
+
+
+@pytest.fixture
+def logged_app(tmp_path):
+    """App logging JSON lines through the queue listener into tmp_path/app.log"""
+    app = build_app(tmp_path, STRUCTURED_LOGGING_ENABLED=True, LOG_LEVEL='INFO')
+    seed(app)
+    log_file = open(tmp_path / 'app.log', 'w')
+    app.extensions['log_listener'].handlers[0].setStream(log_file)
+    yield app
+    app.extensions['log_listener'].stop()
+    log_file.close()
+
+
+def log_lines(app, tmp_path):
+    """Stop the listener so everything queued is written, then parse the log"""
+    app.extensions['log_listener'].stop()
+    app.extensions['log_listener'] = restart_log_listener(app)
+    return [json.loads(line) for line in (tmp_path / 'app.log').read_text().splitlines()]
+
+
+def test_message_and_request_id_are_captured_on_the_caller_thread(logged_app, tmp_path, monkeypatch):
+    formatting_threads = []
+    original_format = JsonFormatter.format
+
+    def recording_format(self, record):
+        formatting_threads.append(threading.current_thread())
+        return original_format(self, record)
+
+    monkeypatch.setattr(JsonFormatter, 'format', recording_format)
+
+    attachments = ['lease.pdf']
+    with logged_app.test_request_context(headers={'X-Request-ID': 'req-123'}):
+        structured_logging.assign_request_id()
+        logged_app.logger.info("Listing %s", attachments, extra={'user_id': 7})
+        attachments.append('added-after-logging.pdf')  # Must not leak into the logged message
+
+    lines = log_lines(logged_app, tmp_path)
+    assert lines[-1]['message'] == "Listing ['lease.pdf']"
+    assert lines[-1]['request_id'] == 'req-123'
+    assert lines[-1]['user_id'] == 7
+    assert formatting_threads and threading.current_thread() not in formatting_threads
+
+
+def test_debug_fields_are_built_only_when_debug_is_on(logged_app):
+    built = []
+    build = lambda: built.append(True) or {'size': 1}
+    assert structured_logging.debug_fields(logged_app.logger, build) == {}
+    logged_app.logger.setLevel(logging.DEBUG)
+    assert structured_logging.debug_fields(logged_app.logger, build) == {'size': 1}
+    assert built == [True]
+
+
+def test_responses_echo_a_generated_request_id(logged_app):
+    client = logged_app.test_client()
+    response = client.get(f'{API}/unread-count', headers=bearer(logged_app, 1))
+    assert len(response.headers['X-Request-ID']) == 32
+    response = client.get(f'{API}/unread-count', headers=dict(bearer(logged_app, 1), **{'X-Request-ID': 'bad id!'}))
+    assert response.headers['X-Request-ID'] != 'bad id!'
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_forked_worker_gets_its_own_listener(logged_app, tmp_path):
+    parent_listener = logged_app.extensions['log_listener']
+    pid = os.fork()
+    if pid == 0:
+        # Child: the fork handler must have replaced the listener whose thread stayed in the parent
+        status = 1
+        try:
+            listener = logged_app.extensions['log_listener']
+            if listener is not parent_listener and listener._thread.is_alive():
+                logged_app.logger.info("Logged from the child")
+                listener.stop()
+                status = 0
+        finally:
+            os._exit(status)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert 'Logged from the child' in [line['message'] for line in log_lines(logged_app, tmp_path)]